@@ -0,0 +1,259 @@
+"""
+Synthetic data generator for data-scale benchmarks.
+
+Bulk-loads trains, users with train access, complaints and media into a
+local database with COPY. Complaints pick their train and mobile number
+from Zipf distributions, so a few trains and numbers are very busy while
+the rest are sparse. Each complaint gets 0-6 media rows, about 3 on average.
+Complaint ids, created_at and complain_date grow together at --per-day
+complaints a day from --start-date, the way a real table fills up.
+
+Generation tops up to the requested sizes. Rerunning with larger numbers
+appends rows and keeps the same distributions, which is how
+benchmarks/query_scale.py grows a table between measurements.
+
+The target must be a disposable database: the schema is applied to it
+(benchmarks/schema.sql and migrations/).
+
+    python benchmarks/datagen.py --database-url postgresql://bench@127.0.0.1/rail_sathi_bench \\
+        --complaints 10000000 --users 100000
+"""
+import io
+import sys
+import json
+import time
+import random
+import argparse
+from itertools import accumulate
+from datetime import date, datetime, timedelta
+
+import psycopg2
+
+TRAIN_NO_BASE = 10001
+MOBILE_BASE = 7000000000
+COMPLAINT_TYPES = ["cleanliness", "catering", "security", "electrical", "water", "staff", "bedroll", "medical"]
+STATUSES = ["pending", "in_progress", "completed", "closed"]
+STATUS_WEIGHTS = [0.1, 0.1, 0.3, 0.5]
+# Media rows per complaint, 0..6
+MEDIA_COUNT_WEIGHTS = [0.1, 0.1, 0.15, 0.25, 0.2, 0.1, 0.1]
+MEDIA_TYPES = ["image", "image", "image", "video"]
+COACHES = [f"{prefix}{n}" for prefix in ("S", "B", "A", "H") for n in range(1, 11)]
+WAR_ROOM_ROLE, S2_ADMIN_ROLE, RAILWAY_ADMIN_ROLE = "war room user", "s2 admin", "railway admin"
+
+COMPLAINT_COPY = """
+    COPY rail_sathi_railsathicomplain
+    (complain_id, pnr_number, is_pnr_validated, name, mobile_number, complain_type, complain_description,
+     complain_date, complain_status, train_id, train_number, train_name, coach, berth_no,
+     created_at, created_by, updated_at)
+    FROM STDIN
+"""
+MEDIA_COPY = """
+    COPY rail_sathi_railsathicomplainmedia
+    (id, complain_id, media_type, media_url, thumbnail_url, created_at, updated_at,
+     created_by, processing_status, progress)
+    FROM STDIN
+"""
+
+
+def zipf_cum_weights(n, skew):
+    """Cumulative weights for ranks 0..n-1 with weight 1 / (rank + 1) ** skew"""
+    return list(accumulate(1 / (rank + 1) ** skew for rank in range(n)))
+
+
+def train_no_for_rank(rank):
+    return TRAIN_NO_BASE + rank
+
+
+def mobile_for_rank(rank):
+    """Rank 0 is the busiest number"""
+    return str(MOBILE_BASE + rank)
+
+
+def depot_for_train(rank, depots):
+    return f"D{rank % depots:02d}"
+
+
+def _copy(cursor, statement, lines):
+    cursor.copy_expert(statement, io.StringIO("".join(lines)))
+
+
+def _count(cursor, query):
+    cursor.execute(query)
+    return cursor.fetchone()[0]
+
+
+def _progress(label, done, total, started):
+    rate = done / max(time.monotonic() - started, 1e-9)
+    print(f"  {label}: {done:,}/{total:,} ({rate:,.0f} rows/s)", file=sys.stderr)
+
+
+def load_trains(conn, trains, depots):
+    cursor = conn.cursor()
+    existing = _count(cursor, "SELECT count(*) FROM trains_traindetails")
+    if existing >= trains:
+        return
+    lines = [
+        f"{rank + 1}\t{train_no_for_rank(rank)}\tSynthetic Express {rank}\t{depot_for_train(rank, depots)}\n"
+        for rank in range(existing, trains)
+    ]
+    _copy(cursor, "COPY trains_traindetails (id, train_no, train_name, depot) FROM STDIN", lines)
+    cursor.execute("SELECT setval(pg_get_serial_sequence('trains_traindetails', 'id'), %s)", (trains,))
+    conn.commit()
+
+
+def load_users(conn, users, trains, depots, train_skew, rng, start_date):
+    """
+    Users are mostly staff with train access entries (1-8 trains each, busy
+    trains more often); about 2% are war room users for one or more depots,
+    plus a handful of s2 and railway admins.
+    """
+    cursor = conn.cursor()
+    for role in (WAR_ROOM_ROLE, S2_ADMIN_ROLE, RAILWAY_ADMIN_ROLE):
+        cursor.execute("""
+            INSERT INTO user_onboarding_roles (name) VALUES (%s) ON CONFLICT (name) DO NOTHING
+        """, (role,))
+    cursor.execute("SELECT name, id FROM user_onboarding_roles")
+    roles = dict(cursor.fetchall())
+    existing = _count(cursor, "SELECT count(*) FROM user_onboarding_user")
+    if existing >= users:
+        conn.commit()
+        return
+
+    train_weights = zipf_cum_weights(trains, train_skew)
+    user_lines, access_lines = [], []
+    for user_id in range(existing + 1, users + 1):
+        if user_id % 50 == 0:
+            depo = ",".join(f"D{d:02d}" for d in rng.sample(range(depots), rng.choice((1, 1, 1, 2, 3))))
+            role_id = roles[WAR_ROOM_ROLE]
+        elif user_id % 5000 in (1, 2):
+            depo, role_id = "", roles[S2_ADMIN_ROLE if user_id % 5000 == 1 else RAILWAY_ADMIN_ROLE]
+        else:
+            depo, role_id = "", "\\N"
+        user_lines.append(
+            f"{user_id}\tuser{user_id}@synthetic.invalid\tUser\t{user_id}\t{MOBILE_BASE - user_id}\t{depo}\t{role_id}\n"
+        )
+        if role_id == "\\N" and rng.random() < 0.6:
+            access = {}
+            for rank in set(rng.choices(range(trains), cum_weights=train_weights, k=rng.randint(1, 8))):
+                origin = start_date + timedelta(days=rng.randrange(365))
+                end = "ongoing" if rng.random() < 0.7 else str(origin + timedelta(days=rng.randrange(30, 365)))
+                access[str(train_no_for_rank(rank))] = [{"origin_date": str(origin), "end_date": end}]
+            access_lines.append(f"{user_id}\t{json.dumps(access)}\n")
+    _copy(cursor, """
+        COPY user_onboarding_user (id, email, first_name, last_name, phone, depo, user_type_id) FROM STDIN
+    """, user_lines)
+    _copy(cursor, "COPY trains_trainaccess (user_id, train_details) FROM STDIN", access_lines)
+    cursor.execute("SELECT setval(pg_get_serial_sequence('user_onboarding_user', 'id'), %s)", (users,))
+    conn.commit()
+
+
+def load_complaints(conn, complaints, trains, mobiles, train_skew, mobile_skew, per_day, start_date,
+                    rng, batch_size):
+    cursor = conn.cursor()
+    next_id = _count(cursor, "SELECT COALESCE(max(complain_id), 0) FROM rail_sathi_railsathicomplain") + 1
+    next_media_id = _count(cursor, "SELECT COALESCE(max(id), 0) FROM rail_sathi_railsathicomplainmedia") + 1
+    if next_id > complaints:
+        return
+    train_weights = zipf_cum_weights(trains, train_skew)
+    mobile_weights = zipf_cum_weights(mobiles, mobile_skew)
+    start = datetime.combine(start_date, datetime.min.time())
+    seconds_per_complaint = 86400 / per_day
+    total = complaints - next_id + 1
+    started = time.monotonic()
+
+    for batch_start in range(next_id, complaints + 1, batch_size):
+        ids = range(batch_start, min(batch_start + batch_size, complaints + 1))
+        train_ranks = rng.choices(range(trains), cum_weights=train_weights, k=len(ids))
+        mobile_ranks = rng.choices(range(mobiles), cum_weights=mobile_weights, k=len(ids))
+        media_counts = rng.choices(range(len(MEDIA_COUNT_WEIGHTS)), weights=MEDIA_COUNT_WEIGHTS, k=len(ids))
+        complaint_lines, media_lines = [], []
+        for complain_id, train_rank, mobile_rank, media_count in zip(ids, train_ranks, mobile_ranks, media_counts):
+            created = start + timedelta(seconds=complain_id * seconds_per_complaint + rng.random())
+            # Passengers sometimes report the day after the incident
+            complain_date = created.date() - timedelta(days=1 if rng.random() < 0.2 else 0)
+            updated = created + timedelta(seconds=rng.randrange(0, 7 * 86400))
+            complaint_lines.append(
+                f"{complain_id}\t{rng.randrange(10 ** 9, 10 ** 10)}\tnot-attempted\tPassenger {mobile_rank}\t"
+                f"{mobile_for_rank(mobile_rank)}\t{rng.choice(COMPLAINT_TYPES)}\tSynthetic complaint {complain_id}\t"
+                f"{complain_date}\t{rng.choices(STATUSES, STATUS_WEIGHTS)[0]}\t{train_rank + 1}\t"
+                f"{train_no_for_rank(train_rank)}\tSynthetic Express {train_rank}\t{rng.choice(COACHES)}\t"
+                f"{rng.randrange(1, 73)}\t{created.isoformat()}\tsynthetic\t{updated.isoformat()}\n"
+            )
+            for n in range(media_count):
+                media_type = rng.choice(MEDIA_TYPES)
+                extension = "mp4" if media_type == "video" else "jpg"
+                media_lines.append(
+                    f"{next_media_id}\t{complain_id}\t{media_type}\t"
+                    f"https://storage.invalid/rail_sathi_complain_images/{complain_id}_{n}.{extension}\t"
+                    f"https://storage.invalid/thumbnails/{complain_id}_{n}.jpg\t{created.isoformat()}\t"
+                    f"{created.isoformat()}\tsynthetic\tdone\t100\n"
+                )
+                next_media_id += 1
+        _copy(cursor, COMPLAINT_COPY, complaint_lines)
+        _copy(cursor, MEDIA_COPY, media_lines)
+        conn.commit()
+        _progress("complaints", ids[-1] - next_id + 1, total, started)
+
+    cursor.execute("SELECT setval(pg_get_serial_sequence('rail_sathi_railsathicomplain', 'complain_id'), %s)",
+                   (complaints,))
+    cursor.execute("SELECT setval(pg_get_serial_sequence('rail_sathi_railsathicomplainmedia', 'id'), %s)",
+                   (max(next_media_id - 1, 1),))
+    conn.commit()
+
+
+def generate(dsn, complaints, users=100_000, trains=5000, mobiles=2_000_000, depots=60,
+             train_skew=1.1, mobile_skew=0.8, per_day=20000, start_date=date(2023, 1, 1),
+             seed=42, batch_size=100_000):
+    """Top the database up to the given sizes; the seed is offset by the current size"""
+    conn = psycopg2.connect(dsn)
+    try:
+        cursor = conn.cursor()
+        # Appending with a fresh seed keeps the new rows independent of earlier runs
+        rng = random.Random(seed + _count(cursor, "SELECT count(*) FROM rail_sathi_railsathicomplain"))
+        conn.commit()
+        load_trains(conn, trains, depots)
+        load_users(conn, users, trains, depots, train_skew, rng, start_date)
+        load_complaints(conn, complaints, trains, mobiles, train_skew, mobile_skew, per_day, start_date,
+                        rng, batch_size)
+        conn.autocommit = True
+        conn.cursor().execute("VACUUM ANALYZE")
+    finally:
+        conn.close()
+
+
+def add_arguments(parser):
+    parser.add_argument("--users", type=int, default=100_000, help="users, ~60%% with train access")
+    parser.add_argument("--trains", type=int, default=5000, help="trains")
+    parser.add_argument("--mobiles", type=int, default=2_000_000, help="distinct passenger mobile numbers")
+    parser.add_argument("--depots", type=int, default=60, help="depots")
+    parser.add_argument("--train-skew", type=float, default=1.1, help="Zipf exponent of complaints per train")
+    parser.add_argument("--mobile-skew", type=float, default=0.8, help="Zipf exponent of complaints per mobile")
+    parser.add_argument("--per-day", type=int, default=20000, help="complaints per day of created_at")
+    parser.add_argument("--start-date", type=date.fromisoformat, default=date(2023, 1, 1),
+                        help="created_at of the first complaint")
+    parser.add_argument("--seed", type=int, default=42, help="random seed")
+    parser.add_argument("--batch-size", type=int, default=100_000, help="complaints per COPY and commit")
+
+
+def generate_from_args(dsn, complaints, args):
+    generate(dsn, complaints, users=args.users, trains=args.trains, mobiles=args.mobiles, depots=args.depots,
+             train_skew=args.train_skew, mobile_skew=args.mobile_skew, per_day=args.per_day,
+             start_date=args.start_date, seed=args.seed, batch_size=args.batch_size)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", required=True, help="disposable database to fill")
+    parser.add_argument("--complaints", type=int, default=10_000_000, help="complaints after loading")
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    from loadtest import apply_schema
+    apply_schema(args.database_url)
+    started = time.monotonic()
+    generate_from_args(args.database_url, args.complaints, args)
+    print(f"Loaded up to {args.complaints:,} complaints in {time.monotonic() - started:.0f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,661 @@
+"""
+End-to-end HTTP load test of every endpoint in main.py.
+
+Sets up a disposable environment:
+- Postgres: a throwaway cluster started with initdb/pg_ctl from PATH,
+  or an existing empty database given with --database-url.
+- benchmarks/schema.sql and migrations/*.sql are applied, then trains,
+  notification recipients and complaints are seeded from --seed.
+- Processed media goes to the memory storage backend; notification
+  emails go to a fake SMTP sink that accepts and discards them.
+- The app runs under uvicorn in a subprocess.
+
+Each scenario is then driven at every --concurrency level for --duration
+seconds. Read scenarios run first, then writes, then deletes, which
+consume complaints seeded for them. Throughput and p50/p95/p99 latency
+per scenario and level are printed and written to a JSON results file.
+
+With --baseline (a previous results file), the run fails with exit status
+1 when a scenario's p95 latency rises, or its throughput drops, by more
+than --max-regression. It also fails when a scenario's error rate exceeds
+--max-error-rate.
+
+    python benchmarks/loadtest.py --concurrency 1 8 32 --duration 10
+    python benchmarks/loadtest.py --baseline benchmarks/results/baseline.json
+"""
+import os
+import io
+import csv
+import sys
+import json
+import math
+import time
+import glob
+import random
+import shutil
+import socket
+import asyncio
+import argparse
+import tempfile
+import subprocess
+from collections import Counter, deque
+from datetime import date, datetime, timedelta
+
+import httpx
+import psycopg2
+from psycopg2.extensions import parse_dsn
+from psycopg2.extras import execute_values, Json
+from PIL import Image
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCHEMA_FILE = os.path.join(ROOT, "benchmarks", "schema.sql")
+MIGRATIONS = sorted(glob.glob(os.path.join(ROOT, "migrations", "*.sql")))
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+
+DEPOTS = ["BCT", "NDLS", "MAS", "HWH", "SBC", "PUNE", "ADI", "LKO"]
+STATUSES = ["pending", "in_progress", "completed", "closed"]
+COMPLAINT_TYPES = ["cleanliness", "catering", "security", "electrical", "water", "staff"]
+WAR_ROOM_ROLE, S2_ADMIN_ROLE, RAILWAY_ADMIN_ROLE = "war room user", "s2 admin", "railway admin"
+ADMIN_API_TOKEN = "bench-admin-token"
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+# ---------- database ----------
+
+class LocalPostgres:
+    """A throwaway Postgres cluster in a temporary directory"""
+
+    def __init__(self):
+        self.dir = tempfile.mkdtemp(prefix="rail_sathi_pg_")
+        self.data = os.path.join(self.dir, "data")
+        self.port = free_port()
+
+    def start(self):
+        if not (shutil.which("initdb") and shutil.which("pg_ctl")):
+            raise SystemExit("initdb and pg_ctl must be on PATH, or pass --database-url")
+        subprocess.run(["initdb", "-D", self.data, "-U", "bench", "--auth=trust", "-E", "UTF8"],
+                       check=True, stdout=subprocess.DEVNULL)
+        subprocess.run([
+            "pg_ctl", "-D", self.data, "-l", os.path.join(self.dir, "postgres.log"), "-w",
+            "-o", f"-p {self.port} -k {self.dir} -c listen_addresses=127.0.0.1 -c max_connections=200",
+            "start"
+        ], check=True, stdout=subprocess.DEVNULL)
+        conn = psycopg2.connect(host="127.0.0.1", port=self.port, user="bench", dbname="postgres")
+        conn.autocommit = True
+        conn.cursor().execute("CREATE DATABASE rail_sathi_bench")
+        conn.close()
+        return f"postgresql://bench@127.0.0.1:{self.port}/rail_sathi_bench"
+
+    def stop(self):
+        subprocess.run(["pg_ctl", "-D", self.data, "-m", "fast", "stop"],
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+
+def split_sql(script):
+    """
+    Split a SQL script into statements. Each is executed on its own so
+    CREATE INDEX CONCURRENTLY does not end up in a transaction block;
+    comments, quoted strings and $$ function bodies are respected.
+    """
+    statements, current = [], []
+    in_dollar = in_quote = False
+    i = 0
+    while i < len(script):
+        if not in_quote and script.startswith("$$", i):
+            in_dollar = not in_dollar
+            current.append("$$")
+            i += 2
+            continue
+        if not in_dollar and not in_quote and script.startswith("--", i):
+            end = script.find("\n", i)
+            i = len(script) if end == -1 else end
+            continue
+        ch = script[i]
+        if not in_dollar and ch == "'":
+            in_quote = not in_quote
+        if ch == ";" and not in_dollar and not in_quote:
+            statement = "".join(current).strip()
+            if statement:
+                statements.append(statement)
+            current = []
+        else:
+            current.append(ch)
+        i += 1
+    statement = "".join(current).strip()
+    if statement:
+        statements.append(statement)
+    return statements
+
+
+def apply_schema(dsn):
+    conn = psycopg2.connect(dsn)
+    conn.autocommit = True
+    cursor = conn.cursor()
+    for path in [SCHEMA_FILE] + MIGRATIONS:
+        with open(path) as f:
+            for statement in split_sql(f.read()):
+                cursor.execute(statement)
+    conn.close()
+
+
+def seed(dsn, complaints, deletable, rng):
+    """Insert trains, recipients and complaints; returns what the scenarios pick from"""
+    today = date.today()
+    conn = psycopg2.connect(dsn)
+    cursor = conn.cursor()
+
+    trains = [(12000 + i, f"Bench Express {i}", DEPOTS[i % len(DEPOTS)]) for i in range(300)]
+    train_rows = execute_values(cursor, """
+        INSERT INTO trains_traindetails (train_no, train_name, depot) VALUES %s
+        RETURNING id, train_no, train_name, depot
+    """, trains, fetch=True)
+
+    execute_values(cursor, "INSERT INTO user_onboarding_roles (name) VALUES %s",
+                   [(WAR_ROOM_ROLE,), (S2_ADMIN_ROLE,), (RAILWAY_ADMIN_ROLE,)])
+    cursor.execute("SELECT name, id FROM user_onboarding_roles")
+    roles = dict(cursor.fetchall())
+    users = [(f"warroom{i}@bench.invalid", "War", f"Room {i}", DEPOTS[i % len(DEPOTS)], roles[WAR_ROOM_ROLE])
+             for i in range(40)]
+    users += [(f"s2admin{i}@bench.invalid", "S2", f"Admin {i}", "", roles[S2_ADMIN_ROLE]) for i in range(3)]
+    users += [(f"rladmin{i}@bench.invalid", "Railway", f"Admin {i}", "", roles[RAILWAY_ADMIN_ROLE]) for i in range(3)]
+    users += [(f"staff{i}@bench.invalid", "Staff", f"{i}", "", None) for i in range(100)]
+    user_ids = [row[0] for row in execute_values(cursor, """
+        INSERT INTO user_onboarding_user (email, first_name, last_name, depo, user_type_id) VALUES %s
+        RETURNING id
+    """, users, fetch=True)]
+    access = []
+    for user_id in user_ids[-100:]:
+        train_nos = rng.sample([t[0] for t in trains], 3)
+        access.append((user_id, Json({
+            str(train_no): [{"origin_date": str(today - timedelta(days=365)), "end_date": "ongoing"}]
+            for train_no in train_nos
+        })))
+    execute_values(cursor, "INSERT INTO trains_trainaccess (user_id, train_details) VALUES %s", access)
+
+    mobiles = [f"9{rng.randrange(10 ** 8, 10 ** 9)}" for _ in range(max(complaints // 5, 1))]
+
+    def complaint_rows(count, name=None):
+        for _ in range(count):
+            train_id, train_no, train_name, _ = rng.choice(train_rows)
+            complain_date = today - timedelta(days=rng.randrange(90))
+            created = datetime.combine(complain_date, datetime.min.time()) + timedelta(seconds=rng.randrange(86400))
+            yield (
+                str(rng.randrange(10 ** 9, 10 ** 10)), "not-attempted", name or f"Passenger {rng.randrange(10 ** 6)}",
+                rng.choice(mobiles), rng.choice(COMPLAINT_TYPES), "Seeded complaint for the load test",
+                complain_date, rng.choice(STATUSES), train_id, str(train_no), train_name,
+                f"B{rng.randrange(1, 10)}", rng.randrange(1, 73), created, "bench", created
+            )
+
+    insert = """
+        INSERT INTO rail_sathi_railsathicomplain
+        (pnr_number, is_pnr_validated, name, mobile_number, complain_type, complain_description,
+         complain_date, complain_status, train_id, train_number, train_name, coach, berth_no,
+         created_at, created_by, updated_at)
+        VALUES %s RETURNING complain_id, mobile_number, complain_date, name
+    """
+    seeded = execute_values(cursor, insert, complaint_rows(complaints), page_size=1000, fetch=True)
+    disposable = execute_values(cursor, insert, complaint_rows(deletable, "Bench Delete"), page_size=1000, fetch=True)
+
+    media = []
+    for complain_id, *_ in seeded + disposable:
+        for n in range(rng.choice((0, 0, 1, 2))):
+            media.append((complain_id, "image", f"memory://seed/{complain_id}_{n}.jpg",
+                          f"memory://seed/thumbnails/{complain_id}_{n}.jpg", "bench", "done", 100))
+    media_rows = execute_values(cursor, """
+        INSERT INTO rail_sathi_railsathicomplainmedia
+        (complain_id, media_type, media_url, thumbnail_url, created_by, processing_status, progress)
+        VALUES %s RETURNING id, complain_id
+    """, media, page_size=1000, fetch=True)
+    conn.commit()
+
+    disposable_ids = {row[0] for row in disposable}
+    conn.autocommit = True
+    cursor.execute("ANALYZE")
+    conn.close()
+    return {
+        "complain_ids": [row[0] for row in seeded],
+        "date_lookups": [(row[2].isoformat(), row[1]) for row in seeded],
+        "mobiles": mobiles,
+        "train_nos": [str(t[0]) for t in trains],
+        "depots": DEPOTS,
+        "deletable": deque((row[0], row[3], row[1]) for row in disposable),
+        "media": deque(tuple(row) for row in media_rows if row[1] not in disposable_ids),
+    }
+
+
+# ---------- SMTP sink ----------
+
+class SmtpSink:
+    """Minimal SMTP server that accepts every message and discards it"""
+
+    def __init__(self):
+        self.port = free_port()
+        self.messages = 0
+        self.server = None
+
+    async def start(self):
+        self.server = await asyncio.start_server(self._session, "127.0.0.1", self.port)
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def _session(self, reader, writer):
+        writer.write(b"220 bench ESMTP\r\n")
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                command = line[:4].upper()
+                if command == b"EHLO":
+                    writer.write(b"250-bench\r\n250-8BITMIME\r\n250 SMTPUTF8\r\n")
+                elif command == b"DATA":
+                    writer.write(b"354 End data with <CR><LF>.<CR><LF>\r\n")
+                    await writer.drain()
+                    while (await reader.readline()) not in (b".\r\n", b""):
+                        pass
+                    self.messages += 1
+                    writer.write(b"250 OK\r\n")
+                elif command == b"QUIT":
+                    writer.write(b"221 Bye\r\n")
+                    break
+                else:
+                    writer.write(b"250 OK\r\n")
+                await writer.drain()
+        finally:
+            writer.close()
+
+
+# ---------- app ----------
+
+def start_app(dsn, smtp_port, workdir, workers):
+    params = parse_dsn(dsn)
+    port = free_port()
+    env = dict(os.environ)
+    env.update({
+        "POSTGRES_HOST": params.get("host", "127.0.0.1"), "POSTGRES_PORT": params.get("port", "5432"),
+        "POSTGRES_USER": params.get("user", "bench"), "POSTGRES_PASSWORD": params.get("password", ""),
+        "POSTGRES_DB": params["dbname"],
+        "MAIL_USERNAME": "bench", "MAIL_PASSWORD": "bench", "MAIL_FROM": "bench@example.com",
+        "MAIL_SERVER": "127.0.0.1", "MAIL_PORT": str(smtp_port), "MAIL_STARTTLS": "false",
+        "MAIL_SSL_TLS": "false", "USE_CREDENTIALS": "false", "VALIDATE_CERTS": "false",
+        "MEDIA_STORAGE_BACKEND": "memory", "ADMIN_API_TOKEN": ADMIN_API_TOKEN,
+        "MEDIA_SPOOL_DIR": os.path.join(workdir, "spool"),
+        "SLOW_QUERY_PLAN_FILE": os.path.join(workdir, "slow_query_plans.log"),
+    })
+    log = open(os.path.join(workdir, "app.log"), "wb")
+    process = subprocess.Popen([
+        sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+        "--workers", str(workers), "--log-level", "warning"
+    ], cwd=ROOT, env=env, stdout=log, stderr=subprocess.STDOUT)
+    return process, f"http://127.0.0.1:{port}"
+
+
+async def wait_until_healthy(client, process, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise SystemExit("The app exited during startup; see app.log in the work directory")
+        try:
+            if (await client.get("/health/db")).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        await asyncio.sleep(0.25)
+    raise SystemExit("The app did not become healthy in time")
+
+
+# ---------- scenarios ----------
+
+def make_images(count, rng):
+    images = []
+    for _ in range(count):
+        image = Image.new("RGB", (640, 480), tuple(rng.randrange(256) for _ in range(3)))
+        image.putpixel((rng.randrange(640), rng.randrange(480)), (255, 255, 255))
+        buffer = io.BytesIO()
+        image.save(buffer, "JPEG", quality=85)
+        images.append(buffer.getvalue())
+    return images
+
+
+def complaint_form(ctx, rng):
+    return {
+        "name": "Bench Passenger", "mobile_number": rng.choice(ctx["mobiles"]),
+        "complain_type": rng.choice(COMPLAINT_TYPES), "complain_description": "Load test complaint",
+        "complain_date": date.today().isoformat(), "train_number": rng.choice(ctx["train_nos"]),
+        "coach": "B2", "berth_no": str(rng.randrange(1, 73))
+    }
+
+
+def image_file(ctx, rng, field):
+    return (field, ("photo.jpg", rng.choice(ctx["images"]), "image/jpeg"))
+
+
+def bulk_csv(ctx, rng, rows=20):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(["name", "mobile_number", "complain_type", "complain_description", "train_number", "coach"])
+    for _ in range(rows):
+        writer.writerow(["Bulk Passenger", rng.choice(ctx["mobiles"]), rng.choice(COMPLAINT_TYPES),
+                         "Bulk load test complaint", rng.choice(ctx["train_nos"]), "S1"])
+    return buffer.getvalue().encode()
+
+
+def take(pool, count=1):
+    if len(pool) < count:
+        return None
+    return [pool.popleft() for _ in range(count)]
+
+
+def _delete_one(ctx, rng):
+    picked = take(ctx["deletable"])
+    if not picked:
+        return None
+    complain_id, name, mobile = picked[0]
+    return {"method": "DELETE", "url": f"/rs_microservice/complaint/delete/{complain_id}",
+            "data": {"name": name, "mobile_number": mobile}}
+
+
+def _bulk_delete(ctx, rng):
+    picked = take(ctx["deletable"], 5)
+    if not picked:
+        return None
+    return {"method": "DELETE", "url": "/rs_microservice/complaint/bulk/delete",
+            "json": {"complain_ids": [row[0] for row in picked]}}
+
+
+def _media_delete(ctx, rng):
+    picked = take(ctx["media"])
+    if not picked:
+        return None
+    media_id, complain_id = picked[0]
+    return {"method": "DELETE", "url": f"/rs_microservice/media/delete/{complain_id}",
+            "data": {"media_ids": [str(media_id)]}}
+
+
+def _list(ctx, rng):
+    params = rng.choice([
+        {}, {"complain_status": rng.choice(STATUSES)}, {"train_number": rng.choice(ctx["train_nos"])},
+        {"depot": rng.choice(ctx["depots"])}, {"complain_type": rng.choice(COMPLAINT_TYPES)},
+    ])
+    return {"method": "GET", "url": "/rs_microservice/complaint/list", "params": params}
+
+
+def _by_date(ctx, rng):
+    complain_date, mobile = rng.choice(ctx["date_lookups"])
+    return {"method": "GET", "url": f"/rs_microservice/complaint/get/date/{complain_date}",
+            "params": {"mobile_number": mobile}}
+
+
+def _etag(ctx, rng):
+    complain_id, etag = rng.choice(ctx["etags"])
+    return {"method": "GET", "url": f"/rs_microservice/complaint/get/{complain_id}",
+            "headers": {"If-None-Match": etag}}
+
+
+def _get(url):
+    return lambda ctx, rng: {"method": "GET", "url": url}
+
+
+def _post(url):
+    return lambda ctx, rng: {"method": "POST", "url": url}
+
+
+def _random_id(ctx, rng):
+    return rng.choice(ctx["complain_ids"])
+
+
+# (name, phase, request builder, accepted statuses). A builder returning
+# None means its pool of seeded rows is used up.
+SCENARIOS = [
+    ("root", "read", _get("/rs_microservice"), (200,)),
+    ("complaint_get", "read", lambda ctx, rng: {
+        "method": "GET", "url": f"/rs_microservice/complaint/get/{_random_id(ctx, rng)}"}, (200,)),
+    ("complaint_get_not_modified", "read", _etag, (304,)),
+    ("complaint_by_date", "read", _by_date, (200,)),
+    ("complaint_list", "read", _list, (200,)),
+    ("complaint_list_next_page", "read", lambda ctx, rng: {
+        "method": "GET", "url": "/rs_microservice/complaint/list", "params": {"cursor": ctx["list_cursor"]}}, (200,)),
+    ("complaint_changes", "read", lambda ctx, rng: {
+        "method": "GET", "url": "/rs_microservice/complaint/changes",
+        "params": {"mobile_number": rng.choice(ctx["mobiles"])}}, (200,)),
+    ("media_status", "read", lambda ctx, rng: {
+        "method": "GET", "url": f"/rs_microservice/complaint/media/status/{_random_id(ctx, rng)}"}, (200,)),
+    ("train_details", "read", lambda ctx, rng: {
+        "method": "GET", "url": f"/rs_microservice/train_details/{rng.choice(ctx['train_nos'])}"}, (200,)),
+    ("admin_train_cache", "read", _get("/rs_microservice/admin/train_cache"), (200,)),
+    ("admin_complaint_cache", "read", _get("/rs_microservice/admin/complaint_cache"), (200,)),
+    ("admin_recipient_index", "read", _get("/rs_microservice/admin/recipient_index"), (200,)),
+    ("admin_email_outbox", "read", _get("/rs_microservice/admin/email_outbox"), (200,)),
+    ("admin_video_transcoder", "read", _get("/rs_microservice/admin/video_transcoder"), (200,)),
+    ("admin_media_storage", "read", _get("/rs_microservice/admin/media_storage"), (200,)),
+    ("admin_slow_queries", "read", _get("/rs_microservice/admin/slow_queries"), (200,)),
+    ("health", "read", _get("/health"), (200,)),
+    ("health_db", "read", _get("/health/db"), (200,)),
+    ("metrics", "read", _get("/metrics"), (200,)),
+
+    ("complaint_add", "write", lambda ctx, rng: {
+        "method": "POST", "url": "/rs_microservice/complaint/add", "data": complaint_form(ctx, rng)}, (200,)),
+    ("complaint_add_with_media", "write", lambda ctx, rng: {
+        "method": "POST", "url": "/rs_microservice/complaint/add", "data": complaint_form(ctx, rng),
+        "files": [image_file(ctx, rng, "rail_sathi_complain_media_files")]}, (200,)),
+    ("media_upload", "write", lambda ctx, rng: {
+        "method": "POST", "url": "/rs_microservice/complaint/media/upload",
+        "data": {"complain_id": str(_random_id(ctx, rng)), "created_by": "bench"},
+        "files": [image_file(ctx, rng, "files")]}, (200,)),
+    ("complaint_update", "write", lambda ctx, rng: {
+        "method": "PATCH", "url": f"/rs_microservice/complaint/update/{_random_id(ctx, rng)}",
+        "data": {"complain_status": rng.choice(STATUSES)}}, (200,)),
+    ("bulk_ingest", "write", lambda ctx, rng: {
+        "method": "POST", "url": "/rs_microservice/complaint/bulk", "data": {"notify": "false"},
+        "files": [("file", ("complaints.csv", bulk_csv(ctx, rng), "text/csv"))]}, (200,)),
+    ("bulk_update", "write", lambda ctx, rng: {
+        "method": "PATCH", "url": "/rs_microservice/complaint/bulk/update",
+        "json": {"complain_ids": rng.sample(ctx["complain_ids"], 5),
+                 "changes": {"complain_status": rng.choice(STATUSES)}}}, (200,)),
+    ("admin_train_cache_invalidate", "write", _post("/rs_microservice/admin/train_cache/invalidate"), (200,)),
+    ("admin_train_cache_reload", "write", _post("/rs_microservice/admin/train_cache/reload"), (200,)),
+    ("admin_complaint_cache_invalidate", "write", _post("/rs_microservice/admin/complaint_cache/invalidate"), (200,)),
+    ("admin_recipient_index_invalidate", "write", _post("/rs_microservice/admin/recipient_index/invalidate"), (200,)),
+    ("admin_slow_queries_reset", "write", _post("/rs_microservice/admin/slow_queries/reset"), (200,)),
+
+    ("complaint_delete", "delete", _delete_one, (200,)),
+    ("bulk_delete", "delete", _bulk_delete, (200,)),
+    ("media_delete", "delete", _media_delete, (200,)),
+]
+
+
+async def prepare(client, ctx, rng):
+    """Collect ETags and a list cursor from the running app"""
+    ctx["etags"] = []
+    for complain_id in rng.sample(ctx["complain_ids"], min(200, len(ctx["complain_ids"]))):
+        response = await client.get(f"/rs_microservice/complaint/get/{complain_id}")
+        ctx["etags"].append((complain_id, response.headers["etag"]))
+    ctx["list_cursor"] = (await client.get("/rs_microservice/complaint/list")).json()["next_cursor"]
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, max(math.ceil(pct / 100 * len(values)) - 1, 0))]
+
+
+async def run_scenario(client, name, build, accepted, ctx, concurrency, duration, seed_value):
+    latencies, statuses = [], Counter()
+    deadline = time.perf_counter() + duration
+
+    async def worker(n):
+        rng = random.Random(f"{seed_value}:{name}:{concurrency}:{n}")
+        while time.perf_counter() < deadline:
+            request = build(ctx, rng)
+            if request is None:
+                return
+            started = time.perf_counter()
+            try:
+                status = (await client.request(**request)).status_code
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            latencies.append(time.perf_counter() - started)
+            statuses[status] += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(n) for n in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    requests = len(latencies)
+    errors = sum(count for status, count in statuses.items() if status not in accepted)
+    return {
+        "scenario": name, "concurrency": concurrency, "requests": requests, "errors": errors,
+        "error_rate": round(errors / requests, 4) if requests else 0.0,
+        "throughput_rps": round(requests / elapsed, 2) if elapsed else 0.0,
+        "mean_ms": round(sum(latencies) / requests * 1000, 3) if requests else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+        "statuses": {str(status): count for status, count in sorted(statuses.items(), key=str)},
+    }
+
+
+def compare(results, baseline, max_regression, max_error_rate, min_delta_ms):
+    """Return a message per scenario that regressed against baseline"""
+    previous = {(r["scenario"], r["concurrency"]): r for r in baseline["results"]}
+    failures = []
+    for result in results:
+        key = (result["scenario"], result["concurrency"])
+        label = f"{result['scenario']} @ {result['concurrency']}"
+        if result["error_rate"] > max_error_rate:
+            failures.append(f"{label}: error rate {result['error_rate']:.2%} exceeds {max_error_rate:.2%}")
+        before = previous.get(key)
+        if not before or not result["requests"]:
+            continue
+        if (result["p95_ms"] > before["p95_ms"] * (1 + max_regression)
+                and result["p95_ms"] - before["p95_ms"] > min_delta_ms):
+            failures.append(f"{label}: p95 {before['p95_ms']:.1f} ms -> {result['p95_ms']:.1f} ms")
+        if result["throughput_rps"] < before["throughput_rps"] * (1 - max_regression):
+            failures.append(f"{label}: throughput {before['throughput_rps']:.1f} -> "
+                            f"{result['throughput_rps']:.1f} req/s")
+    return failures
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+async def run(args):
+    rng = random.Random(args.seed)
+    workdir = tempfile.mkdtemp(prefix="rail_sathi_loadtest_")
+    postgres = None
+    dsn = args.database_url
+    if not dsn:
+        postgres = LocalPostgres()
+        dsn = postgres.start()
+    sink = SmtpSink()
+    await sink.start()
+    app = None
+    try:
+        print(f"Seeding {args.complaints} complaints ...")
+        apply_schema(dsn)
+        ctx = seed(dsn, args.complaints, args.deletable, rng)
+        ctx["images"] = make_images(50, rng)
+
+        app, base_url = start_app(dsn, sink.port, workdir, args.workers)
+        limits = httpx.Limits(max_connections=max(args.concurrency), max_keepalive_connections=max(args.concurrency))
+        async with httpx.AsyncClient(base_url=base_url, timeout=args.timeout, limits=limits,
+                                     headers={"X-Admin-Token": ADMIN_API_TOKEN}) as client:
+            await wait_until_healthy(client, app)
+            await prepare(client, ctx, rng)
+            results = []
+            print(f"{'scenario':<34} {'conc':>4} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>6}")
+            for phase in ("read", "write", "delete"):
+                for name, scenario_phase, build, accepted in SCENARIOS:
+                    if scenario_phase != phase or (args.scenarios and name not in args.scenarios):
+                        continue
+                    for concurrency in args.concurrency:
+                        result = await run_scenario(client, name, build, accepted, ctx, concurrency,
+                                                    args.duration, args.seed)
+                        results.append(result)
+                        print(f"{name:<34} {concurrency:>4} {result['throughput_rps']:>9.1f} "
+                              f"{result['p50_ms']:>8.1f} {result['p95_ms']:>8.1f} {result['p99_ms']:>8.1f} "
+                              f"{result['errors']:>6}")
+        return {
+            "started_at": datetime.now().isoformat(timespec="seconds"),
+            "git_commit": git_commit(),
+            "settings": {
+                "concurrency": args.concurrency, "duration": args.duration, "complaints": args.complaints,
+                "seed": args.seed, "workers": args.workers
+            },
+            "smtp_messages": sink.messages,
+            "results": results,
+        }
+    finally:
+        if app is not None:
+            app.terminate()
+            try:
+                app.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                app.kill()
+        await sink.stop()
+        if postgres is not None:
+            postgres.stop()
+        if args.keep_workdir:
+            print(f"App log and slow query plans kept in {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", help="empty database to use instead of a throwaway cluster")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32], help="concurrent clients")
+    parser.add_argument("--duration", type=float, default=10, help="seconds per scenario and level")
+    parser.add_argument("--complaints", type=int, default=20000, help="complaints seeded")
+    parser.add_argument("--deletable", type=int, default=20000, help="complaints seeded for delete scenarios")
+    parser.add_argument("--seed", type=int, default=42, help="random seed for data and requests")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--timeout", type=float, default=30, help="per-request timeout in seconds")
+    parser.add_argument("--scenarios", nargs="+", help="only run these scenarios")
+    parser.add_argument("--output", help="results file (default: benchmarks/results/loadtest-<time>.json)")
+    parser.add_argument("--baseline", help="previous results file to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.2,
+                        help="allowed relative p95 increase / throughput drop (default 0.2)")
+    parser.add_argument("--min-delta-ms", type=float, default=2,
+                        help="p95 increases smaller than this are treated as noise")
+    parser.add_argument("--max-error-rate", type=float, default=0.01, help="allowed share of failed requests")
+    parser.add_argument("--keep-workdir", action="store_true", help="keep the app log and plan file")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    output = args.output or os.path.join(RESULTS_DIR, f"loadtest-{datetime.now():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {output} ({report['smtp_messages']} emails reached the SMTP sink)")
+
+    failures = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            failures = compare(report["results"], json.load(f), args.max_regression,
+                               args.max_error_rate, args.min_delta_ms)
+    else:
+        failures = [f"{r['scenario']} @ {r['concurrency']}: error rate {r['error_rate']:.2%}"
+                    for r in report["results"] if r["error_rate"] > args.max_error_rate]
+    if failures:
+        print("FAILED:")
+        for failure in failures:
+            print(f"  {failure}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,305 @@
+"""
+Micro-benchmark for the media processing pipeline.
+
+Generates a corpus of images (several sizes; RGB JPEG, RGB PNG and RGBA PNG)
+and short test-pattern videos with ffmpeg, then runs each file through
+services.process_media_file_upload with the memory storage backend, so
+nothing leaves the machine. Every corpus file is measured in a fresh
+subprocess, --iterations times after one warm-up run:
+
+- images: decode_ms (open, draft, orientation and RGB conversion),
+  render_ms (render_image_derivatives: decode, resizes and JPEG encodes
+  in-process) and pipeline_ms (the full call, through the image process pool)
+- videos: poster_ms (extract_poster), encode_ms (the ffmpeg transcode
+  reported by transcode_video) and pipeline_ms
+- output_bytes stored per file, peak RSS of the process and its children
+  (image pool workers, ffmpeg), and throughput per core: files and input MB
+  per CPU second spent in render_image_derivatives or transcode_video
+  (ffmpeg included)
+
+Results go to a JSON file. With --baseline (a previous results file) the
+run exits with status 1 when a file's pipeline_ms or CPU time per file
+grows, or its throughput per core drops, by more than --max-regression, or
+when its output grows by more than --max-size-growth.
+
+    python benchmarks/media_pipeline.py --iterations 5
+    python benchmarks/media_pipeline.py --only image --baseline benchmarks/results/media-baseline.json
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import resource
+import tempfile
+import subprocess
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+for key, value in {
+    "MAIL_USERNAME": "bench", "MAIL_PASSWORD": "bench", "MAIL_FROM": "bench@example.com",
+    "POSTGRES_HOST": "localhost", "POSTGRES_USER": "bench",
+    "POSTGRES_PASSWORD": "bench", "POSTGRES_DB": "bench",
+    "MEDIA_STORAGE_BACKEND": "memory", "IMAGE_PROCESS_WORKERS": "1",
+}.items():
+    os.environ.setdefault(key, value)
+
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+
+IMAGE_SIZES = {"vga": (640, 480), "fhd": (1920, 1080), "12mp": (4032, 3024), "48mp": (8000, 6000)}
+# (mode, format, extension)
+IMAGE_VARIANTS = [("RGB", "JPEG", "jpg"), ("RGB", "PNG", "png"), ("RGBA", "PNG", "png")]
+# name: (width, height, seconds); "small" stays under VIDEO_SKIP_BELOW_BYTES
+VIDEO_CLIPS = {"small": (320, 240, 2), "480p": (854, 480, 5), "720p": (1280, 720, 5), "1080p": (1920, 1080, 5)}
+
+
+# ---------- corpus ----------
+
+def make_image(path, size, mode, fmt):
+    """Gradient plus noise plus a few shapes: compresses like a photo, not like a flat fill"""
+    from PIL import Image, ImageDraw
+    width, height = size
+    gradient = Image.linear_gradient("L").resize(size)
+    noise = Image.effect_noise(size, 40)
+    image = Image.merge("RGB", (gradient, noise, gradient.transpose(Image.FLIP_LEFT_RIGHT)))
+    draw = ImageDraw.Draw(image)
+    for i in range(12):
+        box = (width * i // 14, height * (i % 4) // 5, width * (i + 2) // 14, height * (i % 4 + 1) // 5)
+        draw.ellipse(box, fill=(40 * (i % 6), 255 - 20 * i, 90))
+    if mode == "RGBA":
+        image.putalpha(Image.linear_gradient("L").rotate(90).resize(size))
+    save = {"quality": 92} if fmt == "JPEG" else {"compress_level": 6}
+    image.save(path, fmt, **save)
+
+
+def make_video(path, width, height, seconds):
+    from utils.video_transcoder import FFMPEG_BINARY
+    subprocess.run([
+        FFMPEG_BINARY, "-hide_banner", "-loglevel", "error", "-y",
+        "-f", "lavfi", "-i", f"testsrc2=size={width}x{height}:rate=30:duration={seconds}",
+        "-f", "lavfi", "-i", f"sine=frequency=440:duration={seconds}",
+        # A high-bitrate older codec, like phone uploads that are worth re-encoding
+        "-c:v", "mpeg4", "-q:v", "2", "-c:a", "aac", "-b:a", "192k", "-shortest", path
+    ], check=True)
+
+
+def build_corpus(directory, only):
+    """Create missing corpus files and return [(name, media_type, format, path)]"""
+    os.makedirs(directory, exist_ok=True)
+    corpus = []
+    if only in (None, "image"):
+        for size_name, size in IMAGE_SIZES.items():
+            for mode, fmt, extension in IMAGE_VARIANTS:
+                name = f"image_{size_name}_{mode.lower()}_{extension}"
+                path = os.path.join(directory, f"{name}.{extension}")
+                if not os.path.exists(path):
+                    make_image(path, size, mode, fmt)
+                corpus.append((name, "image", extension, path))
+    if only in (None, "video"):
+        for clip_name, (width, height, seconds) in VIDEO_CLIPS.items():
+            name = f"video_{clip_name}_mp4"
+            path = os.path.join(directory, f"{name}.mp4")
+            if not os.path.exists(path):
+                make_video(path, width, height, seconds)
+            corpus.append((name, "video", "mp4", path))
+    return corpus
+
+
+# ---------- measurement (child process) ----------
+
+def cpu_seconds():
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime
+
+
+def median_ms(values):
+    values = sorted(values)
+    middle = len(values) // 2
+    value = values[middle] if len(values) % 2 else (values[middle - 1] + values[middle]) / 2
+    return round(value * 1000, 3)
+
+
+def timed_runs(fn, iterations):
+    fn()
+    runs = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        fn()
+        runs.append(time.perf_counter() - started)
+    return runs
+
+
+def measure_image_stages(path, iterations):
+    from PIL import Image, ImageOps
+    from utils.image_pipeline import IMAGE_MAX_DIMENSION, _to_rgb, render_image_derivatives
+
+    def decode():
+        with Image.open(path) as img:
+            if img.format == "JPEG":
+                img.draft("RGB", (IMAGE_MAX_DIMENSION, IMAGE_MAX_DIMENSION))
+            _to_rgb(ImageOps.exif_transpose(img)).load()
+
+    def render():
+        with tempfile.TemporaryDirectory() as output_dir:
+            render_image_derivatives(path, output_dir)
+
+    decode_runs = timed_runs(decode, iterations)
+    cpu_before = cpu_seconds()
+    render_runs = timed_runs(render, iterations)
+    # The warm-up run is included, so divide by every run
+    cpu = (cpu_seconds() - cpu_before) / (iterations + 1)
+    return {"decode_ms": median_ms(decode_runs), "render_ms": median_ms(render_runs)}, cpu
+
+
+def measure_video_stages(path, iterations):
+    from utils.video_transcoder import extract_poster, transcode_video
+
+    def poster():
+        with tempfile.TemporaryDirectory() as output_dir:
+            extract_poster(path, os.path.join(output_dir, "poster.jpg"))
+
+    encode_seconds = []
+
+    def transcode():
+        # Poster and transcode, as the pipeline runs them; encode_seconds is the transcode alone
+        with tempfile.TemporaryDirectory() as work_dir:
+            encode_seconds.append(transcode_video(path, work_dir)["encode_seconds"])
+
+    poster_runs = timed_runs(poster, iterations)
+    cpu_before = cpu_seconds()
+    timed_runs(transcode, iterations)
+    cpu = (cpu_seconds() - cpu_before) / (iterations + 1)
+    return {"poster_ms": median_ms(poster_runs), "encode_ms": median_ms(encode_seconds[1:])}, cpu
+
+
+def child(case, iterations):
+    """Measure one corpus file and print the result as JSON"""
+    import services
+    from utils.media_storage import get_storage
+    from utils.image_pipeline import get_image_process_pool
+
+    name, media_type, file_format, path = case
+    input_bytes = os.path.getsize(path)
+    measure = measure_image_stages if media_type == "image" else measure_video_stages
+    stages, cpu = measure(path, iterations)
+
+    results = []
+
+    def pipeline():
+        result = services.process_media_file_upload(path, file_format, 0, media_type)
+        if result is None:
+            raise RuntimeError(f"process_media_file_upload failed for {name}")
+        results.append(result)
+
+    pipeline_runs = timed_runs(pipeline, iterations)
+    # Pool workers only count towards RUSAGE_CHILDREN once they have exited
+    get_image_process_pool().shutdown(wait=True)
+
+    storage = get_storage()
+    output_bytes = sum(len(storage.objects[key]["data"]) for key in results[-1]["storage_keys"])
+    peak_rss_kb = max(resource.getrusage(who).ru_maxrss for who in (resource.RUSAGE_SELF, resource.RUSAGE_CHILDREN))
+    print(json.dumps({
+        "name": name, "media_type": media_type, "input_bytes": input_bytes,
+        **stages,
+        "pipeline_ms": median_ms(pipeline_runs),
+        "cpu_seconds_per_file": round(cpu, 4),
+        "files_per_core_second": round(1 / cpu, 3) if cpu else None,
+        "input_mb_per_core_second": round(input_bytes / 2 ** 20 / cpu, 3) if cpu else None,
+        "output_bytes": output_bytes,
+        "output_ratio": round(output_bytes / input_bytes, 4),
+        "peak_rss_mb": round(peak_rss_kb / 1024, 1),
+    }))
+
+
+# ---------- driver ----------
+
+def compare(results, baseline, max_regression, max_size_growth):
+    """Return a message per corpus file that regressed against baseline"""
+    previous = {r["name"]: r for r in baseline["results"]}
+    failures = []
+    for result in results:
+        before = previous.get(result["name"])
+        if not before:
+            continue
+        name = result["name"]
+        if result["pipeline_ms"] > before["pipeline_ms"] * (1 + max_regression):
+            failures.append(f"{name}: pipeline {before['pipeline_ms']:.1f} ms -> {result['pipeline_ms']:.1f} ms")
+        if result["cpu_seconds_per_file"] > before["cpu_seconds_per_file"] * (1 + max_regression):
+            failures.append(f"{name}: CPU per file {before['cpu_seconds_per_file']:.3f} s -> "
+                            f"{result['cpu_seconds_per_file']:.3f} s")
+        if (result["files_per_core_second"] or 0) < (before["files_per_core_second"] or 0) * (1 - max_regression):
+            failures.append(f"{name}: throughput {before['files_per_core_second']} -> "
+                            f"{result['files_per_core_second']} files per core second")
+        if result["output_bytes"] > before["output_bytes"] * (1 + max_size_growth):
+            failures.append(f"{name}: output {before['output_bytes']} -> {result['output_bytes']} bytes")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--iterations", type=int, default=5, help="timed runs per file and stage")
+    parser.add_argument("--only", choices=["image", "video"], help="only benchmark one media type")
+    parser.add_argument("--corpus-dir", help="keep and reuse the generated corpus here (default: temporary)")
+    parser.add_argument("--output", help="results file (default: benchmarks/results/media-<time>.json)")
+    parser.add_argument("--baseline", help="previous results file to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.2,
+                        help="allowed relative increase in time / drop in throughput (default 0.2)")
+    parser.add_argument("--max-size-growth", type=float, default=0.05,
+                        help="allowed relative increase in output size (default 0.05)")
+    parser.add_argument("--child", nargs=4, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child, args.iterations)
+        return
+
+    corpus_dir = args.corpus_dir or tempfile.mkdtemp(prefix="rail_sathi_media_corpus_")
+    try:
+        corpus = build_corpus(corpus_dir, args.only)
+        results = []
+        print(f"{'file':<24} {'input KB':>9} {'decode/poster':>13} {'render/encode':>13} {'pipeline':>9} "
+              f"{'files/core-s':>12} {'output KB':>9} {'RSS MB':>7}")
+        for case in corpus:
+            output = subprocess.run(
+                [sys.executable, __file__, "--iterations", str(args.iterations), "--child", *case],
+                check=True, capture_output=True, text=True, env=os.environ,
+            ).stdout.strip().splitlines()[-1]
+            result = json.loads(output)
+            results.append(result)
+            first = result.get("decode_ms", result.get("poster_ms"))
+            second = result.get("render_ms", result.get("encode_ms"))
+            print(f"{result['name']:<24} {result['input_bytes'] / 1024:>9.0f} {first:>13.1f} {second:>13.1f} "
+                  f"{result['pipeline_ms']:>9.1f} {result['files_per_core_second'] or 0:>12.2f} "
+                  f"{result['output_bytes'] / 1024:>9.0f} {result['peak_rss_mb']:>7.1f}")
+    finally:
+        if not args.corpus_dir:
+            shutil.rmtree(corpus_dir, ignore_errors=True)
+
+    report = {
+        "started_at": datetime.now().isoformat(timespec="seconds"),
+        "cpu_count": os.cpu_count(),
+        "settings": {"iterations": args.iterations, "only": args.only},
+        "results": results,
+    }
+    output = args.output or os.path.join(RESULTS_DIR, f"media-{datetime.now():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            failures = compare(results, json.load(f), args.max_regression, args.max_size_growth)
+        if failures:
+            print("FAIL:")
+            for failure in failures:
+                print(f"  {failure}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
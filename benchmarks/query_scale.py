@@ -0,0 +1,222 @@
+"""
+Query benchmark at increasing data sizes.
+
+For each --scales step the database is topped up with benchmarks/datagen.py
+to that many complaints (media and users per its settings), vacuumed and
+analyzed. Then every case below is timed over --iterations executions with
+fresh parameters each time:
+
+- complaint_by_id / complaint_version: get_complaint_by_id_async and the ETag check
+- complaints_by_date_hot / _cold: get_complaints_by_date_async for the busiest
+  mobile number and for a random one
+- complaint_list*: the first page of the listing, unfiltered and by a busy
+  train, a depot and a status
+- complaint_changes_hot: a change feed poll for the busiest mobile number
+- recipient_role_users / recipient_train_access: the two queries behind the
+  notification recipient index, plus recipient_index_build, a full rebuild
+  of the index in this process
+
+The queries are the statements in services.py and utils/recipient_index.py,
+sent over a plain connection, so the times are database time plus transfer.
+One EXPLAIN (ANALYZE, BUFFERS) plan per case and scale goes into the report
+along with row counts and table sizes, written as JSON to --output.
+
+    python benchmarks/query_scale.py --scales 100000 1000000 10000000
+    python benchmarks/query_scale.py --database-url postgresql://bench@127.0.0.1/rail_sathi_bench
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+from datetime import datetime, timezone
+
+import psycopg2
+from psycopg2.extensions import parse_dsn
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import datagen
+from loadtest import LocalPostgres, apply_schema, percentile, git_commit, RESULTS_DIR
+
+TABLES = [
+    "rail_sathi_railsathicomplain", "rail_sathi_railsathicomplainmedia", "user_onboarding_user",
+    "trains_trainaccess", "trains_traindetails",
+]
+
+
+def configure_app_env(dsn):
+    """Point the app's database settings at dsn; must run before services is imported"""
+    params = parse_dsn(dsn)
+    os.environ.update({
+        "POSTGRES_HOST": params.get("host", "127.0.0.1"), "POSTGRES_PORT": params.get("port", "5432"),
+        "POSTGRES_USER": params.get("user", "bench"), "POSTGRES_PASSWORD": params.get("password", ""),
+        "POSTGRES_DB": params["dbname"], "MAIL_USERNAME": "bench", "MAIL_PASSWORD": "bench",
+        "MAIL_FROM": "bench@example.com", "MEDIA_STORAGE_BACKEND": "memory",
+    })
+
+
+def build_cases(args):
+    import services
+    from utils.recipient_index import (
+        ROLE_USERS_QUERY, TRAIN_ACCESS_USERS_QUERY, WAR_ROOM_ROLE, S2_ADMIN_ROLE, RAILWAY_ADMIN_ROLE
+    )
+
+    hot_mobile = datagen.mobile_for_rank(0)
+    hot_train = str(datagen.train_no_for_rank(0))
+
+    def random_id(ctx, rng):
+        return (rng.randint(1, ctx["complaints"]),)
+
+    def date_of(mobile_sql):
+        def params(ctx, rng):
+            ctx["cursor"].execute(mobile_sql, (rng.randint(1, ctx["complaints"]),))
+            return ctx["cursor"].fetchone()
+        return params
+
+    def hot_date(ctx, rng):
+        return (rng.choice(ctx["hot_dates"]), hot_mobile)
+
+    def listing(filters):
+        return lambda ctx, rng: services._complaint_list_statement(filters(rng), None, services.COMPLAINT_PAGE_SIZE)
+
+    # (name, query or None when the builder returns (query, params), params builder)
+    return [
+        ("complaint_by_id", services.COMPLAINT_BY_ID_FULL_QUERY, random_id),
+        ("complaint_version", services.COMPLAINT_VERSION_QUERY, random_id),
+        ("complaints_by_date_hot", services.COMPLAINTS_BY_DATE_QUERY, hot_date),
+        ("complaints_by_date_cold", services.COMPLAINTS_BY_DATE_QUERY, date_of(
+            "SELECT complain_date, mobile_number FROM rail_sathi_railsathicomplain WHERE complain_id = %s"
+        )),
+        ("complaint_list", None, listing(lambda rng: {})),
+        ("complaint_list_hot_train", None, listing(lambda rng: {"train_number": hot_train})),
+        ("complaint_list_depot", None, listing(lambda rng: {
+            "depot": datagen.depot_for_train(rng.randrange(args.trains), args.depots)})),
+        ("complaint_list_status", None, listing(lambda rng: {"complain_status": rng.choice(datagen.STATUSES)})),
+        ("complaint_changes_hot", None, lambda ctx, rng: services._complaint_feed_statement(
+            {"mobile_number": hot_mobile}, None, services.CHANGE_FEED_PAGE_SIZE, datetime.now(timezone.utc))),
+        ("recipient_role_users", ROLE_USERS_QUERY,
+         lambda ctx, rng: (WAR_ROOM_ROLE, S2_ADMIN_ROLE, RAILWAY_ADMIN_ROLE)),
+        ("recipient_train_access", TRAIN_ACCESS_USERS_QUERY, lambda ctx, rng: None),
+    ]
+
+
+def table_stats(cursor):
+    stats = {}
+    for table in TABLES:
+        cursor.execute(f"SELECT count(*), pg_total_relation_size(%s), pg_indexes_size(%s) FROM {table}",
+                       (table, table))
+        rows, total_bytes, index_bytes = cursor.fetchone()
+        stats[table] = {"rows": rows, "total_mb": round(total_bytes / 2 ** 20, 1),
+                        "index_mb": round(index_bytes / 2 ** 20, 1)}
+    return stats
+
+
+def summarize(latencies, rows, plan):
+    latencies.sort()
+    return {
+        "rows": rows,
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 3),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+        "max_ms": round(latencies[-1] * 1000, 3),
+        "plan": plan,
+    }
+
+
+def run_case(cursor, ctx, query, build, iterations, rng):
+    latencies, rows = [], 0
+    for i in range(iterations + 1):
+        statement, params = (query, build(ctx, rng)) if query else build(ctx, rng)
+        started = time.perf_counter()
+        cursor.execute(statement, params)
+        rows = len(cursor.fetchall())
+        # The first execution warms the cache and is not counted
+        if i:
+            latencies.append(time.perf_counter() - started)
+    cursor.execute(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT TEXT) {statement}", params)
+    plan = [row[0] for row in cursor.fetchall()]
+    return summarize(latencies, rows, plan)
+
+
+def time_recipient_index(iterations):
+    from utils.recipient_index import RecipientIndex
+    index = RecipientIndex(ttl=0)
+    latencies = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        index.refresh()
+        latencies.append(time.perf_counter() - started)
+    return summarize(latencies, index.stats()["trains"], [])
+
+
+def measure(dsn, scale, cases, args):
+    conn = psycopg2.connect(dsn)
+    conn.autocommit = True
+    cursor = conn.cursor()
+    cursor.execute("SELECT DISTINCT complain_date FROM rail_sathi_railsathicomplain WHERE mobile_number = %s",
+                   (datagen.mobile_for_rank(0),))
+    ctx = {"complaints": scale, "cursor": conn.cursor(), "hot_dates": [row[0] for row in cursor.fetchall()]}
+    rng = random.Random(args.seed)
+    results = {"complaints": scale, "tables": table_stats(cursor), "cases": {}}
+    for name, query, build in cases:
+        if args.cases and name not in args.cases:
+            continue
+        results["cases"][name] = result = run_case(cursor, ctx, query, build, args.iterations, rng)
+        print(f"{scale:>12,} {name:<28} {result['rows']:>7} {result['p50_ms']:>9.2f} {result['p95_ms']:>9.2f} "
+              f"{result['max_ms']:>9.2f}")
+    if not args.cases or "recipient_index_build" in args.cases:
+        results["cases"]["recipient_index_build"] = result = time_recipient_index(max(args.iterations // 10, 3))
+        print(f"{scale:>12,} {'recipient_index_build':<28} {result['rows']:>7} {result['p50_ms']:>9.2f} "
+              f"{result['p95_ms']:>9.2f} {result['max_ms']:>9.2f}")
+    conn.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", help="disposable database to fill instead of a throwaway cluster")
+    parser.add_argument("--scales", type=int, nargs="+", default=[100_000, 1_000_000, 10_000_000],
+                        help="complaint counts to measure at, ascending")
+    parser.add_argument("--iterations", type=int, default=50, help="timed executions per case")
+    parser.add_argument("--cases", nargs="+", help="only run these cases")
+    parser.add_argument("--output", help="report file (default: benchmarks/results/query_scale-<time>.json)")
+    datagen.add_arguments(parser)
+    args = parser.parse_args()
+
+    postgres = None
+    dsn = args.database_url
+    if not dsn:
+        postgres = LocalPostgres()
+        dsn = postgres.start()
+    try:
+        apply_schema(dsn)
+        configure_app_env(dsn)
+        cases = build_cases(args)
+        report = {
+            "started_at": datetime.now().isoformat(timespec="seconds"),
+            "git_commit": git_commit(),
+            "settings": {key: value for key, value in vars(args).items() if key not in ("database_url", "output")},
+            "scales": [],
+        }
+        print(f"{'complaints':>12} {'case':<28} {'rows':>7} {'p50 ms':>9} {'p95 ms':>9} {'max ms':>9}")
+        for scale in sorted(args.scales):
+            started = time.monotonic()
+            datagen.generate_from_args(dsn, scale, args)
+            print(f"Loaded up to {scale:,} complaints in {time.monotonic() - started:.0f}s", file=sys.stderr)
+            report["scales"].append(measure(dsn, scale, cases, args))
+    finally:
+        if postgres is not None:
+            postgres.stop()
+
+    output = args.output or os.path.join(RESULTS_DIR, f"query_scale-{datetime.now():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2, default=str)
+    print(f"Report with plans written to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+-- Minimal versions of the tables this service shares with the main Django
+-- application, with the columns the service reads and writes. Used by the
+-- benchmarks to build a disposable database; migrations/ is applied on top.
+
+CREATE TABLE IF NOT EXISTS trains_traindetails (
+    id SERIAL PRIMARY KEY,
+    train_no INTEGER NOT NULL UNIQUE,
+    train_name VARCHAR(255),
+    depot VARCHAR(64)
+);
+
+CREATE TABLE IF NOT EXISTS user_onboarding_roles (
+    id SERIAL PRIMARY KEY,
+    name VARCHAR(100) NOT NULL UNIQUE
+);
+
+CREATE TABLE IF NOT EXISTS user_onboarding_user (
+    id SERIAL PRIMARY KEY,
+    email VARCHAR(254),
+    first_name VARCHAR(150),
+    last_name VARCHAR(150),
+    phone VARCHAR(20),
+    depo VARCHAR(255),
+    user_type_id INTEGER REFERENCES user_onboarding_roles (id)
+);
+
+CREATE TABLE IF NOT EXISTS trains_trainaccess (
+    id SERIAL PRIMARY KEY,
+    user_id INTEGER NOT NULL REFERENCES user_onboarding_user (id),
+    train_details JSONB
+);
+
+CREATE TABLE IF NOT EXISTS rail_sathi_railsathicomplain (
+    complain_id SERIAL PRIMARY KEY,
+    pnr_number VARCHAR(20),
+    is_pnr_validated VARCHAR(20) DEFAULT 'not-attempted',
+    name VARCHAR(100),
+    mobile_number VARCHAR(20),
+    complain_type VARCHAR(100),
+    complain_description TEXT,
+    complain_date DATE,
+    complain_status VARCHAR(20) DEFAULT 'pending',
+    train_id INTEGER REFERENCES trains_traindetails (id) ON DELETE SET NULL,
+    train_number VARCHAR(20),
+    train_name VARCHAR(100),
+    coach VARCHAR(10),
+    berth_no INTEGER,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    created_by VARCHAR(100),
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    updated_by VARCHAR(100)
+);
+
+CREATE TABLE IF NOT EXISTS rail_sathi_railsathicomplainmedia (
+    id SERIAL PRIMARY KEY,
+    complain_id INTEGER NOT NULL REFERENCES rail_sathi_railsathicomplain (complain_id) ON DELETE CASCADE,
+    media_type VARCHAR(20),
+    media_url TEXT NOT NULL,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    created_by VARCHAR(100),
+    updated_by VARCHAR(100)
+);
+
+CREATE INDEX IF NOT EXISTS rail_sathi_railsathicomplainmedia_complain_id_idx
+    ON rail_sathi_railsathicomplainmedia (complain_id);
@@ -0,0 +1,109 @@
+"""
+Serialization benchmark for complaint list responses.
+
+Builds N complaint rows (two media rows each) with native datetime values,
+the way the database helpers return them, and times turning them into a
+response body two ways:
+
+- before: serialize_rows() string conversion, response_model validation of
+  List[RailSathiComplainResponse], jsonable_encoder and the stdlib
+  JSONResponse, which is what FastAPI did for these endpoints;
+- after: FastJSONResponse (orjson) straight from the rows.
+
+Both bodies are decoded and compared so the output stays identical.
+
+    python benchmarks/serialization.py --sizes 100 1000 10000
+"""
+import os
+import sys
+import json
+import time
+import argparse
+from datetime import datetime, date, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+for key, value in {
+    "MAIL_USERNAME": "bench", "MAIL_PASSWORD": "bench", "MAIL_FROM": "bench@example.com",
+    "POSTGRES_HOST": "localhost", "POSTGRES_USER": "bench",
+    "POSTGRES_PASSWORD": "bench", "POSTGRES_DB": "bench",
+}.items():
+    os.environ.setdefault(key, value)
+
+from typing import List
+from pydantic import TypeAdapter
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from database import serialize_rows
+from main import RailSathiComplainResponse
+from utils.json_response import FastJSONResponse
+
+
+def make_rows(count: int):
+    base = datetime(2025, 7, 1, 8, 30, 15, 123456)
+    complaints = []
+    for i in range(count):
+        created = base + timedelta(minutes=i)
+        media = [{
+            "id": i * 2 + j, "media_type": "image",
+            "media_url": f"https://storage.googleapis.com/bucket/rail_sathi_complain_images/{i}_{j}.jpg",
+            "thumbnail_url": f"https://storage.googleapis.com/bucket/thumbnails/{i}_{j}.jpg",
+            "preview_url": None, "created_at": created, "updated_at": created,
+            "created_by": "passenger", "updated_by": None, "processing_status": "done", "progress": 100
+        } for j in range(2)]
+        complaints.append({
+            "complain_id": i + 1, "pnr_number": "1234567890", "is_pnr_validated": "not-attempted",
+            "name": "Passenger Name", "mobile_number": "9898989898", "complain_type": "cleanliness",
+            "complain_description": "Coach was not cleaned before departure " * 3,
+            "complain_date": date(2025, 7, 1), "complain_status": "pending", "train_id": 42,
+            "train_number": "12951", "train_name": "Mumbai Rajdhani", "coach": "B3", "berth_no": 24,
+            "created_at": created, "created_by": "Passenger Name", "updated_at": created, "updated_by": None,
+            "train_no": 12951, "train_depot": "BCT", "rail_sathi_complain_media_files": media
+        })
+    return complaints
+
+
+response_adapter = TypeAdapter(List[RailSathiComplainResponse])
+
+
+def before(rows):
+    complaints = serialize_rows(rows)
+    for complaint in complaints:
+        complaint["rail_sathi_complain_media_files"] = serialize_rows(complaint["rail_sathi_complain_media_files"])
+    content = [{"message": "Complaint retrieved successfully", "data": c} for c in complaints]
+    validated = response_adapter.validate_python(content)
+    return JSONResponse(jsonable_encoder(validated)).body
+
+
+def after(rows):
+    return FastJSONResponse([{"message": "Complaint retrieved successfully", "data": c} for c in rows]).body
+
+
+def timed(fn, rows, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        body = fn(rows)
+        best = min(best, time.perf_counter() - started)
+    return best, body
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000], help="complaints per response")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per size; the best is reported")
+    args = parser.parse_args()
+
+    print(f"{'complaints':>10} {'before ms':>10} {'after ms':>9} {'speedup':>8} {'bytes':>10}")
+    for size in args.sizes:
+        rows = make_rows(size)
+        before_time, before_body = timed(before, rows, args.repeat)
+        after_time, after_body = timed(after, rows, args.repeat)
+        assert json.loads(before_body) == json.loads(after_body), "responses differ"
+        print(f"{size:>10} {before_time * 1000:>10.1f} {after_time * 1000:>9.1f} "
+              f"{before_time / after_time:>7.1f}x {len(after_body):>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""
+Peak-memory benchmark for the streaming media upload path.
+
+Each file size runs in a fresh subprocess that feeds a multipart request body
+to Starlette chunk by chunk, parses it the way FastAPI does and spools the
+upload through services._spool_upload. Peak RSS should stay flat regardless
+of the file size.
+
+    python benchmarks/upload_memory.py --sizes 10 50 200
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import resource
+import subprocess
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+for key, value in {
+    "MAIL_USERNAME": "bench", "MAIL_PASSWORD": "bench", "MAIL_FROM": "bench@example.com",
+    "POSTGRES_HOST": "localhost", "POSTGRES_USER": "bench",
+    "POSTGRES_PASSWORD": "bench", "POSTGRES_DB": "bench",
+}.items():
+    os.environ.setdefault(key, value)
+
+BOUNDARY = "railsathibenchboundary"
+CHUNK = 256 * 1024
+
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def make_file(path, size_mb):
+    block = os.urandom(CHUNK)
+    with open(path, "wb") as f:
+        for _ in range(size_mb * 1024 * 1024 // CHUNK):
+            f.write(block)
+
+
+def multipart_chunks(path):
+    yield (
+        f"--{BOUNDARY}\r\n"
+        f'Content-Disposition: form-data; name="file"; filename="clip.mp4"\r\n'
+        f"Content-Type: video/mp4\r\n\r\n"
+    ).encode()
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(CHUNK)
+            if not chunk:
+                break
+            yield chunk
+    yield f"\r\n--{BOUNDARY}--\r\n".encode()
+
+
+async def run_upload(path):
+    from starlette.requests import Request
+    import services
+
+    chunks = multipart_chunks(path)
+
+    async def receive():
+        try:
+            return {"type": "http.request", "body": next(chunks), "more_body": True}
+        except StopIteration:
+            return {"type": "http.request", "body": b"", "more_body": False}
+
+    scope = {
+        "type": "http", "method": "POST", "path": "/", "query_string": b"",
+        "headers": [(b"content-type", f"multipart/form-data; boundary={BOUNDARY}".encode())],
+    }
+    request = Request(scope, receive)
+    form = await request.form()
+    spooled = await services._spool_upload(form["file"], 0)
+    size = os.path.getsize(spooled)
+    os.remove(spooled)
+    await form.close()
+    return size
+
+
+def child(size_mb):
+    import services  # noqa: F401 - exclude import cost from the measurement
+
+    with tempfile.TemporaryDirectory() as tmp:
+        source = os.path.join(tmp, "source.bin")
+        make_file(source, size_mb)
+        baseline = peak_rss_mb()
+        started = time.perf_counter()
+        written = asyncio.run(run_upload(source))
+        elapsed = time.perf_counter() - started
+    print(json.dumps({
+        "size_mb": size_mb,
+        "bytes_spooled": written,
+        "seconds": round(elapsed, 3),
+        "baseline_rss_mb": round(baseline, 1),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "rss_growth_mb": round(peak_rss_mb() - baseline, 1),
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 50, 200], help="file sizes in MB")
+    parser.add_argument("--max-growth-mb", type=float, default=64,
+                        help="fail if peak RSS grows more than this during an upload")
+    parser.add_argument("--child", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child)
+        return
+
+    os.environ.setdefault("MEDIA_MAX_UPLOAD_BYTES", str((max(args.sizes) + 1) * 1024 * 1024))
+    results = []
+    print(f"{'size MB':>8} {'seconds':>8} {'MB/s':>8} {'RSS growth MB':>14}")
+    for size_mb in args.sizes:
+        output = subprocess.run(
+            [sys.executable, __file__, "--child", str(size_mb)],
+            check=True, capture_output=True, text=True, env=os.environ,
+        ).stdout.strip().splitlines()[-1]
+        result = json.loads(output)
+        results.append(result)
+        print(f"{size_mb:>8} {result['seconds']:>8} {size_mb / max(result['seconds'], 1e-6):>8.1f} "
+              f"{result['rss_growth_mb']:>14}")
+
+    worst = max(r["rss_growth_mb"] for r in results)
+    if worst > args.max_growth_mb:
+        print(f"FAIL: peak RSS grew by {worst} MB (limit {args.max_growth_mb} MB)")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
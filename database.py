@@ -1,11 +1,20 @@
 import os
+import time
+import asyncio
 import logging
+import threading
 import psycopg2
 import psycopg2.extras
-from contextlib import contextmanager
+import psycopg
+from psycopg.rows import dict_row
+from psycopg_pool import AsyncConnectionPool
+from collections import deque
+from contextlib import contextmanager, asynccontextmanager
 from typing import Dict, List, Optional, Any, Tuple
 from datetime import datetime, date
 from dotenv import load_dotenv
+from utils.metrics import timed, db_query_duration
+from utils.query_stats import tracked
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -24,8 +33,30 @@ DB_CONFIG = {
     'database': os.getenv('POSTGRES_DB', 'rail_sathi_db')
 }
 
-def get_db_connection():
-    """Get database connection"""
+# Connection pool configuration. Each worker process has two pools: the
+# asyncio pool serving requests and a small psycopg2 pool for background
+# work (media jobs, the email outbox, cache refreshes). A process can hold
+# up to DB_POOL_MAX_SIZE + DB_SYNC_POOL_MAX_SIZE connections, so the
+# server needs (DB_POOL_MAX_SIZE + DB_SYNC_POOL_MAX_SIZE) x workers slots.
+POOL_CONFIG = {
+    'min_size': int(os.getenv('DB_POOL_MIN_SIZE', 2)),
+    'max_size': int(os.getenv('DB_POOL_MAX_SIZE', 20)),
+    'timeout': float(os.getenv('DB_POOL_TIMEOUT', 10)),
+    'max_lifetime': float(os.getenv('DB_POOL_MAX_LIFETIME', 1800)),
+    'ping_after_idle': float(os.getenv('DB_POOL_PING_AFTER_IDLE', 30))
+}
+SYNC_POOL_CONFIG = {
+    **POOL_CONFIG,
+    'min_size': int(os.getenv('DB_SYNC_POOL_MIN_SIZE', 1)),
+    'max_size': int(os.getenv('DB_SYNC_POOL_MAX_SIZE', 6)),
+}
+
+class PoolTimeoutError(Exception):
+    """Raised when no pooled connection becomes available in time"""
+    pass
+
+def _open_connection():
+    """Open a new, unpooled database connection for the pool"""
     try:
         connection = psycopg2.connect(
             host=DB_CONFIG['host'],
@@ -40,22 +71,303 @@ def get_db_connection():
         logger.error(f"Database connection failed: {str(e)}")
         raise
 
+class ConnectionPool:
+    """
+    Thread-safe psycopg2 connection pool.
+
+    Connections are health checked on checkout, recycled once they exceed
+    max_lifetime and rolled back to a clean state when returned.
+    """
+
+    def __init__(self, min_size: int, max_size: int, timeout: float,
+                 max_lifetime: float, ping_after_idle: float, connect=_open_connection):
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.ping_after_idle = ping_after_idle
+        self._connect = connect
+        self._cond = threading.Condition()
+        self._idle = deque()      # (connection, created_at, returned_at)
+        self._created_at = {}     # id(connection) -> created_at
+        self._size = 0
+        self._waiting = 0
+        self._closed = False
+        self._stats = {
+            'checkouts': 0,
+            'connections_opened': 0,
+            'connections_closed': 0,
+            'failed_health_checks': 0,
+            'timeouts': 0,
+            'wait_time_total': 0.0,
+            'wait_time_max': 0.0
+        }
+
+    def warm_up(self):
+        """Open min_size connections up front"""
+        while True:
+            with self._cond:
+                if self._closed or self._size >= self.min_size:
+                    return
+                self._size += 1
+            try:
+                connection = self._open()
+            except Exception:
+                with self._cond:
+                    self._size -= 1
+                raise
+            with self._cond:
+                self._idle.append((connection, self._created_at[id(connection)], time.monotonic()))
+                self._cond.notify()
+
+    def getconn(self):
+        """Check a healthy connection out of the pool"""
+        started = time.monotonic()
+        deadline = started + self.timeout
+        while True:
+            entry = None
+            with self._cond:
+                if self._closed:
+                    raise RuntimeError("Connection pool is closed")
+                while not self._idle and self._size >= self.max_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats['timeouts'] += 1
+                        raise PoolTimeoutError(
+                            f"No database connection available within {self.timeout}s "
+                            f"(max_size={self.max_size})"
+                        )
+                    self._waiting += 1
+                    try:
+                        self._cond.wait(remaining)
+                    finally:
+                        self._waiting -= 1
+                if self._idle:
+                    entry = self._idle.pop()
+                else:
+                    self._size += 1
+
+            if entry is None:
+                try:
+                    connection = self._open()
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+            else:
+                connection = entry[0]
+                if not self._is_usable(*entry):
+                    self._discard(connection)
+                    continue
+
+            waited = time.monotonic() - started
+            with self._cond:
+                self._stats['checkouts'] += 1
+                self._stats['wait_time_total'] += waited
+                self._stats['wait_time_max'] = max(self._stats['wait_time_max'], waited)
+            return connection
+
+    def putconn(self, connection, discard: bool = False):
+        """Return a connection to the pool"""
+        if not discard and not connection.closed:
+            try:
+                if connection.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    connection.rollback()
+            except Exception as e:
+                logger.warning(f"Discarding connection that failed to reset: {str(e)}")
+                discard = True
+
+        created_at = self._created_at.get(id(connection), 0)
+        expired = time.monotonic() - created_at > self.max_lifetime
+        if discard or connection.closed or expired or self._closed:
+            self._discard(connection)
+            return
+
+        with self._cond:
+            self._idle.append((connection, created_at, time.monotonic()))
+            self._cond.notify()
+
+    def close(self):
+        """Close every idle connection and refuse further checkouts"""
+        with self._cond:
+            self._closed = True
+            idle = list(self._idle)
+            self._idle.clear()
+            self._cond.notify_all()
+        for connection, _, _ in idle:
+            self._discard(connection)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return a snapshot of pool usage"""
+        with self._cond:
+            checkouts = self._stats['checkouts']
+            idle = len(self._idle)
+            return {
+                'min_size': self.min_size,
+                'max_size': self.max_size,
+                'size': self._size,
+                'in_use': self._size - idle,
+                'idle': idle,
+                'waiting': self._waiting,
+                'checkouts': checkouts,
+                'connections_opened': self._stats['connections_opened'],
+                'connections_closed': self._stats['connections_closed'],
+                'failed_health_checks': self._stats['failed_health_checks'],
+                'timeouts': self._stats['timeouts'],
+                'wait_time_avg_ms': round(self._stats['wait_time_total'] / checkouts * 1000, 3) if checkouts else 0.0,
+                'wait_time_max_ms': round(self._stats['wait_time_max'] * 1000, 3)
+            }
+
+    def _open(self):
+        connection = self._connect()
+        with self._cond:
+            self._created_at[id(connection)] = time.monotonic()
+            self._stats['connections_opened'] += 1
+        return connection
+
+    def _discard(self, connection):
+        try:
+            if not connection.closed:
+                connection.close()
+        except Exception as e:
+            logger.warning(f"Error closing pooled connection: {str(e)}")
+        with self._cond:
+            self._created_at.pop(id(connection), None)
+            self._size -= 1
+            self._stats['connections_closed'] += 1
+            self._cond.notify()
+
+    def _is_usable(self, connection, created_at, returned_at) -> bool:
+        now = time.monotonic()
+        if connection.closed or now - created_at > self.max_lifetime:
+            return False
+        if now - returned_at < self.ping_after_idle:
+            return True
+        try:
+            cursor = connection.cursor()
+            cursor.execute("SELECT 1")
+            cursor.fetchone()
+            cursor.close()
+            connection.rollback()
+            return True
+        except Exception as e:
+            logger.warning(f"Pooled connection failed health check: {str(e)}")
+            with self._cond:
+                self._stats['failed_health_checks'] += 1
+            return False
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool() -> ConnectionPool:
+    """Return the process-wide connection pool, creating it on first use"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(**SYNC_POOL_CONFIG)
+    return _pool
+
+def close_pool():
+    """Close the process-wide connection pool"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+
+def get_pool_stats() -> Dict[str, Any]:
+    """Return usage statistics for the connection pool"""
+    return get_pool().stats()
+
 @contextmanager
-def get_db_cursor():
-    """Context manager for database operations"""
-    connection = None
+def db_connection():
+    """Context manager that checks a connection out of the pool"""
+    pool = get_pool()
+    connection = pool.getconn()
+    discard = False
     try:
-        connection = get_db_connection()
-        cursor = connection.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
-        yield cursor, connection
-    except Exception as e:
-        if connection:
+        yield connection
+    except Exception:
+        try:
             connection.rollback()
-        logger.error(f"Database operation failed: {str(e)}")
+        except Exception:
+            discard = True
         raise
     finally:
-        if connection:
-            connection.close()
+        pool.putconn(connection, discard=discard)
+
+_async_pool = None
+_async_pool_lock = None
+
+async def get_async_pool() -> AsyncConnectionPool:
+    """Return the process-wide asyncio connection pool, opening it on first use"""
+    global _async_pool, _async_pool_lock
+    if _async_pool is None:
+        if _async_pool_lock is None:
+            _async_pool_lock = asyncio.Lock()
+        async with _async_pool_lock:
+            if _async_pool is None:
+                pool = AsyncConnectionPool(
+                    conninfo=psycopg.conninfo.make_conninfo(
+                        host=DB_CONFIG['host'],
+                        port=DB_CONFIG['port'],
+                        user=DB_CONFIG['user'],
+                        password=DB_CONFIG['password'],
+                        dbname=DB_CONFIG['database']
+                    ),
+                    min_size=POOL_CONFIG['min_size'],
+                    max_size=POOL_CONFIG['max_size'],
+                    timeout=POOL_CONFIG['timeout'],
+                    max_lifetime=POOL_CONFIG['max_lifetime'],
+                    kwargs={'autocommit': False, 'row_factory': dict_row},
+                    check=AsyncConnectionPool.check_connection,
+                    open=False
+                )
+                await pool.open()
+                _async_pool = pool
+    return _async_pool
+
+async def close_async_pool():
+    """Close the process-wide asyncio connection pool"""
+    global _async_pool
+    if _async_pool is not None:
+        await _async_pool.close()
+        _async_pool = None
+
+def get_async_pool_stats() -> Dict[str, Any]:
+    """Return usage statistics for the asyncio connection pool"""
+    if _async_pool is None:
+        return {}
+    stats = _async_pool.get_stats()
+    return {
+        'min_size': _async_pool.min_size,
+        'max_size': _async_pool.max_size,
+        'size': stats.get('pool_size', 0),
+        'in_use': stats.get('pool_size', 0) - stats.get('pool_available', 0),
+        'idle': stats.get('pool_available', 0),
+        'waiting': stats.get('requests_waiting', 0),
+        'checkouts': stats.get('requests_num', 0),
+        'timeouts': stats.get('requests_errors', 0),
+        'wait_time_total_ms': stats.get('requests_wait_ms', 0)
+    }
+
+@asynccontextmanager
+async def async_db_connection():
+    """
+    Async context manager that checks a connection out of the asyncio pool.
+
+    Any open transaction is committed when the block exits normally and
+    rolled back when it raises.
+    """
+    pool = await get_async_pool()
+    async with pool.connection() as connection:
+        yield connection
+
+# Query helpers return rows with native Python values (datetime, date, ...);
+# responses are encoded by utils.json_response.FastJSONResponse. The
+# serialize_* helpers remain for callers that need string timestamps.
 
 def serialize_datetime(obj):
     """Convert datetime objects to strings for JSON serialization"""
@@ -80,69 +392,112 @@ def serialize_rows(rows):
     
     return [serialize_row(row) for row in rows]
 
+@timed(db_query_duration, 'execute_query')
+@tracked
 def execute_query(connection, query: str, params: Tuple = None) -> List[Dict]:
     """Execute a SELECT query and return results"""
     try:
         cursor = connection.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
         cursor.execute(query, params)
-        results = cursor.fetchall()
-        return serialize_rows(results)
+        return cursor.fetchall()
     except Exception as e:
         logger.error(f"Query execution failed: {str(e)}")
         logger.error(f"Query: {query}")
         logger.error(f"Params: {params}")
         raise
 
+@timed(db_query_duration, 'execute_query_one')
+@tracked
 def execute_query_one(connection, query: str, params: Tuple = None) -> Optional[Dict]:
     """Execute a SELECT query and return single result"""
     try:
         cursor = connection.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
         cursor.execute(query, params)
-        result = cursor.fetchone()
-        return serialize_row(result)
+        return cursor.fetchone()
     except Exception as e:
         logger.error(f"Query execution failed: {str(e)}")
         logger.error(f"Query: {query}")
         logger.error(f"Params: {params}")
         raise
 
-def execute_insert(connection, query: str, params: Tuple = None) -> int:
-    """Execute an INSERT query and return last insert ID"""
+@timed(db_query_duration, 'execute_update')
+@tracked
+def execute_update(connection, query: str, params: Tuple = None) -> int:
+    """Execute an UPDATE query and return affected rows"""
     try:
         cursor = connection.cursor()
         cursor.execute(query, params)
-        # For PostgreSQL, we need to use RETURNING clause or currval()
-        # This assumes the query includes RETURNING id or similar
-        if 'RETURNING' in query.upper():
-            result = cursor.fetchone()
-            return result[0] if result else None
-        else:
-            # Fallback for queries without RETURNING
-            return cursor.rowcount
+        return cursor.rowcount
     except Exception as e:
-        logger.error(f"Insert execution failed: {str(e)}")
+        logger.error(f"Update execution failed: {str(e)}")
         logger.error(f"Query: {query}")
         logger.error(f"Params: {params}")
         raise
 
-def execute_update(connection, query: str, params: Tuple = None) -> int:
-    """Execute an UPDATE query and return affected rows"""
+@timed(db_query_duration, 'execute_delete')
+@tracked
+def execute_delete(connection, query: str, params: Tuple = None) -> int:
+    """Execute a DELETE query and return affected rows"""
     try:
         cursor = connection.cursor()
         cursor.execute(query, params)
         return cursor.rowcount
+    except Exception as e:
+        logger.error(f"Delete execution failed: {str(e)}")
+        logger.error(f"Query: {query}")
+        logger.error(f"Params: {params}")
+        raise
+
+@timed(db_query_duration, 'execute_query_async')
+@tracked
+async def execute_query_async(connection, query: str, params: Tuple = None) -> List[Dict]:
+    """Execute a SELECT query on an async connection and return results"""
+    try:
+        async with connection.cursor() as cursor:
+            await cursor.execute(query, params)
+            return await cursor.fetchall()
+    except Exception as e:
+        logger.error(f"Query execution failed: {str(e)}")
+        logger.error(f"Query: {query}")
+        logger.error(f"Params: {params}")
+        raise
+
+@timed(db_query_duration, 'execute_query_one_async')
+@tracked
+async def execute_query_one_async(connection, query: str, params: Tuple = None) -> Optional[Dict]:
+    """Execute a SELECT query on an async connection and return single result"""
+    try:
+        async with connection.cursor() as cursor:
+            await cursor.execute(query, params)
+            return await cursor.fetchone()
+    except Exception as e:
+        logger.error(f"Query execution failed: {str(e)}")
+        logger.error(f"Query: {query}")
+        logger.error(f"Params: {params}")
+        raise
+
+@timed(db_query_duration, 'execute_update_async')
+@tracked
+async def execute_update_async(connection, query: str, params: Tuple = None) -> int:
+    """Execute an UPDATE query on an async connection and return affected rows"""
+    try:
+        async with connection.cursor() as cursor:
+            await cursor.execute(query, params)
+            return cursor.rowcount
     except Exception as e:
         logger.error(f"Update execution failed: {str(e)}")
         logger.error(f"Query: {query}")
         logger.error(f"Params: {params}")
         raise
 
-def execute_delete(connection, query: str, params: Tuple = None) -> int:
-    """Execute a DELETE query and return affected rows"""
+@timed(db_query_duration, 'execute_delete_async')
+@tracked
+async def execute_delete_async(connection, query: str, params: Tuple = None) -> int:
+    """Execute a DELETE query on an async connection and return affected rows"""
     try:
-        cursor = connection.cursor()
-        cursor.execute(query, params)
-        return cursor.rowcount
+        async with connection.cursor() as cursor:
+            await cursor.execute(query, params)
+            return cursor.rowcount
     except Exception as e:
         logger.error(f"Delete execution failed: {str(e)}")
         logger.error(f"Query: {query}")
@@ -152,11 +507,10 @@ def execute_delete(connection, query: str, params: Tuple = None) -> int:
 def test_connection():
     """Test database connection"""
     try:
-        connection = get_db_connection()
-        cursor = connection.cursor()
-        cursor.execute("SELECT 1")
-        result = cursor.fetchone()
-        connection.close()
+        with db_connection() as connection:
+            cursor = connection.cursor()
+            cursor.execute("SELECT 1")
+            cursor.fetchone()
         logger.info("Database connection test successful")
         return True
     except Exception as e:
@@ -164,11 +518,16 @@ def test_connection():
         return False
 
 def init_database():
-    """Initialize database connection and test"""
+    """Initialize database connection pool and test"""
     logger.info("Initializing database connection...")
     logger.info(f"Database Host: {DB_CONFIG['host']}")
     logger.info(f"Database Name: {DB_CONFIG['database']}")
     
+    try:
+        get_pool().warm_up()
+    except Exception as e:
+        logger.error(f"Connection pool warm-up failed: {str(e)}")
+
     if test_connection():
         logger.info("Database initialization successful")
         return True
@@ -1,21 +1,46 @@
 # ✅ Full corrected main.py code with ALL endpoints (create, update, delete, media, train details, etc.)
-from fastapi import FastAPI, HTTPException, UploadFile, File, Form
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, HTTPException, UploadFile, File, Form, Query, Header, Depends
+from fastapi.staticfiles import StaticFiles
 from typing import List, Optional
 from pydantic import BaseModel
 from fastapi.middleware.cors import CORSMiddleware
 from datetime import datetime, date
+import os
+import hmac
 import asyncio
-import threading
 import logging
 
 from services import (
-    create_complaint, get_complaint_by_id, get_complaints_by_date,
-    update_complaint, delete_complaint, delete_complaint_media,
-    upload_file_thread, upload_file_async,validate_complaint_access
+    create_complaint_async, get_complaint_by_id_async, get_complaints_by_date_async,
+    get_complaint_version_async, get_complaints_by_date_version_async, complaints_version,
+    update_complaint_async, delete_complaint_async, delete_complaint_media_async,
+    get_media_type, queue_media_uploads_async,
+    get_media_status_async, resume_media_jobs, check_upload_sizes, get_media_dedup_stats,
+    list_complaints_async, COMPLAINT_PAGE_SIZE, COMPLAINT_PAGE_MAX_SIZE, bulk_ingest_upload,
+    get_complaint_changes_async, CHANGE_FEED_PAGE_SIZE, CHANGE_FEED_PAGE_MAX_SIZE,
+    ChangeFeedExpiredError, prune_complaint_tombstones, CHANGE_FEED_TOMBSTONE_PRUNE_INTERVAL,
+    bulk_update_complaints_async, bulk_delete_complaints_async
+)
+from database import (
+    init_database, close_pool, get_pool_stats,
+    get_async_pool, close_async_pool, get_async_pool_stats
+)
+from utils.train_cache import (
+    TRAIN_CACHE_WARM_UP, get_train_by_no_async, warm_up_train_cache,
+    invalidate_train_cache, reload_train_cache, get_train_cache_stats
+)
+from utils.recipient_index import invalidate_recipient_index, get_recipient_index_stats
+from utils.image_pipeline import shutdown_image_process_pool
+from utils.email_outbox import start_outbox_workers, stop_outbox_workers, get_outbox_stats
+from utils.video_transcoder import get_transcoder_stats
+from utils.json_response import FastJSONResponse
+from utils.etag import make_etag, etag_matches, etag_headers, not_modified
+from utils.metrics import MetricsRoute, metrics_response, register_pool_collector
+from utils.query_stats import get_top_queries, get_query_stats_summary, reset_query_stats
+from utils.complaint_cache import get_complaint_cache, get_complaint_cache_stats
+from utils.media_storage import (
+    MEDIA_STORAGE_BACKEND, LOCAL_MEDIA_ROOT, LOCAL_MEDIA_URL_PREFIX, get_storage, close_storage
 )
-from database import get_db_connection, execute_query_one
-from psycopg2.extras import RealDictCursor
 
 app = FastAPI(
     title="Rail Sathi Complaint API",
@@ -23,8 +48,11 @@ app = FastAPI(
     version="1.0.0",
     openapi_url="/rs_microservice/openapi.json",
     docs_url="/rs_microservice/docs",
-    redoc_url="/rs_microservice/redoc"
+    redoc_url="/rs_microservice/redoc",
+    default_response_class=FastJSONResponse
 )
+# Every route below records latency and status under its path template
+app.router.route_class = MetricsRoute
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -37,6 +65,56 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+ADMIN_API_TOKEN = os.getenv('ADMIN_API_TOKEN', '')
+
+def require_admin_token(x_admin_token: Optional[str] = Header(None)):
+    """Operator routes need X-Admin-Token to match ADMIN_API_TOKEN; they are disabled while it is unset"""
+    if not ADMIN_API_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin API is disabled")
+    if not x_admin_token or not hmac.compare_digest(x_admin_token.encode(), ADMIN_API_TOKEN.encode()):
+        raise HTTPException(status_code=401, detail="Invalid or missing X-Admin-Token")
+
+if MEDIA_STORAGE_BACKEND == 'local':
+    os.makedirs(LOCAL_MEDIA_ROOT, exist_ok=True)
+    app.mount(LOCAL_MEDIA_URL_PREFIX, StaticFiles(directory=LOCAL_MEDIA_ROOT), name="media")
+
+async def prune_tombstones_periodically():
+    while True:
+        try:
+            await asyncio.to_thread(prune_complaint_tombstones)
+        except Exception as e:
+            logger.error(f"Pruning complaint tombstones failed: {e}")
+        await asyncio.sleep(CHANGE_FEED_TOMBSTONE_PRUNE_INTERVAL)
+
+@app.on_event("startup")
+async def startup():
+    register_pool_collector()
+    await asyncio.to_thread(init_database)
+    try:
+        await get_async_pool()
+    except Exception as e:
+        logger.error(f"Async connection pool startup failed: {e}")
+    if TRAIN_CACHE_WARM_UP:
+        try:
+            await asyncio.to_thread(warm_up_train_cache)
+        except Exception as e:
+            logger.error(f"Train details cache warm-up failed: {e}")
+    start_outbox_workers()
+    try:
+        await asyncio.to_thread(resume_media_jobs)
+    except Exception as e:
+        logger.error(f"Resuming media jobs failed: {e}")
+    app.state.tombstone_pruner = asyncio.create_task(prune_tombstones_periodically())
+
+@app.on_event("shutdown")
+async def shutdown():
+    app.state.tombstone_pruner.cancel()
+    shutdown_image_process_pool()
+    await asyncio.to_thread(stop_outbox_workers)
+    await close_async_pool()
+    close_pool()
+    close_storage()
+
 @app.get("/rs_microservice")
 async def root():
     return {"message": "Rail Sathi Microservice is running"}
@@ -45,10 +123,17 @@ class RailSathiComplainMediaResponse(BaseModel):
     id: int
     media_type: Optional[str]
     media_url: Optional[str]
+    thumbnail_url: Optional[str] = None
+    preview_url: Optional[str] = None
     created_at: datetime
     updated_at: datetime
     created_by: Optional[str]
     updated_by: Optional[str]
+    processing_status: Optional[str] = None
+    progress: Optional[int] = None
+
+class RailSathiComplainMediaStatus(RailSathiComplainMediaResponse):
+    processing_error: Optional[str] = None
 
 class RailSathiComplainData(BaseModel):
     complain_id: int
@@ -77,23 +162,128 @@ class RailSathiComplainResponse(BaseModel):
     message: str
     data: RailSathiComplainData
 
+class ComplaintSelector(BaseModel):
+    complain_ids: Optional[List[int]] = None
+    train_number: Optional[str] = None
+    complain_status: Optional[str] = None
+    complain_type: Optional[str] = None
+    depot: Optional[str] = None
+    from_date: Optional[date] = None
+    to_date: Optional[date] = None
+    returning: bool = False
+
+    def filters(self):
+        return self.model_dump(exclude={"complain_ids", "returning"}, exclude_none=True)
+
+class ComplaintChanges(BaseModel):
+    pnr_number: Optional[str] = None
+    is_pnr_validated: Optional[str] = None
+    name: Optional[str] = None
+    mobile_number: Optional[str] = None
+    complain_type: Optional[str] = None
+    complain_description: Optional[str] = None
+    complain_date: Optional[date] = None
+    complain_status: Optional[str] = None
+    train_id: Optional[int] = None
+    train_number: Optional[str] = None
+    train_name: Optional[str] = None
+    coach: Optional[str] = None
+    berth_no: Optional[int] = None
+    updated_by: Optional[str] = None
+
+class BulkComplaintUpdate(ComplaintSelector):
+    changes: ComplaintChanges
+
+class RailSathiComplainListResponse(BaseModel):
+    message: str
+    data: List[RailSathiComplainData]
+    next_cursor: Optional[str]
+    has_more: bool
+
+class RailSathiComplainTombstone(BaseModel):
+    complain_id: int
+    deleted_at: datetime
+
+class RailSathiComplainChangesResponse(BaseModel):
+    message: str
+    data: List[RailSathiComplainData]
+    deleted: List[RailSathiComplainTombstone]
+    next_cursor: Optional[str]
+    has_more: bool
+    horizon_lag_seconds: float
+
 @app.get("/rs_microservice/complaint/get/{complain_id}", response_model=RailSathiComplainResponse)
-async def get_complaint(complain_id: int):
-    complaint = get_complaint_by_id(complain_id)
+async def get_complaint(complain_id: int, if_none_match: Optional[str] = Header(None)):
+    if if_none_match:
+        version = await get_complaint_version_async(complain_id)
+        if version is None:
+            raise HTTPException(status_code=404, detail="Complaint not found")
+        if etag_matches(if_none_match, make_etag(version)):
+            return not_modified(make_etag(version))
+    complaint = await get_complaint_by_id_async(complain_id)
     if not complaint:
         raise HTTPException(status_code=404, detail="Complaint not found")
-    return {"message": "Complaint retrieved successfully", "data": complaint}
+    etag = make_etag(complaint.pop('version'))
+    return FastJSONResponse({"message": "Complaint retrieved successfully", "data": complaint},
+                            headers=etag_headers(etag))
 
 @app.get("/rs_microservice/complaint/get/date/{date_str}", response_model=List[RailSathiComplainResponse])
-async def get_complaints_by_date_endpoint(date_str: str, mobile_number: Optional[str] = None):
+async def get_complaints_by_date_endpoint(date_str: str, mobile_number: Optional[str] = None,
+                                          if_none_match: Optional[str] = Header(None)):
     try:
         complaint_date = datetime.strptime(date_str, "%Y-%m-%d").date()
     except ValueError:
         raise HTTPException(status_code=400, detail="Invalid date format. Use YYYY-MM-DD.")
     if not mobile_number:
         raise HTTPException(status_code=400, detail="mobile_number parameter is required")
-    complaints = get_complaints_by_date(complaint_date, mobile_number)
-    return [{"message": "Complaint retrieved successfully", "data": c} for c in complaints]
+    if if_none_match:
+        etag = make_etag(await get_complaints_by_date_version_async(complaint_date, mobile_number))
+        if etag_matches(if_none_match, etag):
+            return not_modified(etag)
+    complaints = await get_complaints_by_date_async(complaint_date, mobile_number)
+    etag = make_etag(complaints_version(complaints))
+    for complaint in complaints:
+        del complaint['version']
+    return FastJSONResponse([{"message": "Complaint retrieved successfully", "data": c} for c in complaints],
+                            headers=etag_headers(etag))
+
+@app.get("/rs_microservice/complaint/list", response_model=RailSathiComplainListResponse)
+async def list_complaints_endpoint(
+    train_number: Optional[str] = None,
+    complain_status: Optional[str] = None,
+    complain_type: Optional[str] = None,
+    depot: Optional[str] = None,
+    from_date: Optional[date] = None,
+    to_date: Optional[date] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(COMPLAINT_PAGE_SIZE, ge=1, le=COMPLAINT_PAGE_MAX_SIZE)
+):
+    filters = {
+        "train_number": train_number, "complain_status": complain_status, "complain_type": complain_type,
+        "depot": depot, "from_date": from_date, "to_date": to_date
+    }
+    try:
+        page = await list_complaints_async(filters, cursor, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return FastJSONResponse({"message": "Complaints retrieved successfully", **page})
+
+@app.get("/rs_microservice/complaint/changes", response_model=RailSathiComplainChangesResponse)
+async def complaint_changes_endpoint(
+    mobile_number: Optional[str] = None,
+    train_number: Optional[str] = None,
+    depot: Optional[str] = None,
+    since: Optional[str] = None,
+    limit: int = Query(CHANGE_FEED_PAGE_SIZE, ge=1, le=CHANGE_FEED_PAGE_MAX_SIZE)
+):
+    scope = {"mobile_number": mobile_number, "train_number": train_number, "depot": depot}
+    try:
+        changes = await get_complaint_changes_async(scope, since, limit)
+    except ChangeFeedExpiredError as e:
+        raise HTTPException(status_code=410, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return FastJSONResponse({"message": "Changes retrieved successfully", **changes})
 
 @app.post("/rs_microservice/complaint/media/upload")
 async def upload_complaint_media(
@@ -101,14 +291,12 @@ async def upload_complaint_media(
     created_by: str = Form(...),
     files: List[UploadFile] = File(...)
 ):
-    uploaded_urls = []
-    for file in files:
-        result = await upload_file_async(file, complain_id, created_by)
-        if result:
-            uploaded_urls.append(file.filename)
-        else:
-            return {"message": f"Failed to upload: {file.filename}"}
-    return {"message": "Media uploaded successfully", "files": uploaded_urls}
+    check_upload_sizes(files)
+    unsupported = [f.filename for f in files if not f.filename or not get_media_type(f.content_type)]
+    if unsupported:
+        return {"message": f"Failed to upload: {', '.join(name or '<unnamed>' for name in unsupported)}"}
+    media = await queue_media_uploads_async(files, complain_id, created_by)
+    return {"message": "Media uploaded successfully", "files": [f.filename for f in files], "media": media}
 
 @app.post("/rs_microservice/complaint/add", response_model=RailSathiComplainResponse)
 async def create_complaint_endpoint_threaded(
@@ -145,26 +333,28 @@ async def create_complaint_endpoint_threaded(
         "berth_no": berth_no,
         "created_by": name
     }
-    complaint = create_complaint(complaint_data)
-    complain_id = complaint["complain_id"]
-    threads = []
-    for file_obj in rail_sathi_complain_media_files:
-        if file_obj.filename:
-            file_content = await file_obj.read()
-            class MockFile:
-                def __init__(self, content, filename, content_type):
-                    self.content = content
-                    self.filename = filename
-                    self.content_type = content_type
-                def read(self): return self.content
-            mock_file = MockFile(file_content, file_obj.filename, file_obj.content_type)
-            t = threading.Thread(target=upload_file_thread, args=(mock_file, complain_id, name or ''))
-            t.start()
-            threads.append(t)
-    for t in threads: t.join()
-    await asyncio.sleep(1)
-    updated_complaint = get_complaint_by_id(complain_id)
-    return {"message": "Complaint created successfully", "data": updated_complaint}
+    check_upload_sizes(rail_sathi_complain_media_files)
+    complaint = await create_complaint_async(complaint_data, rail_sathi_complain_media_files, name or '')
+    return FastJSONResponse({"message": "Complaint created successfully", "data": complaint})
+
+@app.post("/rs_microservice/complaint/bulk")
+async def bulk_ingest_endpoint(
+    file: UploadFile = File(...),
+    format: Optional[str] = Form(None),
+    created_by: Optional[str] = Form(None),
+    notify: bool = Form(True)
+):
+    try:
+        result = await asyncio.to_thread(
+            bulk_ingest_upload, file.file, file.filename, file.content_type, format, created_by, notify
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"message": f"Ingested {result['created']} of {result['total']} complaints", **result}
+
+@app.get("/rs_microservice/complaint/media/status/{complain_id}", response_model=List[RailSathiComplainMediaStatus])
+async def get_complaint_media_status(complain_id: int):
+    return FastJSONResponse(await get_media_status_async(complain_id))
 
 @app.patch("/rs_microservice/complaint/update/{complain_id}", response_model=RailSathiComplainResponse)
 async def update_complaint_endpoint(
@@ -199,10 +389,10 @@ async def update_complaint_endpoint(
         "berth_no": berth_no,
         "updated_by": name
     }
-    updated = update_complaint(complain_id, update_data)
+    updated = await update_complaint_async(complain_id, update_data)
     if not updated:
         raise HTTPException(status_code=404, detail="Complaint not found")
-    return {"message": "Complaint updated successfully", "data": updated}
+    return FastJSONResponse({"message": "Complaint updated successfully", "data": updated})
 
 @app.delete("/rs_microservice/complaint/delete/{complain_id}")
 async def delete_complaint_endpoint(
@@ -210,38 +400,112 @@ async def delete_complaint_endpoint(
     name: str = Form(...),
     mobile_number: str = Form(...)
 ):
-    can_delete, reason = validate_complaint_access(complain_id, name, mobile_number)
-    if not can_delete:
+    deleted, reason = await delete_complaint_async(complain_id, name, mobile_number)
+    if not deleted:
         raise HTTPException(status_code=403, detail=reason)
-    count = delete_complaint(complain_id)
-    if count == 0:
-        raise HTTPException(status_code=404, detail="Complaint not found")
     return {"message": f"Complaint {complain_id} deleted successfully"}
 
+@app.patch("/rs_microservice/complaint/bulk/update", dependencies=[Depends(require_admin_token)])
+async def bulk_update_complaints_endpoint(request: BulkComplaintUpdate):
+    try:
+        result = await bulk_update_complaints_async(
+            request.complain_ids, request.filters(), request.changes.model_dump(exclude_none=True), request.returning
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"message": f"{result['updated']} complaint(s) updated successfully", **result}
+
+@app.delete("/rs_microservice/complaint/bulk/delete", dependencies=[Depends(require_admin_token)])
+async def bulk_delete_complaints_endpoint(request: ComplaintSelector):
+    try:
+        result = await bulk_delete_complaints_async(request.complain_ids, request.filters(), request.returning)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"message": f"{result['deleted']} complaint(s) deleted successfully", **result}
+
 @app.delete("/rs_microservice/media/delete/{complain_id}")
 async def delete_complaint_media_endpoint(
     complain_id: int,
     media_ids: List[int] = Form(...)
 ):
-    deleted = delete_complaint_media(complain_id, media_ids)
+    deleted = await delete_complaint_media_async(complain_id, media_ids)
     return {"message": f"{deleted} media file(s) deleted successfully"}
 
 @app.get("/rs_microservice/train_details/{train_no}")
 async def get_train_details(train_no: str):
-    conn = get_db_connection()
-    try:
-        query = "SELECT * FROM trains_traindetails WHERE train_no = %s"
-        result = execute_query_one(conn, query, (train_no,))
-        if not result:
-            raise HTTPException(status_code=404, detail="Train not found")
-        return result
-    finally:
-        conn.close()
+    result = await get_train_by_no_async(train_no)
+    if not result:
+        raise HTTPException(status_code=404, detail="Train not found")
+    return result
+
+@app.get("/rs_microservice/admin/train_cache", dependencies=[Depends(require_admin_token)])
+async def train_cache_stats():
+    return get_train_cache_stats()
+
+@app.post("/rs_microservice/admin/train_cache/invalidate", dependencies=[Depends(require_admin_token)])
+async def train_cache_invalidate():
+    invalidate_train_cache()
+    return {"message": "Train details cache invalidated", "stats": get_train_cache_stats()}
+
+@app.post("/rs_microservice/admin/train_cache/reload", dependencies=[Depends(require_admin_token)])
+async def train_cache_reload():
+    loaded = await asyncio.to_thread(reload_train_cache)
+    return {"message": f"Train details cache reloaded with {loaded} trains", "stats": get_train_cache_stats()}
+
+@app.get("/rs_microservice/admin/complaint_cache", dependencies=[Depends(require_admin_token)])
+async def complaint_cache_stats():
+    return get_complaint_cache_stats()
+
+@app.post("/rs_microservice/admin/complaint_cache/invalidate", dependencies=[Depends(require_admin_token)])
+async def complaint_cache_invalidate():
+    await get_complaint_cache().clear_async()
+    return {"message": "Complaint cache invalidated", "stats": get_complaint_cache_stats()}
+
+@app.get("/rs_microservice/admin/recipient_index", dependencies=[Depends(require_admin_token)])
+async def recipient_index_stats():
+    return get_recipient_index_stats()
+
+@app.post("/rs_microservice/admin/recipient_index/invalidate", dependencies=[Depends(require_admin_token)])
+async def recipient_index_invalidate():
+    invalidate_recipient_index()
+    return {"message": "Recipient index will be rebuilt on the next complaint"}
+
+@app.get("/rs_microservice/admin/email_outbox", dependencies=[Depends(require_admin_token)])
+async def email_outbox_stats():
+    return await asyncio.to_thread(get_outbox_stats)
+
+@app.get("/rs_microservice/admin/video_transcoder", dependencies=[Depends(require_admin_token)])
+async def video_transcoder_stats():
+    return get_transcoder_stats()
+
+@app.get("/rs_microservice/admin/media_storage", dependencies=[Depends(require_admin_token)])
+async def media_storage_stats():
+    return {**get_storage().stats(), 'dedup': get_media_dedup_stats()}
+
+@app.get("/rs_microservice/admin/slow_queries", dependencies=[Depends(require_admin_token)])
+async def slow_queries(
+    limit: int = Query(20, ge=1, le=500),
+    order_by: str = Query("total_ms", pattern="^(total_ms|max_ms|calls|slow_calls)$")
+):
+    return {**get_query_stats_summary(), "queries": get_top_queries(limit, order_by)}
+
+@app.post("/rs_microservice/admin/slow_queries/reset", dependencies=[Depends(require_admin_token)])
+async def slow_queries_reset():
+    reset_query_stats()
+    return {"message": "Query statistics reset"}
 
 @app.get("/health")
 async def health_check():
     return {"status": "healthy"}
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    return await asyncio.to_thread(metrics_response)
+
+@app.get("/health/db")
+async def db_pool_health():
+    return {"status": "healthy", "pool": get_pool_stats(), "async_pool": get_async_pool_stats()}
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=5002)
@@ -0,0 +1,25 @@
+-- Durable outbox for notification emails, drained by utils/email_outbox.py workers.
+
+CREATE TABLE IF NOT EXISTS rail_sathi_email_outbox (
+    id BIGSERIAL PRIMARY KEY,
+    complain_id INTEGER,
+    subject TEXT NOT NULL,
+    body TEXT NOT NULL,
+    from_email VARCHAR(254) NOT NULL,
+    to_email VARCHAR(254) NOT NULL,
+    status VARCHAR(16) NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT,
+    next_attempt_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    locked_at TIMESTAMPTZ,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    sent_at TIMESTAMPTZ
+);
+
+CREATE INDEX IF NOT EXISTS rail_sathi_email_outbox_pending_idx
+    ON rail_sathi_email_outbox (next_attempt_at)
+    WHERE status = 'pending';
+
+CREATE INDEX IF NOT EXISTS rail_sathi_email_outbox_sending_idx
+    ON rail_sathi_email_outbox (locked_at)
+    WHERE status = 'sending';
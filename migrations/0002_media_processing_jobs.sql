@@ -0,0 +1,13 @@
+-- Media files are processed in the background after POST /complaint/add returns.
+-- Each media row tracks its own job state until the processed URL is known.
+
+ALTER TABLE rail_sathi_railsathicomplainmedia
+    ALTER COLUMN media_url DROP NOT NULL,
+    ADD COLUMN IF NOT EXISTS processing_status VARCHAR(16) NOT NULL DEFAULT 'done',
+    ADD COLUMN IF NOT EXISTS progress SMALLINT NOT NULL DEFAULT 100,
+    ADD COLUMN IF NOT EXISTS processing_error TEXT,
+    ADD COLUMN IF NOT EXISTS source_path TEXT;
+
+CREATE INDEX IF NOT EXISTS rail_sathi_complainmedia_unfinished_idx
+    ON rail_sathi_railsathicomplainmedia (updated_at)
+    WHERE processing_status IN ('pending', 'processing');
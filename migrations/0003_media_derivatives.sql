@@ -0,0 +1,6 @@
+-- Smaller renditions of processed images so listings can show thumbnails
+-- instead of downloading multi-MB originals.
+
+ALTER TABLE rail_sathi_railsathicomplainmedia
+    ADD COLUMN IF NOT EXISTS thumbnail_url TEXT,
+    ADD COLUMN IF NOT EXISTS preview_url TEXT;
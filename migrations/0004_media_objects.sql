@@ -0,0 +1,25 @@
+-- Processed media stored once per distinct upload. Media rows point at the
+-- object by content hash; the object and its stored files are removed when
+-- the last referencing media row is deleted.
+
+CREATE TABLE IF NOT EXISTS rail_sathi_media_object (
+    content_hash CHAR(64) PRIMARY KEY,
+    media_type VARCHAR(16) NOT NULL,
+    byte_size BIGINT NOT NULL,
+    status VARCHAR(16) NOT NULL DEFAULT 'processing',
+    media_url TEXT,
+    thumbnail_url TEXT,
+    preview_url TEXT,
+    storage_keys TEXT[] NOT NULL DEFAULT '{}',
+    ref_count INTEGER NOT NULL DEFAULT 0,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+ALTER TABLE rail_sathi_railsathicomplainmedia
+    ADD COLUMN IF NOT EXISTS content_hash CHAR(64)
+        REFERENCES rail_sathi_media_object (content_hash) ON DELETE SET NULL;
+
+CREATE INDEX IF NOT EXISTS rail_sathi_complainmedia_content_hash_idx
+    ON rail_sathi_railsathicomplainmedia (content_hash)
+    WHERE content_hash IS NOT NULL;
@@ -0,0 +1,30 @@
+-- Indexes for GET /complaint/list. Every listing is ordered by
+-- (created_at DESC, complain_id DESC) and resumes from a cursor on the same
+-- pair, so each filter gets a composite index ending in that order and a
+-- page is a bounded index range scan regardless of table size.
+--
+-- CONCURRENTLY avoids blocking writes on a large table; psql runs each
+-- statement in its own transaction, which CONCURRENTLY requires.
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS rail_sathi_complain_created_idx
+    ON rail_sathi_railsathicomplain (created_at DESC, complain_id DESC);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS rail_sathi_complain_train_number_created_idx
+    ON rail_sathi_railsathicomplain (train_number, created_at DESC, complain_id DESC);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS rail_sathi_complain_status_created_idx
+    ON rail_sathi_railsathicomplain (complain_status, created_at DESC, complain_id DESC);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS rail_sathi_complain_type_created_idx
+    ON rail_sathi_railsathicomplain (complain_type, created_at DESC, complain_id DESC);
+
+-- Depot filters resolve to the depot's train ids first
+CREATE INDEX CONCURRENTLY IF NOT EXISTS rail_sathi_complain_train_id_created_idx
+    ON rail_sathi_railsathicomplain (train_id, created_at DESC, complain_id DESC);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS rail_sathi_complain_date_idx
+    ON rail_sathi_railsathicomplain (complain_date, complain_id);
+
+-- Also serves the existing lookup by complain_date and mobile_number
+CREATE INDEX CONCURRENTLY IF NOT EXISTS rail_sathi_complain_mobile_date_idx
+    ON rail_sathi_railsathicomplain (mobile_number, complain_date);
@@ -0,0 +1,50 @@
+-- Change feed for GET /complaint/changes. Clients resume from a cursor on
+-- (updated_at, complain_id) within a scope (mobile number, train or
+-- depot), so each scope gets a composite index on that pair and a poll is
+-- an index range scan over the changes since the cursor only.
+--
+-- Deleted complaints leave a tombstone carrying the scope columns. A
+-- statement-level trigger writes them, so deletes from any client
+-- (including the bulk endpoints) are recorded with one insert per statement.
+
+CREATE TABLE IF NOT EXISTS rail_sathi_complain_tombstone (
+    complain_id BIGINT PRIMARY KEY,
+    mobile_number TEXT,
+    train_number TEXT,
+    train_id BIGINT,
+    deleted_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+CREATE OR REPLACE FUNCTION rail_sathi_record_complain_tombstones() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO rail_sathi_complain_tombstone (complain_id, mobile_number, train_number, train_id)
+    SELECT complain_id, mobile_number, train_number, train_id FROM deleted_complaints
+    ON CONFLICT (complain_id) DO UPDATE SET deleted_at = now();
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS rail_sathi_complain_tombstone_trigger ON rail_sathi_railsathicomplain;
+CREATE TRIGGER rail_sathi_complain_tombstone_trigger
+    AFTER DELETE ON rail_sathi_railsathicomplain
+    REFERENCING OLD TABLE AS deleted_complaints
+    FOR EACH STATEMENT EXECUTE FUNCTION rail_sathi_record_complain_tombstones();
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS rail_sathi_complain_mobile_updated_idx
+    ON rail_sathi_railsathicomplain (mobile_number, updated_at, complain_id);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS rail_sathi_complain_train_number_updated_idx
+    ON rail_sathi_railsathicomplain (train_number, updated_at, complain_id);
+
+-- Depot scopes resolve to the depot's train ids first
+CREATE INDEX CONCURRENTLY IF NOT EXISTS rail_sathi_complain_train_id_updated_idx
+    ON rail_sathi_railsathicomplain (train_id, updated_at, complain_id);
+
+CREATE INDEX IF NOT EXISTS rail_sathi_complain_tombstone_mobile_idx
+    ON rail_sathi_complain_tombstone (mobile_number, deleted_at, complain_id);
+
+CREATE INDEX IF NOT EXISTS rail_sathi_complain_tombstone_train_number_idx
+    ON rail_sathi_complain_tombstone (train_number, deleted_at, complain_id);
+
+CREATE INDEX IF NOT EXISTS rail_sathi_complain_tombstone_train_id_idx
+    ON rail_sathi_complain_tombstone (train_id, deleted_at, complain_id);
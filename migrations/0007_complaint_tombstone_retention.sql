@@ -0,0 +1,5 @@
+-- Tombstones are pruned after CHANGE_FEED_TOMBSTONE_RETENTION_DAYS; this
+-- index keeps the periodic prune from scanning the whole table.
+
+CREATE INDEX IF NOT EXISTS rail_sathi_complain_tombstone_deleted_at_idx
+    ON rail_sathi_complain_tombstone (deleted_at);
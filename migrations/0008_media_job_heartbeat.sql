@@ -0,0 +1,12 @@
+-- Processes stamp heartbeat_at on the media jobs they hold while queued or
+-- running, so resume_media_jobs only reclaims jobs whose process is gone
+-- instead of every job older than MEDIA_JOB_STALE_AFTER.
+
+ALTER TABLE rail_sathi_railsathicomplainmedia
+    ADD COLUMN IF NOT EXISTS heartbeat_at TIMESTAMPTZ;
+
+DROP INDEX IF EXISTS rail_sathi_complainmedia_unfinished_idx;
+
+CREATE INDEX IF NOT EXISTS rail_sathi_complainmedia_unfinished_idx
+    ON rail_sathi_railsathicomplainmedia ((COALESCE(heartbeat_at, updated_at)))
+    WHERE processing_status IN ('pending', 'processing');
@@ -4,16 +4,31 @@ import os
 import io
 import logging
 import uuid
-import threading
+import hashlib
+import json
+import base64
+import csv
+import time
 import re
+import threading
+import tempfile
+import mimetypes
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, date
 from typing import List, Dict, Optional, Any
-from google.cloud import storage
-from PIL import Image
-from moviepy.editor import VideoFileClip
 from urllib.parse import unquote
-from database import get_db_connection, execute_query, execute_query_one
-from utils.email_utils import send_passenger_complain_email
+from database import (
+    db_connection, execute_query, execute_update, execute_delete,
+    async_db_connection, execute_query_async, execute_query_one_async
+)
+from utils.email_utils import build_passenger_complain_emails, send_complaint_digest_emails
+from utils.email_outbox import enqueue_emails_async, wake_outbox
+from utils.image_pipeline import process_image
+from utils.video_transcoder import transcode_video
+from utils.media_storage import get_storage
+from utils.metrics import media_upload_duration, media_upload_bytes, change_feed_horizon_lag
+from utils.complaint_cache import get_complaint_cache, invalidate_complaints, invalidate_complaints_async
+from utils.train_cache import get_train_by_id_async, get_train_by_no_async, get_trains
 from dotenv import load_dotenv
 from fastapi import UploadFile, HTTPException
 import asyncio
@@ -23,16 +38,16 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 load_dotenv()
-GCS_BUCKET_NAME = os.getenv('GCS_BUCKET_NAME', 'sanchalak-media-bucket1')
-PROJECT_ID = os.getenv('PROJECT_ID', 'sanchalak-423912')
+MEDIA_MAX_UPLOAD_BYTES = int(os.getenv('MEDIA_MAX_UPLOAD_BYTES', 250 * 1024 * 1024))
+MEDIA_UPLOAD_CHUNK_SIZE = int(os.getenv('MEDIA_UPLOAD_CHUNK_SIZE', 1024 * 1024))
 
-# ========== MEDIA UPLOAD UTILS =============
+IMAGE_RENDITION_PREFIXES = {
+    'original': 'rail_sathi_complain_images',
+    'preview': 'rail_sathi_complain_images/previews',
+    'thumbnail': 'rail_sathi_complain_images/thumbnails',
+}
 
-def get_gcs_client():
-    try:
-        return storage.Client(project=PROJECT_ID)
-    except Exception as e:
-        raise RuntimeError(f"Failed to create GCS client: {e}")
+# ========== MEDIA UPLOAD UTILS =============
 
 def get_valid_filename(filename):
     filename = re.sub(r'[^\w\s-]', '', filename).strip()
@@ -41,271 +56,1359 @@ def get_valid_filename(filename):
 def sanitize_timestamp(raw_timestamp):
     return get_valid_filename(unquote(raw_timestamp)).replace(":", "_")
 
-def process_media_file_upload(file_content, file_format, complain_id, media_type):
+def _store_file(storage, path, key, content_type):
+    """Upload one file to storage, recording its size and upload time"""
+    size = os.path.getsize(path)
+    started = time.perf_counter()
+    url = storage.upload_file(path, key, content_type=content_type)
+    media_upload_duration.labels(storage.name).observe(time.perf_counter() - started)
+    media_upload_bytes.labels(storage.name).inc(size)
+    return url
+
+def process_media_file_upload(source_path, file_format, complain_id, media_type, content_hash=None):
+    """
+    Process a spooled upload and store the results in the media storage backend.
+
+    Returns {'media_url', 'thumbnail_url', 'preview_url', 'storage_keys'}
+    (derivative URLs may be None), or None when processing failed. With a
+    content_hash the objects are stored under that hash, so the same upload
+    always maps to the same keys. The source is read from disk and uploaded
+    from files, so memory use does not grow with the file size.
+    """
     try:
-        created_at = datetime.now().strftime("%Y-%m-%d_%H:%M:%S.%f")
-        unique_id = str(uuid.uuid4())[:5]
-        full_file_name = f"rail_sathi_complain_{complain_id}_{sanitize_timestamp(created_at)}_{unique_id}.{file_format}"
-        client = get_gcs_client()
-        bucket = client.bucket(GCS_BUCKET_NAME)
+        if content_hash:
+            base_name = content_hash
+        else:
+            created_at = datetime.now().strftime("%Y-%m-%d_%H:%M:%S.%f")
+            unique_id = str(uuid.uuid4())[:5]
+            base_name = f"rail_sathi_complain_{complain_id}_{sanitize_timestamp(created_at)}_{unique_id}"
+        storage = get_storage()
 
         if media_type == "image":
-            img = Image.open(io.BytesIO(file_content))
-            if img.mode == 'RGBA':
-                img = img.convert('RGB')
-            buffer = io.BytesIO()
-            img.save(buffer, format='JPEG')
-            buffer.seek(0)
-            blob = bucket.blob(f"rail_sathi_complain_images/{full_file_name}")
-            blob.upload_from_file(buffer, content_type='image/jpeg')
+            urls, keys = {}, []
+            with tempfile.TemporaryDirectory(prefix="rail_sathi_image_") as output_dir:
+                renditions = process_image(source_path, output_dir)
+                for name, prefix in IMAGE_RENDITION_PREFIXES.items():
+                    key = f"{prefix}/{base_name}.jpg"
+                    urls[name] = _store_file(storage, renditions[name]['path'], key, 'image/jpeg')
+                    keys.append(key)
+            return {
+                'media_url': urls['original'],
+                'thumbnail_url': urls['thumbnail'],
+                'preview_url': urls['preview'],
+                'storage_keys': keys
+            }
         elif media_type == "video":
-            temp_dir = "/tmp/rail_sathi_temp"
-            os.makedirs(temp_dir, exist_ok=True)
-            raw_path = os.path.join(temp_dir, full_file_name)
-            compressed_path = os.path.join(temp_dir, f"compressed_{full_file_name}")
-            with open(raw_path, 'wb') as f:
-                f.write(file_content)
-            try:
-                clip = VideoFileClip(raw_path)
-                clip.write_videofile(compressed_path, codec='libx264', bitrate='5000k')
-                clip.close()
-            except Exception as e:
-                print(f"Error compressing video: {e}")
-            blob = bucket.blob(f"rail_sathi_complain_videos/{full_file_name}")
-            with open(compressed_path, 'rb') as f:
-                blob.upload_from_file(f, content_type='video/mp4')
-            os.remove(raw_path)
-            os.remove(compressed_path)
-        else:
-            return None
-        return blob.public_url if blob else None
+            with tempfile.TemporaryDirectory(prefix="rail_sathi_video_") as work_dir:
+                result = transcode_video(source_path, work_dir)
+                if result['transcoded']:
+                    video_name, content_type = f"{base_name}.mp4", 'video/mp4'
+                else:
+                    video_name = f"{base_name}.{file_format}"
+                    content_type = mimetypes.guess_type(video_name)[0] or 'video/mp4'
+                keys = [f"rail_sathi_complain_videos/{video_name}"]
+                media_url = _store_file(storage, result['path'], keys[0], content_type)
+                poster_url = None
+                if result['poster_path']:
+                    keys.append(f"rail_sathi_complain_videos/posters/{base_name}.jpg")
+                    poster_url = _store_file(storage, result['poster_path'], keys[1], 'image/jpeg')
+            return {'media_url': media_url, 'thumbnail_url': poster_url, 'preview_url': None, 'storage_keys': keys}
+        return None
     except Exception as e:
         logger.error(f"Error processing media: {e}")
         return None
 
-def upload_file_thread(file_obj, complain_id, user):
-    try:
-        file_content = file_obj.read()
-        ext = os.path.splitext(file_obj.filename)[1].lstrip('.').lower()
-        content_type = getattr(file_obj, 'content_type', 'application/octet-stream')
-        media_type = "image" if content_type.startswith("image") else "video" if content_type.startswith("video") else None
-        if not media_type:
-            return
-        url = process_media_file_upload(file_content, ext, complain_id, media_type)
-        if url:
-            conn = get_db_connection()
-            cursor = conn.cursor()
-            cursor.execute("""
-                INSERT INTO rail_sathi_railsathicomplainmedia
-                (complain_id, media_type, media_url, created_by, created_at, updated_at)
-                VALUES (%s, %s, %s, %s, %s, %s)
-            """, (complain_id, media_type, url, user, datetime.now(), datetime.now()))
-            conn.commit()
-            conn.close()
-    except Exception as e:
-        logger.error(f"Thread upload failed: {e}")
+class UploadTooLargeError(Exception):
+    """Raised when an upload exceeds MEDIA_MAX_UPLOAD_BYTES"""
+    pass
+
+def stream_to_file(source, path, max_bytes=None, chunk_size=None, hasher=None):
+    """
+    Copy a file-like object to path one chunk at a time and return the byte count.
 
-async def upload_file_async(file_obj: UploadFile, complain_id: int, user: str):
+    Each chunk is also fed to hasher (e.g. hashlib.sha256()) when given.
+    Raises UploadTooLargeError, and removes the partial file, once more than
+    max_bytes have been read.
+    """
+    max_bytes = max_bytes or MEDIA_MAX_UPLOAD_BYTES
+    chunk_size = chunk_size or MEDIA_UPLOAD_CHUNK_SIZE
+    written = 0
     try:
-        content_type = file_obj.content_type
-        save_dir = "uploads/images" if content_type.startswith("image") else "uploads/videos"
-        os.makedirs(save_dir, exist_ok=True)
-        file_content = await file_obj.read()
-        timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
-        filename = f"{complain_id}_{timestamp}_{file_obj.filename}"
-        with open(os.path.join(save_dir, filename), "wb") as f:
-            f.write(file_content)
-        return True
-    except Exception as e:
-        logger.error(f"Upload async error: {e}")
-        return False
+        with open(path, 'wb') as out:
+            while True:
+                chunk = source.read(chunk_size)
+                if not chunk:
+                    break
+                written += len(chunk)
+                if written > max_bytes:
+                    raise UploadTooLargeError(f"Upload exceeds {max_bytes} bytes")
+                if hasher is not None:
+                    hasher.update(chunk)
+                out.write(chunk)
+    except Exception:
+        if os.path.exists(path):
+            os.remove(path)
+        raise
+    return written
 
-# ========== COMPLAINT FUNCTIONS =============
+def check_upload_sizes(files: List[UploadFile]):
+    """Reject oversized uploads before any work is done for the request"""
+    for file_obj in files:
+        size = getattr(file_obj, 'size', None)
+        if size and size > MEDIA_MAX_UPLOAD_BYTES:
+            raise HTTPException(
+                status_code=413,
+                detail=f"{file_obj.filename} exceeds the {MEDIA_MAX_UPLOAD_BYTES} byte upload limit"
+            )
 
-def validate_and_process_train_data(data):
-    conn = get_db_connection()
-    try:
-        if data.get("train_id"):
-            train = execute_query_one(conn, "SELECT * FROM trains_traindetails WHERE id = %s", (data['train_id'],))
-            if train:
-                data['train_number'] = train['train_no']
-                data['train_name'] = train['train_name']
-        elif data.get("train_number"):
-            train = execute_query_one(conn, "SELECT * FROM trains_traindetails WHERE train_no = %s", (data['train_number'],))
-            if train:
-                data['train_id'] = train['id']
-                data['train_name'] = train['train_name']
-        return data
-    finally:
-        conn.close()
+# ========== MEDIA PROCESSING JOBS =============
 
-def create_complaint(data):
-    data = validate_and_process_train_data(data)
-    conn = get_db_connection()
-    try:
-        now = datetime.now()
-        complain_date = data.get("complain_date") or str(date.today())
-        if isinstance(complain_date, str):
-            try:
-                complain_date = datetime.strptime(complain_date, "%Y-%m-%d").date()
-            except:
-                complain_date = date.today()
+MEDIA_JOB_WORKERS = int(os.getenv('MEDIA_JOB_WORKERS', 4))
+MEDIA_SPOOL_DIR = os.getenv('MEDIA_SPOOL_DIR', '/tmp/rail_sathi_spool')
+MEDIA_JOB_STALE_AFTER = int(os.getenv('MEDIA_JOB_STALE_AFTER', 600))
+# Jobs a process holds, queued or running, are stamped this often so
+# another process never takes them for stale; keep it well below
+# MEDIA_JOB_STALE_AFTER
+MEDIA_JOB_HEARTBEAT_INTERVAL = float(os.getenv('MEDIA_JOB_HEARTBEAT_INTERVAL', 60))
+
+media_job_executor = ThreadPoolExecutor(max_workers=MEDIA_JOB_WORKERS, thread_name_prefix='media-job')
+_held_media_jobs = set()
+_held_media_jobs_lock = threading.Lock()
+_heartbeat_thread = None
+
+MEDIA_COLUMNS = """
+    id, media_type, media_url, thumbnail_url, preview_url, created_at, updated_at,
+    created_by, updated_by, processing_status, progress
+"""
+
+# Marks the complaints of the media rows in a "changed_media" CTE as
+# updated, so attached, finished and removed media reach the change feed
+TOUCH_COMPLAINTS_CTE = """
+    touched AS (
+        UPDATE rail_sathi_railsathicomplain SET updated_at = now()
+        WHERE complain_id IN (SELECT complain_id FROM changed_media)
+    )
+"""
+
+MEDIA_INSERT_QUERY = f"""
+    WITH changed_media AS (
+        INSERT INTO rail_sathi_railsathicomplainmedia
+        (complain_id, media_type, media_url, thumbnail_url, preview_url, created_by, created_at, updated_at,
+         processing_status, progress, source_path, content_hash)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+        RETURNING complain_id, {MEDIA_COLUMNS}
+    ), {TOUCH_COMPLAINTS_CTE}
+    SELECT {MEDIA_COLUMNS} FROM changed_media
+"""
+
+# Takes a reference on the object for this content hash, creating it when
+# this is the first upload of these bytes (created = true)
+CLAIM_MEDIA_OBJECT_QUERY = """
+    INSERT INTO rail_sathi_media_object (content_hash, media_type, byte_size, ref_count)
+    VALUES (%s, %s, %s, 1)
+    ON CONFLICT (content_hash) DO UPDATE
+    SET ref_count = rail_sathi_media_object.ref_count + 1, updated_at = now()
+    RETURNING status, media_url, thumbnail_url, preview_url, (xmax = 0) AS created
+"""
+
+MEDIA_OBJECT_READY_QUERY = """
+    UPDATE rail_sathi_media_object
+    SET status = 'ready', media_url = %s, thumbnail_url = %s, preview_url = %s,
+        storage_keys = %s, updated_at = now()
+    WHERE content_hash = %s
+    RETURNING content_hash
+"""
+
+MEDIA_OBJECT_DELETE_QUERY = "DELETE FROM rail_sathi_media_object WHERE content_hash = %s"
+
+EXISTING_MEDIA_OBJECTS_QUERY = "SELECT content_hash FROM rail_sathi_media_object WHERE content_hash = ANY(%s)"
+
+# Stored file keys are derived from the content hash, so removing an
+# orphaned object's files and re-creating the object for a new upload of the
+# same bytes are serialised on a transaction-level advisory lock per hash
+# (taken in hash order to avoid deadlocks)
+MEDIA_OBJECT_LOCK_QUERY = """
+    SELECT pg_advisory_xact_lock(hashtextextended(content_hash, 0))
+    FROM (SELECT DISTINCT unnest(%s::text[]) AS content_hash ORDER BY 1) hashes
+"""
+
+MEDIA_JOB_UPDATE_QUERY = """
+    UPDATE rail_sathi_railsathicomplainmedia
+    SET processing_status = %s, progress = %s, media_url = COALESCE(%s, media_url),
+        processing_error = %s, updated_at = %s
+    WHERE id = %s
+    RETURNING complain_id
+"""
+
+MEDIA_JOB_FINISH_QUERY = f"""
+    WITH changed_media AS (
+        UPDATE rail_sathi_railsathicomplainmedia
+        SET processing_status = %s, progress = %s, media_url = %s,
+            thumbnail_url = %s, preview_url = %s,
+            processing_error = %s, source_path = NULL, updated_at = %s
+        WHERE id = %s
+        RETURNING complain_id
+    ), {TOUCH_COMPLAINTS_CTE}
+    SELECT complain_id FROM changed_media
+"""
+
+# Finishes the processing row and every duplicate waiting on the same object
+MEDIA_JOBS_FINISH_BY_HASH_QUERY = f"""
+    WITH changed_media AS (
+        UPDATE rail_sathi_railsathicomplainmedia
+        SET processing_status = %s, progress = 100, media_url = %s,
+            thumbnail_url = %s, preview_url = %s,
+            processing_error = %s, source_path = NULL, updated_at = %s
+        WHERE content_hash = %s AND processing_status IN ('pending', 'processing')
+        RETURNING complain_id
+    ), {TOUCH_COMPLAINTS_CTE}
+    SELECT complain_id FROM changed_media
+"""
+
+MEDIA_JOB_HEARTBEAT_QUERY = """
+    UPDATE rail_sathi_railsathicomplainmedia SET heartbeat_at = now()
+    WHERE id = ANY(%s) AND processing_status IN ('pending', 'processing')
+"""
+
+# Claims unfinished jobs whose process stopped sending heartbeats, e.g.
+# after a restart. A job never beaten (inserted just before its process
+# died) goes by updated_at.
+STALE_MEDIA_JOBS_QUERY = """
+    UPDATE rail_sathi_railsathicomplainmedia
+    SET heartbeat_at = now()
+    WHERE processing_status IN ('pending', 'processing')
+      AND COALESCE(heartbeat_at, updated_at) < now() - %s * interval '1 second'
+    RETURNING id, complain_id, media_type, source_path, content_hash
+"""
+
+MEDIA_STATUS_QUERY = f"""
+    SELECT {MEDIA_COLUMNS}, processing_error
+    FROM rail_sathi_railsathicomplainmedia WHERE complain_id = %s
+    ORDER BY id
+"""
+
+media_dedup_stats = {'uploads': 0, 'deduplicated': 0, 'bytes_saved': 0}
+
+def get_media_type(content_type):
+    content_type = content_type or ''
+    return "image" if content_type.startswith("image") else "video" if content_type.startswith("video") else None
+
+def get_media_dedup_stats():
+    stats = dict(media_dedup_stats)
+    stats['hit_ratio'] = round(stats['deduplicated'] / stats['uploads'], 4) if stats['uploads'] else 0.0
+    return stats
+
+def _set_media_job_state(media_id, status, progress, urls=None, error=None, finished=False):
+    urls = urls or {}
+    if finished:
+        query = MEDIA_JOB_FINISH_QUERY
+        params = (status, progress, urls.get('media_url'), urls.get('thumbnail_url'),
+                  urls.get('preview_url'), error, datetime.now(), media_id)
+    else:
+        query = MEDIA_JOB_UPDATE_QUERY
+        params = (status, progress, urls.get('media_url'), error, datetime.now(), media_id)
+    with db_connection() as conn:
+        rows = execute_query(conn, query, params)
+        conn.commit()
+    invalidate_complaints(row['complain_id'] for row in rows)
+
+def _delete_stored_objects(keys):
+    storage = get_storage()
+    for key in keys:
+        try:
+            storage.delete(key)
+        except Exception as e:
+            logger.error(f"Failed to delete stored media {key}: {e}")
 
+def _finish_media_object(content_hash, urls=None, error=None):
+    """
+    Record the outcome of processing a media object on the object and on all
+    media rows waiting for it. A failed object is dropped so the next upload
+    of the same bytes is processed again.
+    """
+    now = datetime.now()
+    abandoned = False
+    with db_connection() as conn:
         cursor = conn.cursor()
-        cursor.execute("""
-            INSERT INTO rail_sathi_railsathicomplain
-            (pnr_number, is_pnr_validated, name, mobile_number, complain_type,
-             complain_description, complain_date, complain_status, train_id, train_number,
-             train_name, coach, berth_no, created_by, created_at, updated_at)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-            RETURNING complain_id
-        """, (
-            data.get('pnr_number'), data.get('is_pnr_validated', 'not-attempted'),
-            data.get('name'), data.get('mobile_number'), data.get('complain_type'),
-            data.get('complain_description'), complain_date, data.get('complain_status', 'pending'),
-            data.get('train_id'), data.get('train_number'), data.get('train_name'),
-            data.get('coach'), data.get('berth_no'), data.get('created_by'), now, now
-        ))
-        complain_id = cursor.fetchone()[0]
+        finished = []
+        if urls:
+            cursor.execute(MEDIA_OBJECT_READY_QUERY, (
+                urls['media_url'], urls.get('thumbnail_url'), urls.get('preview_url'),
+                urls['storage_keys'], content_hash
+            ))
+            # No row when every media row referencing it was deleted while processing
+            abandoned = cursor.fetchone() is None
+            if not abandoned:
+                cursor.execute(MEDIA_JOBS_FINISH_BY_HASH_QUERY, (
+                    'done', urls['media_url'], urls.get('thumbnail_url'), urls.get('preview_url'),
+                    None, now, content_hash
+                ))
+                finished = cursor.fetchall()
+        else:
+            cursor.execute(MEDIA_JOBS_FINISH_BY_HASH_QUERY, (
+                'failed', None, None, None, error or "Media processing failed", now, content_hash
+            ))
+            finished = cursor.fetchall()
+            cursor.execute(MEDIA_OBJECT_DELETE_QUERY, (content_hash,))
         conn.commit()
-        complaint = get_complaint_by_id(complain_id)
-        threading.Thread(target=send_passenger_complain_email, args=({
-            'complain_id': complain_id,
-            'description': data.get('complain_description', ''),
-            'user_phone_number': data.get('mobile_number', ''),
-            'passenger_name': data.get('name', '')
-        },)).start()
-        return complaint
-    finally:
-        conn.close()
+    if abandoned:
+        collect_orphaned_media([(content_hash, urls['storage_keys'])])
+        return
+    invalidate_complaints(row[0] for row in finished)
 
-def get_complaint_by_id(complain_id):
-    conn = get_db_connection()
-    try:
-        complaint = execute_query_one(conn, """
-            SELECT c.*, t.train_no, t.train_name, t.depot as train_depot
-            FROM rail_sathi_railsathicomplain c
-            LEFT JOIN trains_traindetails t ON c.train_id = t.id
-            WHERE c.complain_id = %s
-        """, (complain_id,))
-        if not complaint:
-            return None
-        media_files = execute_query(conn, """
-            SELECT id, media_type, media_url, created_at, updated_at, created_by, updated_by
-            FROM rail_sathi_railsathicomplainmedia WHERE complain_id = %s
-        """, (complain_id,))
-        complaint['rail_sathi_complain_media_files'] = media_files or []
-        return complaint
-    finally:
-        conn.close()
+def collect_orphaned_media(orphaned):
+    """
+    Delete the stored files of media objects whose last reference was removed.
+    orphaned is a list of (content_hash, storage_keys). Each object is checked
+    and its files deleted under the hash's advisory lock, so an object
+    re-created by a new upload is left alone and its files are not deleted
+    while being written.
+    """
+    for content_hash, keys in orphaned:
+        with db_connection() as conn:
+            execute_query(conn, MEDIA_OBJECT_LOCK_QUERY, ([content_hash],))
+            if not execute_query(conn, EXISTING_MEDIA_OBJECTS_QUERY, ([content_hash],)):
+                _delete_stored_objects(keys or [])
+            conn.commit()
 
-def get_complaints_by_date(complain_date: date, mobile_number: str):
-    conn = get_db_connection()
+def run_media_job(media_id, source_path, complain_id, media_type, content_hash=None):
+    """Process a spooled upload and record the result on its media row(s)"""
     try:
-        complaints = execute_query(conn, """
-            SELECT c.*, t.train_no, t.train_name, t.depot as train_depot
-            FROM rail_sathi_railsathicomplain c
-            LEFT JOIN trains_traindetails t ON c.train_id = t.id
-            WHERE c.complain_date = %s AND c.mobile_number = %s
-        """, (complain_date, mobile_number))
-        for complaint in complaints:
-            media_files = execute_query(conn, """
-                SELECT id, media_type, media_url, created_at, updated_at, created_by, updated_by
-                FROM rail_sathi_railsathicomplainmedia WHERE complain_id = %s
-            """, (complaint['complain_id'],))
-            complaint['rail_sathi_complain_media_files'] = media_files or []
-        return complaints
+        _set_media_job_state(media_id, 'processing', 10)
+        ext = os.path.splitext(source_path)[1].lstrip('.').lower()
+        urls = process_media_file_upload(source_path, ext, complain_id, media_type, content_hash)
+        if content_hash:
+            _finish_media_object(content_hash, urls)
+        elif urls:
+            _set_media_job_state(media_id, 'done', 100, urls=urls, finished=True)
+        else:
+            _set_media_job_state(media_id, 'failed', 100, error="Media processing failed", finished=True)
+    except Exception as e:
+        logger.error(f"Media job {media_id} failed: {e}")
+        try:
+            if content_hash:
+                _finish_media_object(content_hash, error=str(e))
+            else:
+                _set_media_job_state(media_id, 'failed', 100, error=str(e), finished=True)
+        except Exception as db_error:
+            logger.error(f"Could not record failure of media job {media_id}: {db_error}")
     finally:
-        conn.close()
+        with _held_media_jobs_lock:
+            _held_media_jobs.discard(media_id)
+        if os.path.exists(source_path):
+            os.remove(source_path)
 
-def update_complaint(complain_id, data):
-    conn = get_db_connection()
-    try:
-        data = validate_and_process_train_data(data)
-        fields, values = [], []
-        for key in ['pnr_number', 'is_pnr_validated', 'name', 'mobile_number', 'complain_type',
-                    'complain_description', 'complain_date', 'complain_status', 'train_id',
-                    'train_number', 'train_name', 'coach', 'berth_no', 'updated_by']:
-            if key in data:
-                fields.append(f"{key} = %s")
-                values.append(data[key])
-        fields.append("updated_at = %s")
-        values.append(datetime.now())
-        values.append(complain_id)
-        cursor = conn.cursor()
-        cursor.execute(f"""
-            UPDATE rail_sathi_railsathicomplain SET {', '.join(fields)} WHERE complain_id = %s
-        """, tuple(values))
+def beat_media_jobs():
+    """Stamp heartbeat_at on the media jobs this process holds and return how many"""
+    with _held_media_jobs_lock:
+        media_ids = list(_held_media_jobs)
+    if not media_ids:
+        return 0
+    with db_connection() as conn:
+        beaten = execute_update(conn, MEDIA_JOB_HEARTBEAT_QUERY, (media_ids,))
         conn.commit()
-        return get_complaint_by_id(complain_id)
-    finally:
-        conn.close()
+    return beaten
 
-def delete_complaint(complain_id):
-    conn = get_db_connection()
+def _media_job_heartbeat():
+    while True:
+        time.sleep(MEDIA_JOB_HEARTBEAT_INTERVAL)
+        try:
+            beat_media_jobs()
+        except Exception as e:
+            logger.error(f"Media job heartbeat failed: {e}")
+
+def submit_media_job(media_id, source_path, complain_id, media_type, content_hash=None):
+    global _heartbeat_thread
+    with _held_media_jobs_lock:
+        _held_media_jobs.add(media_id)
+        if _heartbeat_thread is None:
+            _heartbeat_thread = threading.Thread(target=_media_job_heartbeat, name='media-job-heartbeat', daemon=True)
+            _heartbeat_thread.start()
+    return media_job_executor.submit(run_media_job, media_id, source_path, complain_id, media_type, content_hash)
+
+async def _spool_upload(file_obj: UploadFile, prefix):
+    """Stream an upload to the spool directory; returns (path, sha256 hex digest, size)"""
+    os.makedirs(MEDIA_SPOOL_DIR, exist_ok=True)
+    ext = os.path.splitext(file_obj.filename or '')[1].lower()
+    path = os.path.join(MEDIA_SPOOL_DIR, f"{prefix}_{uuid.uuid4().hex}{ext}")
+    hasher = hashlib.sha256()
+    await file_obj.seek(0)
+    size = await asyncio.to_thread(stream_to_file, file_obj.file, path, None, None, hasher)
+    return path, hasher.hexdigest(), size
+
+def _discard_spooled(spooled):
+    for source_path, *_ in spooled:
+        if os.path.exists(source_path):
+            os.remove(source_path)
+
+async def _spool_uploads(files: List[UploadFile], prefix):
+    """
+    Spool every supported upload; returns (path, content hash, size, media
+    type) per file. Nothing is left on disk when one of them is too large.
+    """
+    spooled = []
     try:
-        cursor = conn.cursor()
-        cursor.execute("DELETE FROM rail_sathi_railsathicomplainmedia WHERE complain_id = %s", (complain_id,))
-        cursor.execute("DELETE FROM rail_sathi_railsathicomplain WHERE complain_id = %s", (complain_id,))
+        for file_obj in files:
+            media_type = get_media_type(file_obj.content_type)
+            if not file_obj.filename or not media_type:
+                continue
+            spooled.append((*await _spool_upload(file_obj, prefix), media_type))
+    except UploadTooLargeError as e:
+        _discard_spooled(spooled)
+        raise HTTPException(status_code=413, detail=str(e))
+    except Exception:
+        _discard_spooled(spooled)
+        raise
+    return spooled
+
+async def _record_media_uploads(conn, spooled, complain_id: int, user: str):
+    """
+    Record a media row per spooled upload in the caller's transaction.
+    Returns the media rows and the (path, hash, media type) of the uploads
+    that need processing.
+
+    Each upload takes a reference on the media object for its content hash.
+    The first upload of some bytes is handed to the media job pool; a
+    duplicate of an already processed object is recorded as done with the
+    existing URLs, and a duplicate of one still processing waits for that job.
+    """
+    media_rows, jobs = [], []
+    # Waits for any collection of old files under these hashes (see collect_orphaned_media)
+    await execute_query_async(conn, MEDIA_OBJECT_LOCK_QUERY, ([row[1] for row in spooled],))
+    for source_path, content_hash, size, media_type in spooled:
+        now = datetime.now()
+        media_object = await execute_query_one_async(conn, CLAIM_MEDIA_OBJECT_QUERY, (content_hash, media_type, size))
+        if media_object['created']:
+            status, urls, row_source = 'pending', {}, source_path
+            jobs.append((source_path, content_hash, media_type))
+        elif media_object['status'] == 'ready':
+            status, urls, row_source = 'done', media_object, None
+        else:
+            status, urls, row_source = 'pending', {}, None
+        media_rows.append(await execute_query_one_async(conn, MEDIA_INSERT_QUERY, (
+            complain_id, media_type, urls.get('media_url'), urls.get('thumbnail_url'),
+            urls.get('preview_url'), user, now, now, status, 100 if status == 'done' else 0,
+            row_source, content_hash
+        )))
+        if not media_object['created']:
+            media_dedup_stats['deduplicated'] += 1
+            media_dedup_stats['bytes_saved'] += size
+        media_dedup_stats['uploads'] += 1
+    return media_rows, jobs
+
+def _start_media_jobs(spooled, media_rows, jobs, complain_id: int):
+    """Once the media rows are committed, drop duplicate spool files and submit the jobs"""
+    job_paths = {source_path for source_path, _, _ in jobs}
+    _discard_spooled([row for row in spooled if row[0] not in job_paths])
+    for media, (source_path, content_hash, size, media_type) in zip(media_rows, spooled):
+        if source_path in job_paths:
+            submit_media_job(media['id'], source_path, complain_id, media_type, content_hash)
+
+async def queue_media_uploads_async(files: List[UploadFile], complain_id: int, user: str):
+    """Spool uploads to disk and record a media row per file. Returns the media rows."""
+    spooled = await _spool_uploads(files, complain_id)
+    if not spooled:
+        return []
+    try:
+        async with async_db_connection() as conn:
+            media_rows, jobs = await _record_media_uploads(conn, spooled, complain_id, user)
+    except Exception:
+        _discard_spooled(spooled)
+        raise
+    await invalidate_complaints_async([complain_id])
+    _start_media_jobs(spooled, media_rows, jobs, complain_id)
+    return media_rows
+
+async def get_media_status_async(complain_id: int):
+    async with async_db_connection() as conn:
+        return await execute_query_async(conn, MEDIA_STATUS_QUERY, (complain_id,))
+
+def resume_media_jobs():
+    """Resubmit media jobs left unfinished by a previous process"""
+    with db_connection() as conn:
+        stale = execute_query(conn, STALE_MEDIA_JOBS_QUERY, (MEDIA_JOB_STALE_AFTER,))
         conn.commit()
-        return cursor.rowcount
-    finally:
-        conn.close()
+    resumed = 0
+    for job in stale:
+        if job['content_hash'] and not job['source_path']:
+            # A duplicate waiting on another row's job; finished along with it
+            continue
+        resumed += 1
+        if job['source_path'] and os.path.exists(job['source_path']):
+            submit_media_job(job['id'], job['source_path'], job['complain_id'], job['media_type'], job['content_hash'])
+        elif job['content_hash']:
+            _finish_media_object(job['content_hash'], error="Upload was lost before processing")
+        else:
+            _set_media_job_state(job['id'], 'failed', 100, error="Upload was lost before processing", finished=True)
+    if resumed:
+        logger.info(f"Resumed {resumed} unfinished media jobs")
+    return resumed
+
+# ========== COMPLAINT FUNCTIONS =============
+
+# Exactly the fields of the complaint response, so rows can be returned
+# to clients without passing through the response model
+COMPLAINT_COLUMNS = """
+    c.complain_id, c.pnr_number, c.is_pnr_validated, c.name, c.mobile_number,
+    c.complain_type, c.complain_description, c.complain_date, c.complain_status,
+    c.train_id, c.train_number, COALESCE(t.train_name, c.train_name) AS train_name,
+    c.coach, c.berth_no, c.created_at, c.created_by, c.updated_at, c.updated_by,
+    t.train_no, t.depot AS train_depot
+"""
+COMPLAINT_SELECT = f"""
+    SELECT {COMPLAINT_COLUMNS}
+    FROM rail_sathi_railsathicomplain c
+    LEFT JOIN trains_traindetails t ON c.train_id = t.id
+"""
+
+# Version of a complaint representation for ETags: changes whenever the
+# complaint is updated or one of its media rows is added, removed or
+# progresses. Computed from indexed columns only, so a client that is
+# current is answered without loading media.
+COMPLAINT_VERSION_COLUMN = """
+    md5(concat_ws(':', c.updated_at, (
+        SELECT concat_ws(':', count(*), max(id), max(updated_at))
+        FROM rail_sathi_railsathicomplainmedia WHERE complain_id = c.complain_id
+    ))) AS version
+"""
+COMPLAINTS_BY_DATE_QUERY = f"""
+    SELECT {COMPLAINT_COLUMNS}, {COMPLAINT_VERSION_COLUMN}
+    FROM rail_sathi_railsathicomplain c
+    LEFT JOIN trains_traindetails t ON c.train_id = t.id
+    WHERE c.complain_date = %s AND c.mobile_number = %s
+"""
+COMPLAINT_VERSION_QUERY = f"""
+    SELECT {COMPLAINT_VERSION_COLUMN} FROM rail_sathi_railsathicomplain c
+    WHERE c.complain_id = %s
+"""
+COMPLAINT_VERSIONS_BY_DATE_QUERY = f"""
+    SELECT c.complain_id, {COMPLAINT_VERSION_COLUMN} FROM rail_sathi_railsathicomplain c
+    WHERE c.complain_date = %s AND c.mobile_number = %s
+"""
+
+COMPLAINT_PAGE_SIZE = int(os.getenv('COMPLAINT_PAGE_SIZE', 50))
+COMPLAINT_PAGE_MAX_SIZE = int(os.getenv('COMPLAINT_PAGE_MAX_SIZE', 200))
+
+# Filters accepted by the complaint listing, mapped to their predicate
+COMPLAINT_LIST_FILTERS = {
+    'train_number': "c.train_number = %s",
+    'complain_status': "c.complain_status = %s",
+    'complain_type': "c.complain_type = %s",
+    'depot': "c.train_id IN (SELECT id FROM trains_traindetails WHERE depot = %s)",
+    'from_date': "c.complain_date >= %s",
+    'to_date': "c.complain_date <= %s",
+}
+
+CHANGE_FEED_PAGE_SIZE = int(os.getenv('CHANGE_FEED_PAGE_SIZE', 100))
+CHANGE_FEED_PAGE_MAX_SIZE = int(os.getenv('CHANGE_FEED_PAGE_MAX_SIZE', 500))
+# Changes younger than this are always held back for the next poll
+CHANGE_FEED_SETTLE_SECONDS = float(os.getenv('CHANGE_FEED_SETTLE_SECONDS', 2))
+# Tombstones older than this are pruned; a client whose cursor is older has
+# to resync from scratch
+CHANGE_FEED_TOMBSTONE_RETENTION_DAYS = float(os.getenv('CHANGE_FEED_TOMBSTONE_RETENTION_DAYS', 30))
+CHANGE_FEED_TOMBSTONE_PRUNE_INTERVAL = float(os.getenv('CHANGE_FEED_TOMBSTONE_PRUNE_INTERVAL', 3600))
+
+# Where a poll stops, read in a statement of its own before the feed query.
+# updated_at and deleted_at are stamped with now(), the start time of the
+# writing transaction, so a transaction still open can commit changes dated
+# as early as its start however long it runs; the feed stops before the
+# oldest open transaction's start as well as CHANGE_FEED_SETTLE_SECONDS ago.
+# Only client sessions of the app's own role are considered: they are the
+# writers of these tables, and a role can always read its own sessions'
+# xact_start, so autovacuum, dumps and other roles' long transactions do not
+# hold the feed back. Transactions that end after this is read commit before
+# the feed query's snapshot and are seen by it. lag_seconds is how far
+# behind now the feed stops; expired tells whether the since cursor is older
+# than the tombstones kept.
+CHANGE_FEED_HORIZON_QUERY = """
+    SELECT horizon, extract(epoch FROM now() - horizon) AS lag_seconds, expired
+    FROM (
+        SELECT LEAST(
+                   now() - %s * interval '1 second',
+                   (SELECT min(xact_start) FROM pg_stat_activity
+                    WHERE datname = current_database() AND backend_type = 'client backend'
+                      AND usename = current_user AND pid <> pg_backend_pid())
+               ) AS horizon,
+               %s::timestamptz < now() - %s * interval '1 day' AS expired
+    ) bound
+"""
+
+PRUNE_TOMBSTONES_QUERY = """
+    DELETE FROM rail_sathi_complain_tombstone
+    WHERE deleted_at < now() - %s * interval '1 day'
+"""
+
+class ChangeFeedExpiredError(ValueError):
+    """Raised when a change feed cursor is older than the tombstones kept"""
+    pass
+
+# Scopes a change feed can follow, mapped to their predicate on the
+# complaint or tombstone alias {t}
+CHANGE_FEED_SCOPES = {
+    'mobile_number': "{t}.mobile_number = %s",
+    'train_number': "{t}.train_number = %s",
+    'depot': "{t}.train_id IN (SELECT id FROM trains_traindetails WHERE depot = %s)",
+}
 
-def delete_complaint_media(complain_id: int, media_ids: List[int]):
-    conn = get_db_connection()
+COMPLAINTS_MEDIA_QUERY = f"""
+    SELECT complain_id, {MEDIA_COLUMNS}
+    FROM rail_sathi_railsathicomplainmedia WHERE complain_id = ANY(%s)
+    ORDER BY complain_id, id
+"""
+
+COMPLAINT_MEDIA_COLUMN = f"""
+    COALESCE((
+        SELECT json_agg(m ORDER BY m.id) FROM (
+            SELECT {MEDIA_COLUMNS} FROM rail_sathi_railsathicomplainmedia
+            WHERE complain_id = c.complain_id
+        ) m
+    ), '[]') AS rail_sathi_complain_media_files
+"""
+
+# The full complaint representation of the rows in a "written" CTE, so a
+# write returns its result, train details and media in the same round trip
+COMPLAINT_WRITE_RESULT = f"""
+    SELECT {COMPLAINT_COLUMNS}, {COMPLAINT_MEDIA_COLUMN}
+    FROM written c
+    LEFT JOIN trains_traindetails t ON c.train_id = t.id
+"""
+
+# A read is served by the same representation plus its version, so a
+# cache miss is one query
+COMPLAINT_BY_ID_FULL_QUERY = f"""
+    SELECT {COMPLAINT_COLUMNS}, {COMPLAINT_VERSION_COLUMN}, {COMPLAINT_MEDIA_COLUMN}
+    FROM rail_sathi_railsathicomplain c
+    LEFT JOIN trains_traindetails t ON c.train_id = t.id
+    WHERE c.complain_id = %s
+"""
+
+# Complaints changed and deleted after a cursor, in (changed_at,
+# complain_id) order. Each side is a range scan capped at the page size;
+# deleted complaints come back with only change_id set.
+COMPLAINT_FEED_QUERY = f"""
+    WITH changes AS (
+        (SELECT c.complain_id, c.updated_at AS changed_at, false AS deleted
+         FROM rail_sathi_railsathicomplain c
+         WHERE {{complaint_predicate}}
+         ORDER BY c.updated_at, c.complain_id LIMIT %s)
+        UNION ALL
+        (SELECT d.complain_id, d.deleted_at, true
+         FROM rail_sathi_complain_tombstone d
+         WHERE {{tombstone_predicate}}
+         ORDER BY d.deleted_at, d.complain_id LIMIT %s)
+        ORDER BY changed_at, complain_id LIMIT %s
+    )
+    SELECT ch.complain_id AS change_id, ch.changed_at, ch.deleted,
+           {COMPLAINT_COLUMNS}, {COMPLAINT_MEDIA_COLUMN}
+    FROM changes ch
+    LEFT JOIN rail_sathi_railsathicomplain c ON NOT ch.deleted AND c.complain_id = ch.complain_id
+    LEFT JOIN trains_traindetails t ON c.train_id = t.id
+    ORDER BY ch.changed_at, ch.complain_id
+"""
+
+COMPLAINT_INSERT_QUERY = f"""
+    WITH written AS (
+        INSERT INTO rail_sathi_railsathicomplain
+        (pnr_number, is_pnr_validated, name, mobile_number, complain_type,
+         complain_description, complain_date, complain_status, train_id, train_number,
+         train_name, coach, berth_no, created_by, created_at, updated_at)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, now(), now())
+        RETURNING *
+    )
+    {COMPLAINT_WRITE_RESULT}
+"""
+
+COMPLAINT_UPDATABLE_FIELDS = [
+    'pnr_number', 'is_pnr_validated', 'name', 'mobile_number', 'complain_type',
+    'complain_description', 'complain_date', 'complain_status', 'train_id',
+    'train_number', 'train_name', 'coach', 'berth_no', 'updated_by'
+]
+
+# Releases the media object references of the rows in a deleted_media CTE.
+# Objects left without references are removed and their storage keys
+# returned (as orphaned) so the files can be deleted after commit. The
+# objects are locked first and both branches go by the locked (latest)
+# ref_count, so concurrent deletes of the same object each see the other's
+# decrement instead of the statement snapshot.
+MEDIA_RELEASE_CTES = """
+    refs AS (
+        SELECT content_hash, count(*) AS n FROM deleted_media
+        WHERE content_hash IS NOT NULL GROUP BY content_hash
+    ), locked AS (
+        SELECT o.content_hash, o.ref_count - refs.n AS remaining
+        FROM rail_sathi_media_object o JOIN refs ON refs.content_hash = o.content_hash
+        ORDER BY o.content_hash
+        FOR UPDATE OF o
+    ), released AS (
+        UPDATE rail_sathi_media_object o
+        SET ref_count = locked.remaining, updated_at = now()
+        FROM locked
+        WHERE o.content_hash = locked.content_hash AND locked.remaining > 0
+        RETURNING o.content_hash
+    ), orphaned AS (
+        DELETE FROM rail_sathi_media_object o
+        USING locked
+        WHERE o.content_hash = locked.content_hash AND locked.remaining <= 0
+        RETURNING o.content_hash, o.storage_keys
+    )
+"""
+ORPHANED_MEDIA_COLUMN = """
+    COALESCE((SELECT json_agg(json_build_array(content_hash, storage_keys)) FROM orphaned), '[]') AS orphaned
+"""
+
+# Deletes media rows and releases their media object references in one statement
+RELEASE_MEDIA_QUERY = f"""
+    WITH deleted_media AS (
+        DELETE FROM rail_sathi_railsathicomplainmedia
+        WHERE {{predicate}}
+        RETURNING complain_id, content_hash
+    ), changed_media AS (
+        SELECT complain_id FROM deleted_media
+    ), {TOUCH_COMPLAINTS_CTE}, {MEDIA_RELEASE_CTES}
+    SELECT (SELECT count(*) FROM deleted_media) AS deleted,
+           (SELECT count(*) FROM released) AS released,
+           {ORPHANED_MEDIA_COLUMN}
+"""
+
+# Deletes the selected complaints together with their media. The
+# complaints are locked first so no media can be attached in between.
+BULK_DELETE_QUERY = f"""
+    WITH targets AS (
+        SELECT c.complain_id FROM rail_sathi_railsathicomplain c
+        WHERE {{predicate}}
+        FOR UPDATE
+    ), deleted_media AS (
+        DELETE FROM rail_sathi_railsathicomplainmedia
+        WHERE complain_id IN (SELECT complain_id FROM targets)
+        RETURNING content_hash
+    ), {MEDIA_RELEASE_CTES}, deleted AS (
+        DELETE FROM rail_sathi_railsathicomplain
+        WHERE complain_id IN (SELECT complain_id FROM targets)
+        RETURNING *
+    )
+    SELECT (SELECT count(*) FROM deleted) AS deleted,
+           (SELECT count(*) FROM deleted_media) AS media_deleted,
+           COALESCE((SELECT json_agg(complain_id ORDER BY complain_id) FROM deleted), '[]') AS complain_ids,
+           {{rows}} AS deleted_rows,
+           {ORPHANED_MEDIA_COLUMN}
+"""
+# Deletes a complaint and its media only when name and mobile number
+# match, in one statement; found/deleted tell a missing complaint apart
+# from a rejected one.
+DELETE_COMPLAINT_QUERY = f"""
+    WITH target AS (
+        SELECT complain_id,
+               name IS NOT DISTINCT FROM %s AND mobile_number IS NOT DISTINCT FROM %s AS allowed
+        FROM rail_sathi_railsathicomplain
+        WHERE complain_id = %s
+        FOR UPDATE
+    ), deleted_media AS (
+        DELETE FROM rail_sathi_railsathicomplainmedia
+        WHERE complain_id IN (SELECT complain_id FROM target WHERE allowed)
+        RETURNING content_hash
+    ), {MEDIA_RELEASE_CTES}, deleted AS (
+        DELETE FROM rail_sathi_railsathicomplain
+        WHERE complain_id IN (SELECT complain_id FROM target WHERE allowed)
+        RETURNING complain_id
+    )
+    SELECT (SELECT count(*) FROM target) AS found,
+           (SELECT count(*) FROM deleted) AS deleted,
+           {ORPHANED_MEDIA_COLUMN}
+"""
+DELETE_MEDIA_BY_IDS_QUERY = RELEASE_MEDIA_QUERY.format(predicate="complain_id = %s AND id = ANY(%s)")
+
+def _apply_train_details(data, train):
+    if not train:
+        return data
+    if data.get("train_id"):
+        data['train_number'] = train['train_no']
+        data['train_name'] = train['train_name']
+    else:
+        data['train_id'] = train['id']
+        data['train_name'] = train['train_name']
+    return data
+
+def _complaint_insert_params(data):
+    complain_date = data.get("complain_date") or str(date.today())
+    if isinstance(complain_date, str):
+        try:
+            complain_date = datetime.strptime(complain_date, "%Y-%m-%d").date()
+        except:
+            complain_date = date.today()
+    return (
+        data.get('pnr_number'), data.get('is_pnr_validated', 'not-attempted'),
+        data.get('name'), data.get('mobile_number'), data.get('complain_type'),
+        data.get('complain_description'), complain_date, data.get('complain_status', 'pending'),
+        data.get('train_id'), data.get('train_number'), data.get('train_name'),
+        data.get('coach'), data.get('berth_no'), data.get('created_by')
+    )
+
+def _complaint_update_statement(complain_id, data):
+    fields, values = [], []
+    for key in COMPLAINT_UPDATABLE_FIELDS:
+        if key in data:
+            fields.append(f"{key} = %s")
+            values.append(data[key])
+    fields.append("updated_at = now()")
+    values.append(complain_id)
+    query = f"""
+    WITH written AS (
+        UPDATE rail_sathi_railsathicomplain SET {', '.join(fields)}
+        WHERE complain_id = %s
+        RETURNING *
+    )
+    {COMPLAINT_WRITE_RESULT}
+"""
+    return query, tuple(values)
+
+def _notification_payload(complaint, data):
+    return {
+        'complain_id': complaint['complain_id'],
+        'description': data.get('complain_description', ''),
+        'user_phone_number': data.get('mobile_number', ''),
+        'passenger_name': data.get('name', ''),
+        'train_no': complaint.get('train_no') or data.get('train_number', ''),
+        'train_number': complaint.get('train_number') or data.get('train_number', ''),
+        'train_name': complaint.get('train_name', ''),
+        'train_depot': complaint.get('train_depot') or '',
+        'created_at': complaint.get('created_at', ''),
+        'date_of_journey': data.get('date_of_journey', ''),
+        'pnr': data.get('pnr_number') or 'PNR not provided by passenger',
+        'coach': data.get('coach', ''),
+        'berth': data.get('berth_no', '')
+    }
+
+def _complaint_created_emails(complaint, data):
+    return build_passenger_complain_emails(_notification_payload(complaint, data))
+
+def _attach_media(complaints, media_rows):
+    media_by_complaint = {}
+    for media in media_rows:
+        media_by_complaint.setdefault(media.pop('complain_id'), []).append(media)
+    for complaint in complaints:
+        complaint['rail_sathi_complain_media_files'] = media_by_complaint.get(complaint['complain_id'], [])
+    return complaints
+
+async def load_media_for_complaints_async(conn, complaints):
+    """Attach media files to every complaint in a single query"""
+    if not complaints:
+        return complaints
+    complain_ids = [complaint['complain_id'] for complaint in complaints]
+    media_rows = await execute_query_async(conn, COMPLAINTS_MEDIA_QUERY, (complain_ids,))
+    return _attach_media(complaints, media_rows)
+
+def complaints_version(complaints):
+    """Version of a set of complaints, independent of their order"""
+    versions = sorted((complaint['complain_id'], complaint['version']) for complaint in complaints)
+    return hashlib.md5(';'.join(f"{complain_id}={version}" for complain_id, version in versions).encode()).hexdigest()
+
+def _encode_cursor(position_at, complain_id):
+    if isinstance(position_at, datetime):
+        position_at = position_at.isoformat()
+    raw = json.dumps([position_at, complain_id])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+def encode_complaint_cursor(complaint):
+    """Opaque cursor pointing just after complaint in (created_at, complain_id) order"""
+    return _encode_cursor(complaint['created_at'], complaint['complain_id'])
+
+def decode_complaint_cursor(cursor: str):
+    """Return (created_at, complain_id) from a cursor; raises ValueError when malformed"""
     try:
-        cursor = conn.cursor()
-        cursor.execute("""
-            DELETE FROM rail_sathi_railsathicomplainmedia
-            WHERE complain_id = %s AND id = ANY(%s)
-        """, (complain_id, media_ids))
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        created_at, complain_id = json.loads(raw)
+        return datetime.fromisoformat(created_at), int(complain_id)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+def _complaint_filter_clauses(filters: Dict[str, Any]):
+    clauses, params = [], []
+    for name, predicate in COMPLAINT_LIST_FILTERS.items():
+        if filters.get(name) is not None:
+            clauses.append(predicate)
+            params.append(filters[name])
+    return clauses, params
+
+def _complaint_selector(complain_ids: Optional[List[int]], filters: Dict[str, Any]):
+    """
+    WHERE predicate (on alias c) and params selecting complaints by id and/or
+    listing filters. Refuses an empty selection so a bulk call can never
+    touch the whole table by accident.
+    """
+    clauses, params = _complaint_filter_clauses(filters or {})
+    if complain_ids is not None:
+        if not complain_ids:
+            raise ValueError("complain_ids must not be empty")
+        clauses.insert(0, "c.complain_id = ANY(%s)")
+        params.insert(0, list(complain_ids))
+    if not clauses:
+        raise ValueError("Select complaints with complain_ids or at least one filter")
+    return " AND ".join(clauses), params
+
+def _complaint_list_statement(filters: Dict[str, Any], cursor: Optional[str], limit: int):
+    clauses, params = _complaint_filter_clauses(filters)
+    if cursor:
+        clauses.append("(c.created_at, c.complain_id) < (%s, %s)")
+        params.extend(decode_complaint_cursor(cursor))
+    where = "WHERE " + " AND ".join(clauses) + "\n" if clauses else ""
+    query = COMPLAINT_SELECT + where + "ORDER BY c.created_at DESC, c.complain_id DESC LIMIT %s"
+    # One extra row tells whether another page follows
+    params.append(limit + 1)
+    return query, tuple(params)
+
+def _complaint_page(complaints, limit):
+    has_more = len(complaints) > limit
+    complaints = complaints[:limit]
+    return {
+        'data': complaints,
+        'next_cursor': encode_complaint_cursor(complaints[-1]) if has_more else None,
+        'has_more': has_more
+    }
+
+def _complaint_feed_statement(scope: Dict[str, Any], since: Optional[str], limit: int, horizon: datetime):
+    scope_clauses, scope_params = [], []
+    for name, predicate in CHANGE_FEED_SCOPES.items():
+        if scope.get(name) is not None:
+            scope_clauses.append(predicate)
+            scope_params.append(scope[name])
+    if not scope_clauses:
+        raise ValueError("Give a scope: " + ", ".join(CHANGE_FEED_SCOPES))
+    position = decode_complaint_cursor(since) if since else None
+
+    def predicate(alias, column):
+        clauses = [clause.format(t=alias) for clause in scope_clauses]
+        params = list(scope_params)
+        clauses.append(f"{alias}.{column} < %s")
+        params.append(horizon)
+        if position:
+            clauses.append(f"({alias}.{column}, {alias}.complain_id) > (%s, %s)")
+            params.extend(position)
+        return " AND ".join(clauses), params
+
+    complaint_predicate, complaint_params = predicate('c', 'updated_at')
+    tombstone_predicate, tombstone_params = predicate('d', 'deleted_at')
+    query = COMPLAINT_FEED_QUERY.format(
+        complaint_predicate=complaint_predicate, tombstone_predicate=tombstone_predicate
+    )
+    # One extra row tells whether more changes are waiting
+    params = complaint_params + [limit + 1] + tombstone_params + [limit + 1, limit + 1]
+    return query, tuple(params)
+
+def _change_feed_horizon_params(since: Optional[str]):
+    position_at = decode_complaint_cursor(since)[0] if since else None
+    return (CHANGE_FEED_SETTLE_SECONDS, position_at, CHANGE_FEED_TOMBSTONE_RETENTION_DAYS)
+
+def _change_feed_horizon(bound):
+    if bound['expired']:
+        raise ChangeFeedExpiredError(
+            f"Cursor is older than the {CHANGE_FEED_TOMBSTONE_RETENTION_DAYS:g} days of deletions kept; "
+            "resync without since"
+        )
+    change_feed_horizon_lag.set(float(bound['lag_seconds']))
+    return bound['horizon']
+
+def _complaint_feed_page(rows, limit, since):
+    """
+    Split feed rows into changed complaints and tombstones. next_cursor is
+    always set: clients keep polling with it, and it stays put when there
+    were no changes.
+    """
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    data, deleted = [], []
+    for row in rows:
+        change_id, changed_at = row.pop('change_id'), row.pop('changed_at')
+        if row.pop('deleted'):
+            deleted.append({'complain_id': change_id, 'deleted_at': changed_at})
+        else:
+            data.append(row)
+    next_cursor = _encode_cursor(changed_at, change_id) if rows else since
+    return {'data': data, 'deleted': deleted, 'next_cursor': next_cursor, 'has_more': has_more}
+
+def _bulk_update_statement(complain_ids, filters, changes, returning):
+    predicate, params = _complaint_selector(complain_ids, filters)
+    fields, values = [], []
+    for key in COMPLAINT_UPDATABLE_FIELDS:
+        if key in changes:
+            fields.append(f"{key} = %s")
+            values.append(changes[key])
+    if not fields:
+        raise ValueError("No fields to update")
+    fields.append("updated_at = now()")
+    query = (
+        f"UPDATE rail_sathi_railsathicomplain c SET {', '.join(fields)} "
+        f"WHERE {predicate} RETURNING {'c.*' if returning else 'c.complain_id'}"
+    )
+    return query, tuple(values + params)
+
+async def _bulk_update_result(rows, returning):
+    result = {'updated': len(rows), 'complain_ids': sorted(row['complain_id'] for row in rows)}
+    await invalidate_complaints_async(result['complain_ids'])
+    if returning:
+        result['rows'] = rows
+    return result
+
+def _bulk_delete_statement(complain_ids, filters, returning):
+    predicate, params = _complaint_selector(complain_ids, filters)
+    rows = "COALESCE((SELECT json_agg(d ORDER BY d.complain_id) FROM deleted d), '[]')" if returning else "NULL"
+    return BULK_DELETE_QUERY.format(predicate=predicate, rows=rows), tuple(params)
+
+async def _bulk_delete_result(row, returning):
+    _collect_released_media(row)
+    await invalidate_complaints_async(row['complain_ids'])
+    result = {'deleted': row['deleted'], 'media_deleted': row['media_deleted'], 'complain_ids': row['complain_ids']}
+    if returning:
+        result['rows'] = row['deleted_rows']
+    return result
+
+def prune_complaint_tombstones():
+    """Delete tombstones older than CHANGE_FEED_TOMBSTONE_RETENTION_DAYS and return how many went"""
+    with db_connection() as conn:
+        pruned = execute_delete(conn, PRUNE_TOMBSTONES_QUERY, (CHANGE_FEED_TOMBSTONE_RETENTION_DAYS,))
         conn.commit()
-        return cursor.rowcount
-    finally:
-        conn.close()
+    if pruned:
+        logger.info(f"Pruned {pruned} complaint tombstones")
+    return pruned
+
+def _collect_released_media(released):
+    """Schedule deletion of stored files orphaned by a RELEASE_MEDIA_QUERY"""
+    if released['orphaned']:
+        media_job_executor.submit(collect_orphaned_media, [tuple(o) for o in released['orphaned']])
+    return released['deleted']
+
+async def _media_deleted_result(complain_id, released):
+    if released['deleted']:
+        await invalidate_complaints_async([complain_id])
+    return _collect_released_media(released)
+
+async def _delete_complaint_result(complain_id, result):
+    _collect_released_media(result)
+    if result['deleted']:
+        await invalidate_complaints_async([complain_id])
+    if not result['found']:
+        return 0, "Complaint not found"
+    if not result['deleted']:
+        return 0, "Name or mobile number does not match"
+    return result['deleted'], "Complaint deleted"
+
+# ========== ASYNC COMPLAINT FUNCTIONS =============
+
+async def validate_and_process_train_data_async(data):
+    if data.get("train_id"):
+        train = await get_train_by_id_async(data['train_id'])
+    elif data.get("train_number"):
+        train = await get_train_by_no_async(data['train_number'])
+    else:
+        return data
+    return _apply_train_details(data, train)
 
-def fetch_war_room_users_safe():
-    conn = get_db_connection()
+async def create_complaint_async(data, files: List[UploadFile] = (), user: str = ''):
+    """
+    Create a complaint with its media. Uploads are spooled and hashed first,
+    so an upload that is too large or fails to spool leaves no complaint
+    behind; the complaint, its media rows and its notifications then commit
+    in one transaction.
+    """
+    data = await validate_and_process_train_data_async(data)
+    spooled = await _spool_uploads(files, 'new')
     try:
-        cursor = conn.cursor()
-        try:
-            cursor.execute("""
-                SELECT u.*
-                FROM information_schema.tables t
-                JOIN user_onboarding_user u ON TRUE
-                JOIN user_onboarding_roles ut ON u.user_type_id = ut.id
-                WHERE t.table_name = 'user_onboarding_user' AND ut.name = 'war room user'
-            """)
-            return cursor.fetchall()
-        except Exception as e:
-            logger.warning(f"Skipping war room fetch due to error: {e}")
-            return []
-    finally:
-        conn.close()
-def validate_complaint_access(complain_id: int, name: str, mobile_number: str):
+        async with async_db_connection() as conn:
+            complaint = await execute_query_one_async(conn, COMPLAINT_INSERT_QUERY, _complaint_insert_params(data))
+            media_rows, jobs = [], []
+            if spooled:
+                media_rows, jobs = await _record_media_uploads(conn, spooled, complaint['complain_id'], user)
+            # Notifications are queued in the complaint's transaction so neither commits without the other
+            messages = await asyncio.to_thread(_complaint_created_emails, complaint, data)
+            await enqueue_emails_async(messages, conn)
+    except Exception:
+        _discard_spooled(spooled)
+        raise
+    wake_outbox()
+    _start_media_jobs(spooled, media_rows, jobs, complaint['complain_id'])
+    complaint['rail_sathi_complain_media_files'].extend(media_rows)
+    return complaint
+
+async def get_complaint_by_id_async(complain_id):
+    cache = get_complaint_cache()
+    complaint = await cache.get_async(complain_id)
+    if complaint is not None:
+        return complaint
+    generation = await cache.generation_async()
+    async with async_db_connection() as conn:
+        complaint = await execute_query_one_async(conn, COMPLAINT_BY_ID_FULL_QUERY, (complain_id,))
+    await cache.set_async(complain_id, complaint, generation)
+    return complaint
+
+async def get_complaint_version_async(complain_id):
+    """Current version of a complaint (None if missing) without loading it"""
+    cached = await get_complaint_cache().get_async(complain_id)
+    if cached is not None:
+        return cached['version']
+    async with async_db_connection() as conn:
+        row = await execute_query_one_async(conn, COMPLAINT_VERSION_QUERY, (complain_id,))
+    return row['version'] if row else None
+
+async def get_complaints_by_date_version_async(complain_date: date, mobile_number: str):
+    async with async_db_connection() as conn:
+        rows = await execute_query_async(conn, COMPLAINT_VERSIONS_BY_DATE_QUERY, (complain_date, mobile_number))
+    return complaints_version(rows)
+
+async def get_complaints_by_date_async(complain_date: date, mobile_number: str):
+    async with async_db_connection() as conn:
+        complaints = await execute_query_async(conn, COMPLAINTS_BY_DATE_QUERY, (complain_date, mobile_number))
+        return await load_media_for_complaints_async(conn, complaints)
+
+async def list_complaints_async(filters: Dict[str, Any], cursor: Optional[str] = None,
+                                limit: int = COMPLAINT_PAGE_SIZE):
+    """
+    One page of complaints, newest first, matching filters (keys of
+    COMPLAINT_LIST_FILTERS). Returns {data, next_cursor, has_more}.
     """
-    Dummy access check — you can customize it later.
-    Allows delete if the complaint exists and name/mobile matches.
+    limit = max(1, min(limit, COMPLAINT_PAGE_MAX_SIZE))
+    query, params = _complaint_list_statement(filters, cursor, limit)
+    async with async_db_connection() as conn:
+        page = _complaint_page(await execute_query_async(conn, query, params), limit)
+        await load_media_for_complaints_async(conn, page['data'])
+    return page
+
+async def get_complaint_changes_async(scope: Dict[str, Any], since: Optional[str] = None,
+                                      limit: int = CHANGE_FEED_PAGE_SIZE):
+    """
+    Complaints created, updated or deleted after the since cursor within a
+    scope (keys of CHANGE_FEED_SCOPES), oldest change first. Returns
+    {data, deleted, next_cursor, has_more, horizon_lag_seconds}; without since
+    the feed starts from the beginning.
+    """
+    limit = max(1, min(limit, CHANGE_FEED_PAGE_MAX_SIZE))
+    async with async_db_connection() as conn:
+        bound = await execute_query_one_async(conn, CHANGE_FEED_HORIZON_QUERY, _change_feed_horizon_params(since))
+        rows = await execute_query_async(
+            conn, *_complaint_feed_statement(scope, since, limit, _change_feed_horizon(bound))
+        )
+    page = _complaint_feed_page(rows, limit, since)
+    page['horizon_lag_seconds'] = round(float(bound['lag_seconds']), 3)
+    return page
+
+async def update_complaint_async(complain_id, data):
+    data = await validate_and_process_train_data_async(data)
+    async with async_db_connection() as conn:
+        complaint = await execute_query_one_async(conn, *_complaint_update_statement(complain_id, data))
+    await invalidate_complaints_async([complain_id])
+    return complaint
+
+async def delete_complaint_async(complain_id, name, mobile_number):
+    async with async_db_connection() as conn:
+        result = await execute_query_one_async(conn, DELETE_COMPLAINT_QUERY, (name, mobile_number, complain_id))
+    return await _delete_complaint_result(complain_id, result)
+
+async def delete_complaint_media_async(complain_id: int, media_ids: List[int]):
+    async with async_db_connection() as conn:
+        released = await execute_query_one_async(conn, DELETE_MEDIA_BY_IDS_QUERY, (complain_id, media_ids))
+    return await _media_deleted_result(complain_id, released)
+
+async def bulk_update_complaints_async(complain_ids: Optional[List[int]], filters: Dict[str, Any],
+                                      changes: Dict[str, Any], returning: bool = False):
     """
+    Apply changes to every selected complaint with one UPDATE statement.
+    Train fields are resolved once for the whole set. Returns the affected
+    count and ids, plus the updated rows when returning is set.
+    """
+    changes = await validate_and_process_train_data_async(dict(changes))
+    query, params = _bulk_update_statement(complain_ids, filters, changes, returning)
+    async with async_db_connection() as conn:
+        rows = await execute_query_async(conn, query, params)
+    return await _bulk_update_result(rows, returning)
+
+async def bulk_delete_complaints_async(complain_ids: Optional[List[int]], filters: Dict[str, Any],
+                                       returning: bool = False):
+    """Delete the selected complaints and their media in one statement"""
+    query, params = _bulk_delete_statement(complain_ids, filters, returning)
+    async with async_db_connection() as conn:
+        row = await execute_query_one_async(conn, query, params)
+    return await _bulk_delete_result(row, returning)
+
+# ========== BULK INGEST =============
+
+BULK_INGEST_MAX_ROWS = int(os.getenv('BULK_INGEST_MAX_ROWS', 50000))
+BULK_INGEST_BATCH_SIZE = int(os.getenv('BULK_INGEST_BATCH_SIZE', 1000))
+
+BULK_COMPLAINT_FIELDS = [
+    'pnr_number', 'is_pnr_validated', 'name', 'mobile_number', 'complain_type',
+    'complain_description', 'complain_date', 'date_of_journey', 'complain_status',
+    'train_id', 'train_number', 'train_name', 'coach', 'berth_no', 'created_by'
+]
+BULK_INTEGER_FIELDS = ('train_id', 'berth_no')
+
+# Inserts one batch given as an array per column. Ids are drawn from the
+# sequence up front and returned with each row's 1-based position in the
+# batch, so results are matched to input rows by position rather than by
+# the order RETURNING happens to produce.
+BULK_COMPLAINT_INSERT_QUERY = """
+    WITH input AS (
+        SELECT nextval(pg_get_serial_sequence('rail_sathi_railsathicomplain', 'complain_id')) AS complain_id, r.*
+        FROM unnest(%s::text[], %s::text[], %s::text[], %s::text[], %s::text[], %s::text[], %s::date[],
+                    %s::text[], %s::integer[], %s::text[], %s::text[], %s::text[], %s::integer[], %s::text[])
+             WITH ORDINALITY AS r(pnr_number, is_pnr_validated, name, mobile_number, complain_type,
+                                  complain_description, complain_date, complain_status, train_id, train_number,
+                                  train_name, coach, berth_no, created_by, row_position)
+    ), written AS (
+        INSERT INTO rail_sathi_railsathicomplain
+        (complain_id, pnr_number, is_pnr_validated, name, mobile_number, complain_type,
+         complain_description, complain_date, complain_status, train_id, train_number,
+         train_name, coach, berth_no, created_by, created_at, updated_at)
+        SELECT complain_id, pnr_number, is_pnr_validated, name, mobile_number, complain_type,
+               complain_description, complain_date, complain_status, train_id, train_number,
+               train_name, coach, berth_no, created_by, now(), now()
+        FROM input
+        RETURNING complain_id
+    )
+    SELECT i.row_position, i.complain_id FROM input i JOIN written w ON w.complain_id = i.complain_id
+"""
+
+def detect_bulk_format(filename: Optional[str], content_type: Optional[str], fmt: Optional[str] = None) -> str:
+    """Return 'csv' or 'jsonl' from an explicit format, the file extension or the content type"""
+    if fmt:
+        fmt = fmt.lower()
+        if fmt in ('csv', 'jsonl', 'ndjson'):
+            return 'csv' if fmt == 'csv' else 'jsonl'
+        raise ValueError(f"Unsupported format: {fmt}")
+    ext = os.path.splitext(filename or '')[1].lower()
+    if ext == '.csv' or (content_type or '').startswith('text/csv'):
+        return 'csv'
+    return 'jsonl'
+
+def parse_bulk_complaints(source, fmt: str):
+    """
+    Yield one dict per complaint from a binary file object holding CSV (with
+    a header row) or JSON Lines. A line that is not a JSON object is yielded
+    as a ValueError so it is reported against its row.
+    """
+    text = io.TextIOWrapper(source, encoding='utf-8-sig', newline='')
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT name, mobile_number FROM rail_sathi_railsathicomplain
-            WHERE complain_id = %s
-        """, (complain_id,))
-        result = cursor.fetchone()
-        conn.close()
-
-        if not result:
-            return False, "Complaint not found"
-        
-        if result[0] == name and result[1] == mobile_number:
-            return True, "Access granted"
+        if fmt == 'csv':
+            yield from csv.DictReader(text)
+            return
+        for line in text:
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except json.JSONDecodeError as e:
+                yield ValueError(f"Invalid JSON: {e.msg}")
+                continue
+            yield row if isinstance(row, dict) else ValueError("Each line must be a JSON object")
+    finally:
+        text.detach()
+
+def _normalize_bulk_row(raw: Dict, created_by: Optional[str]) -> Dict:
+    data = {}
+    for field in BULK_COMPLAINT_FIELDS:
+        value = raw.get(field)
+        if value is None or value == '':
+            continue
+        if field in BULK_INTEGER_FIELDS:
+            try:
+                value = int(value)
+            except (TypeError, ValueError):
+                raise ValueError(f"{field} must be an integer")
+        elif field == 'complain_date':
+            try:
+                value = datetime.strptime(str(value), "%Y-%m-%d").date()
+            except ValueError:
+                raise ValueError("complain_date must be YYYY-MM-DD")
         else:
-            return False, "Name or mobile number does not match"
+            value = str(value).strip()
+        data[field] = value
+    data.setdefault('is_pnr_validated', 'not-attempted')
+    data.setdefault('complain_status', 'pending')
+    data.setdefault('created_by', created_by or data.get('name'))
+    return data
 
-    except Exception as e:
-        logger.error(f"Error validating access: {e}")
-        return False, "Validation failed"
+def _bulk_train(trains, data):
+    if data.get('train_id'):
+        return trains['by_id'].get(data['train_id'])
+    if data.get('train_number'):
+        return trains['by_no'].get(str(data['train_number']).strip())
+    return None
+
+def bulk_ingest_complaints(rows, created_by: Optional[str] = None, notify: bool = True):
+    """
+    Validate and insert many complaints in one transaction.
+
+    Trains are resolved with one set-based lookup and rows are inserted with
+    one statement per BULK_INGEST_BATCH_SIZE rows.
+    Invalid rows, including rows whose train is not found, are reported and
+    skipped; the valid ones are all inserted or, on a database error, none
+    are. Notifications go out as one digest email per recipient. Returns counts, throughput and a result per input row.
+    """
+    started = time.monotonic()
+    results, valid = [], []
+    for index, raw in enumerate(rows, start=1):
+        if index > BULK_INGEST_MAX_ROWS:
+            raise ValueError(f"At most {BULK_INGEST_MAX_ROWS} rows can be ingested per request")
+        try:
+            if isinstance(raw, Exception):
+                raise raw
+            data = _normalize_bulk_row(raw, created_by)
+        except ValueError as e:
+            results.append({'row': index, 'status': 'error', 'complain_id': None, 'error': str(e)})
+            continue
+        results.append({'row': index, 'status': 'created', 'complain_id': None, 'error': None})
+        valid.append((len(results) - 1, data))
+
+    trains = get_trains(
+        [data['train_id'] for _, data in valid if data.get('train_id')],
+        [data['train_number'] for _, data in valid if not data.get('train_id') and data.get('train_number')]
+    )
+    resolved = []
+    for position, data in valid:
+        train = _bulk_train(trains, data)
+        # An unknown train_id would fail its foreign key and roll back every row
+        if train is None and (data.get('train_id') or data.get('train_number')):
+            results[position].update(status='error', error='unknown train')
+            continue
+        resolved.append((position, _apply_train_details(data, train), train))
+
+    if resolved:
+        with db_connection() as conn:
+            for start in range(0, len(resolved), BULK_INGEST_BATCH_SIZE):
+                batch = resolved[start:start + BULK_INGEST_BATCH_SIZE]
+                columns = zip(*(_complaint_insert_params(data) for _, data, _ in batch))
+                for row in execute_query(conn, BULK_COMPLAINT_INSERT_QUERY, tuple(map(list, columns))):
+                    results[batch[row['row_position'] - 1][0]]['complain_id'] = row['complain_id']
+            conn.commit()
+
+    if notify and resolved:
+        created_at = datetime.now()
+        try:
+            send_complaint_digest_emails([
+                _notification_payload({
+                    'complain_id': results[position]['complain_id'],
+                    'train_no': train['train_no'] if train else None,
+                    'train_number': data.get('train_number'),
+                    'train_name': data.get('train_name', ''),
+                    'train_depot': train['depot'] if train else '',
+                    'created_at': created_at
+                }, data)
+                for position, data, train in resolved
+            ])
+        except Exception as e:
+            logger.error(f"Queueing bulk ingest notifications failed: {e}")
+
+    elapsed = time.monotonic() - started
+    logger.info(f"Bulk ingested {len(resolved)}/{len(results)} complaints in {elapsed:.3f}s")
+    return {
+        'total': len(results),
+        'created': len(resolved),
+        'failed': len(results) - len(resolved),
+        'elapsed_seconds': round(elapsed, 3),
+        'rows_per_second': round(len(resolved) / elapsed, 1) if elapsed else None,
+        'results': results
+    }
+
+def bulk_ingest_upload(source, filename: Optional[str], content_type: Optional[str], fmt: Optional[str] = None,
+                       created_by: Optional[str] = None, notify: bool = True):
+    """Parse an uploaded CSV / JSON Lines file and ingest it with bulk_ingest_complaints"""
+    fmt = detect_bulk_format(filename, content_type, fmt)
+    source.seek(0)
+    return bulk_ingest_complaints(parse_bulk_complaints(source, fmt), created_by, notify)
@@ -0,0 +1,65 @@
+import asyncio
+import threading
+from datetime import datetime
+
+import fakeredis
+
+from utils import complaint_cache
+from utils.complaint_cache import RedisComplaintCache
+
+
+def _worker_caches(count=2):
+    server = fakeredis.FakeServer()
+    return [RedisComplaintCache(ttl=60, client=fakeredis.FakeRedis(server=server)) for _ in range(count)]
+
+
+def test_redis_backend_shares_entries_and_invalidations_between_workers():
+    first, second = _worker_caches()
+    complaint = {"complain_id": 7, "complain_status": "pending", "created_at": datetime(2025, 7, 13, 10, 0)}
+
+    first.set(7, complaint, first.generation())
+    assert second.get(7) == {**complaint, "created_at": "2025-07-13T10:00:00"}
+    assert 0 < first._client.ttl("rail_sathi:complaint:7") <= 60
+
+    # A read in one worker that started before another worker's update must not re-cache the old row
+    generation = second.generation()
+    first.invalidate([7])
+    assert second.get(7) is None
+    second.set(7, complaint, generation)
+    assert first.get(7) is None
+
+    second.set(7, complaint, second.generation())
+    first.clear()
+    assert second.get(7) is None and first.generation() == 2
+
+
+def test_redis_backend_async_calls_run_off_the_event_loop():
+    cache = _worker_caches(1)[0]
+    client_threads = []
+    get = cache._client.get
+
+    def recording_get(key):
+        client_threads.append(threading.get_ident())
+        return get(key)
+
+    cache._client.get = recording_get
+
+    async def read_write_invalidate():
+        await cache.set_async(7, {"complain_id": 7}, await cache.generation_async())
+        cached = await cache.get_async(7)
+        await cache.invalidate_async(iter([7]))
+        return threading.get_ident(), cached, await cache.get_async(7)
+
+    loop_thread, cached, after = asyncio.run(read_write_invalidate())
+    assert cached == {"complain_id": 7} and after is None
+    assert client_threads and loop_thread not in client_threads
+    assert cache.stats()["invalidations"] == 1
+
+
+def test_fakeredis_backend_is_selectable(monkeypatch):
+    monkeypatch.setattr(complaint_cache, "COMPLAINT_CACHE_BACKEND", "fakeredis")
+    cache = complaint_cache._create_cache()
+    assert isinstance(cache, RedisComplaintCache) and cache.blocking
+
+    cache.set(3, {"complain_id": 3})
+    assert cache.get(3) == {"complain_id": 3}
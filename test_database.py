@@ -0,0 +1,155 @@
+import os
+import threading
+
+for key, value in {
+    "MAIL_USERNAME": "test", "MAIL_PASSWORD": "test", "MAIL_FROM": "test@example.com",
+    "POSTGRES_HOST": "localhost", "POSTGRES_USER": "test",
+    "POSTGRES_PASSWORD": "test", "POSTGRES_DB": "test",
+}.items():
+    os.environ.setdefault(key, value)
+
+import pytest
+import psycopg2.extensions
+from database import ConnectionPool, PoolTimeoutError
+
+
+class FakeCursor:
+    def __init__(self, connection):
+        self.connection = connection
+
+    def execute(self, query, params=None):
+        if self.connection.broken:
+            raise psycopg2.OperationalError("server closed the connection unexpectedly")
+        self.connection.pings += 1
+
+    def fetchone(self):
+        return (1,)
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self):
+        self.closed = 0
+        self.broken = False
+        self.in_transaction = False
+        self.pings = 0
+        self.rollbacks = 0
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def get_transaction_status(self):
+        if self.in_transaction:
+            return psycopg2.extensions.TRANSACTION_STATUS_INTRANS
+        return psycopg2.extensions.TRANSACTION_STATUS_IDLE
+
+    def rollback(self):
+        self.rollbacks += 1
+        self.in_transaction = False
+
+    def close(self):
+        self.closed = 1
+
+
+def make_pool(**overrides):
+    opened = []
+
+    def connect():
+        connection = FakeConnection()
+        opened.append(connection)
+        return connection
+
+    config = {'min_size': 0, 'max_size': 2, 'timeout': 0.2, 'max_lifetime': 1800, 'ping_after_idle': 30}
+    config.update(overrides)
+    return ConnectionPool(connect=connect, **config), opened
+
+
+def test_returned_connection_is_reused_and_reset():
+    pool, opened = make_pool()
+    connection = pool.getconn()
+    connection.in_transaction = True
+    pool.putconn(connection)
+
+    assert connection.rollbacks == 1
+    assert pool.getconn() is connection
+    assert len(opened) == 1
+
+
+def test_getconn_times_out_when_pool_is_exhausted():
+    pool, _ = make_pool(max_size=1, timeout=0.05)
+    pool.getconn()
+
+    with pytest.raises(PoolTimeoutError):
+        pool.getconn()
+    assert pool.stats()['timeouts'] == 1
+
+
+def test_waiting_caller_gets_connection_when_one_is_returned():
+    pool, opened = make_pool(max_size=1, timeout=2)
+    connection = pool.getconn()
+    timer = threading.Timer(0.05, pool.putconn, args=(connection,))
+    timer.start()
+
+    assert pool.getconn() is connection
+    assert len(opened) == 1
+    timer.join()
+
+
+def test_expired_connection_is_replaced_on_checkout():
+    pool, opened = make_pool()
+    connection = pool.getconn()
+    pool.putconn(connection)
+    pool.max_lifetime = -1
+
+    replacement = pool.getconn()
+    assert replacement is not connection
+    assert connection.closed
+    assert len(opened) == 2
+
+
+def test_connection_failing_health_check_is_evicted():
+    pool, opened = make_pool(ping_after_idle=0)
+    connection = pool.getconn()
+    pool.putconn(connection)
+    connection.broken = True
+
+    replacement = pool.getconn()
+    assert replacement is not connection
+    assert connection.closed
+    assert pool.stats()['failed_health_checks'] == 1
+
+
+def test_idle_connection_is_pinged_before_reuse():
+    pool, _ = make_pool(ping_after_idle=0)
+    connection = pool.getconn()
+    pool.putconn(connection)
+
+    assert pool.getconn() is connection
+    assert connection.pings == 1
+
+
+def test_stats_track_usage():
+    pool, _ = make_pool(max_size=3)
+    first, second = pool.getconn(), pool.getconn()
+    pool.putconn(first)
+    pool.putconn(second, discard=True)
+
+    stats = pool.stats()
+    assert stats['size'] == 1
+    assert stats['idle'] == 1
+    assert stats['in_use'] == 0
+    assert stats['checkouts'] == 2
+    assert stats['connections_opened'] == 2
+    assert stats['connections_closed'] == 1
+
+
+def test_closed_pool_refuses_checkouts():
+    pool, opened = make_pool()
+    pool.putconn(pool.getconn())
+    pool.close()
+
+    assert opened[0].closed
+    with pytest.raises(RuntimeError):
+        pool.getconn()
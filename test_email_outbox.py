@@ -0,0 +1,131 @@
+import os
+import socket
+import threading
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+for key, value in {
+    "MAIL_USERNAME": "test", "MAIL_PASSWORD": "test", "MAIL_FROM": "test@example.com",
+    "POSTGRES_HOST": "localhost", "POSTGRES_USER": "test",
+    "POSTGRES_PASSWORD": "test", "POSTGRES_DB": "test",
+}.items():
+    os.environ.setdefault(key, value)
+
+import pytest
+from utils import email_outbox
+
+
+class FakeSmtpServer:
+    """Minimal SMTP sink that records connections and delivered messages"""
+
+    def __init__(self, reject=()):
+        self.reject = set(reject)
+        self.connections = 0
+        self.messages = []
+        self._socket = socket.socket()
+        self._socket.bind(("127.0.0.1", 0))
+        self._socket.listen()
+        self.port = self._socket.getsockname()[1]
+        threading.Thread(target=self._serve, daemon=True).start()
+
+    def close(self):
+        self._socket.close()
+
+    def _serve(self):
+        while True:
+            try:
+                client, _ = self._socket.accept()
+            except OSError:
+                return
+            self.connections += 1
+            threading.Thread(target=self._handle, args=(client,), daemon=True).start()
+
+    def _handle(self, client):
+        stream = client.makefile("rwb")
+
+        def reply(line):
+            stream.write(line.encode() + b"\r\n")
+            stream.flush()
+
+        reply("220 fake smtp")
+        recipient, data = None, None
+        for raw in stream:
+            line = raw.decode().rstrip("\r\n")
+            if data is not None:
+                if line == ".":
+                    self.messages.append((recipient, "\n".join(data)))
+                    data = None
+                    reply("250 queued")
+                else:
+                    data.append(line)
+                continue
+            command = line[:4].upper()
+            if command in ("EHLO", "HELO"):
+                reply("250 fake")
+            elif command == "RCPT":
+                recipient = line.split(":", 1)[1].strip(" <>")
+                reply("550 rejected" if recipient in self.reject else "250 ok")
+            elif command == "DATA":
+                data = []
+                reply("354 go ahead")
+            elif command == "QUIT":
+                reply("221 bye")
+                break
+            else:
+                reply("250 ok")
+        client.close()
+
+
+@pytest.fixture
+def smtp_server():
+    server = FakeSmtpServer(reject={"bounce@example.com"})
+    yield server
+    server.close()
+
+
+def _session(server):
+    config = SimpleNamespace(
+        MAIL_SERVER="127.0.0.1", MAIL_PORT=server.port, MAIL_FROM_NAME="RailSathi",
+        MAIL_SSL_TLS=False, MAIL_STARTTLS=False, USE_CREDENTIALS=False,
+        VALIDATE_CERTS=False, TIMEOUT=5,
+    )
+    return email_outbox.SmtpSession(config=config)
+
+
+def _queued(message_id, to_email, attempts=1):
+    return {"id": message_id, "complain_id": 7, "subject": "Complaint received", "body": "body",
+            "from_email": "test@example.com", "to_email": to_email, "attempts": attempts,
+            "created_at": datetime.now(timezone.utc).isoformat()}
+
+
+def test_session_reuses_one_connection(smtp_server):
+    session = _session(smtp_server)
+    for i in range(5):
+        session.send("subject", "body", "test@example.com", f"user{i}@example.com")
+    session.close()
+
+    assert smtp_server.connections == 1
+    assert [to for to, _ in smtp_server.messages] == [f"user{i}@example.com" for i in range(5)]
+
+
+def test_worker_batch_marks_sent_and_schedules_retries(smtp_server, monkeypatch):
+    batch = [_queued(1, "a@example.com"), _queued(2, "bounce@example.com", attempts=2), _queued(3, "c@example.com")]
+    marked = {}
+    monkeypatch.setattr(email_outbox, "claim_batch", lambda limit: batch)
+    monkeypatch.setattr(email_outbox, "mark_sent", lambda ids: marked.setdefault("sent", ids))
+    monkeypatch.setattr(email_outbox, "mark_failed", lambda failures: marked.setdefault("failed", failures))
+
+    worker = email_outbox.EmailOutboxWorker(name="test-worker", batch_size=10, session=_session(smtp_server))
+    assert worker.process_batch() == 3
+    worker.session.close()
+
+    assert marked["sent"] == [1, 3]
+    assert [(message_id, attempts) for message_id, attempts, _ in marked["failed"]] == [(2, 2)]
+    assert smtp_server.connections == 1
+
+
+def test_retry_delay_backs_off_exponentially():
+    delays = [email_outbox.retry_delay(attempt) for attempt in range(1, 5)]
+    assert delays == sorted(delays)
+    assert delays[1] == 2 * delays[0]
+    assert email_outbox.retry_delay(100) == email_outbox.EMAIL_RETRY_MAX_DELAY
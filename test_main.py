@@ -0,0 +1,100 @@
+import os
+import asyncio
+
+for key, value in {
+    "MAIL_USERNAME": "test", "MAIL_PASSWORD": "test", "MAIL_FROM": "test@example.com",
+    "POSTGRES_HOST": "localhost", "POSTGRES_USER": "test",
+    "POSTGRES_PASSWORD": "test", "POSTGRES_DB": "test",
+}.items():
+    os.environ.setdefault(key, value)
+
+import httpx
+import main
+
+
+def _request(method, url, **kwargs):
+    async def send():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.request(method, url, **kwargs)
+    return asyncio.run(send())
+
+
+def test_operator_routes_require_admin_token(monkeypatch):
+    deleted = []
+
+    async def fake_bulk_delete(complain_ids, filters, returning):
+        deleted.append((complain_ids, filters))
+        return {"deleted": 2, "media_deleted": 0, "complain_ids": [1, 2]}
+
+    monkeypatch.setattr(main, "bulk_delete_complaints_async", fake_bulk_delete)
+    monkeypatch.setattr(main, "ADMIN_API_TOKEN", "")
+    selector = {"complain_status": "pending"}
+
+    assert _request("DELETE", "/rs_microservice/complaint/bulk/delete", json=selector).status_code == 403
+
+    monkeypatch.setattr(main, "ADMIN_API_TOKEN", "s3cret")
+    assert _request("DELETE", "/rs_microservice/complaint/bulk/delete", json=selector).status_code == 401
+    assert _request("PATCH", "/rs_microservice/complaint/bulk/update",
+                    json={**selector, "changes": {"complain_status": "closed"}},
+                    headers={"X-Admin-Token": "guess"}).status_code == 401
+    assert _request("POST", "/rs_microservice/admin/slow_queries/reset").status_code == 401
+    assert deleted == []
+
+    response = _request("DELETE", "/rs_microservice/complaint/bulk/delete", json=selector,
+                        headers={"X-Admin-Token": "s3cret"})
+    assert response.status_code == 200 and response.json()["deleted"] == 2
+    assert deleted == [(None, {"complain_status": "pending"})]
+
+
+def test_metrics_scrape_reports_route_latency_and_pool_gauges(monkeypatch):
+    import database
+    from utils import metrics
+
+    pool_stats = {"in_use": 1, "idle": 3, "waiting": 0, "max_size": 10, "checkouts": 42, "timeouts": 0}
+    monkeypatch.setattr(database, "get_pool_stats", lambda: pool_stats)
+    monkeypatch.setattr(database, "get_async_pool_stats", lambda: {})
+    metrics.register_pool_collector()
+    metrics.register_pool_collector()
+
+    assert _request("GET", "/rs_microservice").status_code == 200
+    body = _request("GET", "/metrics").text
+
+    assert 'rail_sathi_http_request_duration_seconds_count{method="GET",route="/rs_microservice"}' in body
+    assert 'rail_sathi_http_requests_total{method="GET",route="/rs_microservice",status="200"}' in body
+    assert 'rail_sathi_db_pool_connections{pool="sync",state="in_use"} 1.0' in body
+    assert 'rail_sathi_db_pool_max_size{pool="sync"} 10.0' in body
+    assert 'pool="async"' not in body
+
+
+def test_get_complaint_answers_304_when_the_etag_still_matches(monkeypatch):
+    versions = {7: "v1"}
+    loads = []
+
+    async def fake_version(complain_id):
+        return versions.get(complain_id)
+
+    async def fake_load(complain_id):
+        loads.append(complain_id)
+        return {"complain_id": complain_id, "complain_status": "pending", "version": versions[complain_id]}
+
+    monkeypatch.setattr(main, "get_complaint_version_async", fake_version)
+    monkeypatch.setattr(main, "get_complaint_by_id_async", fake_load)
+    url = "/rs_microservice/complaint/get/7"
+
+    first = _request("GET", url)
+    assert first.status_code == 200 and first.headers["ETag"] == '"v1"'
+    assert first.json()["data"] == {"complain_id": 7, "complain_status": "pending"}
+
+    revalidated = _request("GET", url, headers={"If-None-Match": first.headers["ETag"]})
+    assert revalidated.status_code == 304 and revalidated.content == b""
+    assert revalidated.headers["ETag"] == '"v1"' and revalidated.headers["Cache-Control"] == "no-cache"
+    assert loads == [7]
+
+    versions[7] = "v2"
+    changed = _request("GET", url, headers={"If-None-Match": '"v1"'})
+    assert changed.status_code == 200 and changed.headers["ETag"] == '"v2"'
+    assert loads == [7, 7]
+
+    missing = _request("GET", "/rs_microservice/complaint/get/8", headers={"If-None-Match": '"v1"'})
+    assert missing.status_code == 404
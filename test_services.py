@@ -0,0 +1,741 @@
+import os
+import asyncio
+import json
+from contextlib import contextmanager, asynccontextmanager
+from datetime import date, datetime
+
+import pytest
+
+for key, value in {
+    "MAIL_USERNAME": "test", "MAIL_PASSWORD": "test", "MAIL_FROM": "test@example.com",
+    "POSTGRES_HOST": "localhost", "POSTGRES_USER": "test",
+    "POSTGRES_PASSWORD": "test", "POSTGRES_DB": "test",
+}.items():
+    os.environ.setdefault(key, value)
+
+import services
+
+
+def _complaint(complain_id):
+    now = datetime(2025, 7, 13, 10, 0, 0)
+    return {"complain_id": complain_id, "mobile_number": "9898989898", "created_at": now, "updated_at": now}
+
+
+def _media(media_id, complain_id):
+    now = datetime(2025, 7, 13, 10, 0, 0)
+    return {"complain_id": complain_id, "id": media_id, "media_type": "image",
+            "media_url": f"https://example.com/{media_id}.jpg", "created_at": now,
+            "updated_at": now, "created_by": "harika", "updated_by": None}
+
+
+class FakeCursor:
+    def __init__(self, connection):
+        self.connection = connection
+        self.rows = []
+
+    def execute(self, query, params=None):
+        self.connection.queries.append((query, params))
+        self.rowcount = len(params[0]) if "rail_sathi_email_outbox" in query else 0
+        if "FROM rail_sathi_railsathicomplainmedia WHERE complain_id = ANY" in query:
+            complain_ids = params[0]
+            self.rows = [m for m in self.connection.media if m["complain_id"] in complain_ids]
+        elif "pg_stat_activity" in query:
+            self.rows = [self.connection.horizon]
+        else:
+            self.rows = self.connection.complaints
+
+    def fetchall(self):
+        return [dict(row) for row in self.rows]
+
+    def fetchone(self):
+        return dict(self.rows[0]) if self.rows else None
+
+
+class FakeConnection:
+    def __init__(self, complaints, media):
+        self.complaints = complaints
+        self.media = media
+        self.horizon = {"horizon": datetime(2025, 7, 13, 12, 0, 0), "lag_seconds": 2.5, "expired": False}
+        self.queries = []
+        self.transactions = 0
+
+    def cursor(self, *args, **kwargs):
+        return FakeCursor(self)
+
+    def commit(self):
+        pass
+
+
+class FakeAsyncCursor(FakeCursor):
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def execute(self, query, params=None):
+        FakeCursor.execute(self, query, params)
+
+    async def fetchall(self):
+        return FakeCursor.fetchall(self)
+
+    async def fetchone(self):
+        return FakeCursor.fetchone(self)
+
+
+class FakeAsyncConnection(FakeConnection):
+    def cursor(self, *args, **kwargs):
+        return FakeAsyncCursor(self)
+
+
+@pytest.fixture
+def db(monkeypatch):
+    """Hand out one fake connection from services.db_connection; returns it"""
+    connection = FakeConnection([], [])
+
+    @contextmanager
+    def fake_db_connection():
+        connection.transactions += 1
+        yield connection
+
+    monkeypatch.setattr(services, "db_connection", fake_db_connection)
+    return connection
+
+
+@pytest.fixture
+def async_db(monkeypatch):
+    """Call with a FakeAsyncConnection (or nothing) to serve it from services.async_db_connection"""
+    def serve(connection=None):
+        connection = connection or FakeAsyncConnection([], [])
+
+        @asynccontextmanager
+        async def fake_async_db_connection():
+            connection.transactions += 1
+            yield connection
+
+        monkeypatch.setattr(services, "async_db_connection", fake_async_db_connection)
+        return connection
+    return serve
+
+
+def test_get_complaints_by_date_loads_media_in_one_query(async_db):
+    complaints = [_complaint(i) for i in range(1, 31)]
+    media = [_media(100 + i, i) for i in range(1, 30)] + [_media(200, 1)]
+    connection = async_db(FakeAsyncConnection(complaints, media))
+    result = asyncio.run(services.get_complaints_by_date_async(date(2025, 7, 13), "9898989898"))
+
+    assert len(connection.queries) == 2
+    assert len(result) == 30
+    assert [m["id"] for m in result[0]["rail_sathi_complain_media_files"]] == [101, 200]
+    assert result[29]["rail_sathi_complain_media_files"] == []
+    assert all("complain_id" not in m for c in result for m in c["rail_sathi_complain_media_files"])
+
+
+def test_load_media_for_complaints_skips_query_when_empty():
+    connection = FakeAsyncConnection([], [])
+    assert asyncio.run(services.load_media_for_complaints_async(connection, [])) == []
+    assert connection.queries == []
+
+
+class ChunkedSource:
+    """File-like object that records the size of every read"""
+
+    def __init__(self, data):
+        self.data = data
+        self.reads = []
+
+    def read(self, size=-1):
+        assert size > 0, "stream_to_file must never read the whole upload at once"
+        self.reads.append(size)
+        chunk, self.data = self.data[:size], self.data[size:]
+        return chunk
+
+
+def test_stream_to_file_copies_in_chunks_and_hashes_what_it_wrote(tmp_path):
+    import hashlib
+    data = bytes(range(256)) * 40
+    source, hasher = ChunkedSource(data), hashlib.sha256()
+    path = tmp_path / "upload.bin"
+
+    assert services.stream_to_file(source, str(path), max_bytes=len(data), chunk_size=4096, hasher=hasher) == len(data)
+    assert path.read_bytes() == data
+    assert hasher.hexdigest() == hashlib.sha256(data).hexdigest()
+    # Three chunks of at most 4096 bytes, then the empty read that ends the copy
+    assert source.reads == [4096] * 4
+
+
+def test_stream_to_file_stops_at_the_size_cap_and_removes_the_partial_file(tmp_path):
+    source = ChunkedSource(b"x" * 10000)
+    path = tmp_path / "upload.bin"
+
+    with pytest.raises(services.UploadTooLargeError):
+        services.stream_to_file(source, str(path), max_bytes=5000, chunk_size=4096)
+    assert not path.exists()
+    # Reading stops at the chunk that crosses the cap; the rest of the upload is never read
+    assert source.reads == [4096, 4096] and len(source.data) == 10000 - 8192
+
+    exact = tmp_path / "exact.bin"
+    assert services.stream_to_file(ChunkedSource(b"y" * 5000), str(exact), max_bytes=5000, chunk_size=4096) == 5000
+    assert exact.stat().st_size == 5000
+
+
+def test_image_upload_stores_all_renditions_under_content_hash(tmp_path):
+    from PIL import Image
+    from utils.media_storage import MemoryStorage, set_storage
+
+    source = tmp_path / "photo.png"
+    Image.new("RGB", (3000, 2000), (200, 40, 40)).save(source)
+    storage = MemoryStorage()
+    set_storage(storage)
+    try:
+        urls = services.process_media_file_upload(str(source), "png", 7, "image", content_hash="ab" * 32)
+    finally:
+        set_storage(None)
+
+    keys = urls.pop("storage_keys")
+    assert sorted(urls) == ["media_url", "preview_url", "thumbnail_url"]
+    assert all(url.startswith("memory://") for url in urls.values())
+    assert sorted(keys) == sorted(storage.objects)
+    assert all(key.endswith("ab" * 32 + ".jpg") for key in keys)
+    assert storage.stats()["uploads"] == 3
+    assert {obj["content_type"] for obj in storage.objects.values()} == {"image/jpeg"}
+
+
+def test_transcode_rounds_odd_dimensions_to_even(monkeypatch, tmp_path):
+    import subprocess
+    from utils import video_transcoder
+
+    source = tmp_path / "clip.mp4"
+    subprocess.run([video_transcoder.FFMPEG_BINARY, "-loglevel", "error", "-f", "lavfi",
+                    "-i", "testsrc=size=853x481:rate=25", "-t", "1", "-c:v", "mpeg4", "-q:v", "1", str(source)],
+                   check=True)
+    monkeypatch.setattr(video_transcoder, "VIDEO_SKIP_BELOW_BYTES", 0)
+
+    result = video_transcoder.transcode_video(str(source), str(tmp_path))
+    assert result["skipped_reason"] is None and result["transcoded"]
+    assert result["poster_path"]
+
+
+def test_duplicate_upload_reuses_processed_object(monkeypatch, async_db, tmp_path):
+    import io
+    from starlette.datastructures import UploadFile, Headers
+
+    objects = {}
+    inserted, submitted, locked = [], [], []
+
+    async def fake_query(conn, query, params):
+        locked.append(params[0])
+        return [{"pg_advisory_xact_lock": None}]
+
+    async def fake_query_one(conn, query, params):
+        if query is services.CLAIM_MEDIA_OBJECT_QUERY:
+            content_hash = params[0]
+            created = content_hash not in objects
+            obj = objects.setdefault(content_hash, {"status": "processing", "media_url": None,
+                                                    "thumbnail_url": None, "preview_url": None})
+            if not created:
+                obj["status"], obj["media_url"] = "ready", "memory://existing.jpg"
+            return {**obj, "created": created}
+        inserted.append(params)
+        return {"id": len(inserted), "processing_status": params[8], "media_url": params[2]}
+
+    async_db()
+    monkeypatch.setattr(services, "MEDIA_SPOOL_DIR", str(tmp_path))
+    monkeypatch.setattr(services, "execute_query_async", fake_query)
+    monkeypatch.setattr(services, "execute_query_one_async", fake_query_one)
+    monkeypatch.setattr(services, "submit_media_job", lambda *args: submitted.append(args))
+
+    def upload():
+        return UploadFile(io.BytesIO(b"same photo bytes"), filename="photo.jpg",
+                          headers=Headers({"content-type": "image/jpeg"}))
+
+    first = asyncio.run(services.queue_media_uploads_async([upload()], 7, "harika"))
+    second = asyncio.run(services.queue_media_uploads_async([upload()], 8, "harika"))
+
+    assert len(submitted) == 1
+    assert first[0]["processing_status"] == "pending"
+    assert second[0] == {"id": 2, "processing_status": "done", "media_url": "memory://existing.jpg"}
+    assert inserted[0][-1] == inserted[1][-1] == submitted[0][-1]
+    assert locked == [[submitted[0][-1]], [submitted[0][-1]]]
+    assert [p.name for p in tmp_path.iterdir()] == [os.path.basename(submitted[0][1])]
+
+
+def test_collect_orphaned_media_keeps_files_of_recreated_objects(monkeypatch, db):
+    from utils.media_storage import MemoryStorage, set_storage
+    storage = MemoryStorage()
+    storage.objects = {key: {"data": b"x", "content_type": "image/jpeg"} for key in ("a/gone.jpg", "b/back.jpg")}
+    queries = []
+
+    def fake_query(conn, query, params):
+        queries.append(query)
+        return [{"content_hash": "b" * 64}] if params == (["b" * 64],) and query is existing else []
+
+    existing = services.EXISTING_MEDIA_OBJECTS_QUERY
+    monkeypatch.setattr(services, "execute_query", fake_query)
+    set_storage(storage)
+    try:
+        services.collect_orphaned_media([("a" * 64, ["a/gone.jpg"]), ("b" * 64, ["b/back.jpg"])])
+    finally:
+        set_storage(None)
+
+    assert sorted(storage.objects) == ["b/back.jpg"]
+    # Each hash is locked before it is checked, in its own transaction
+    assert queries == [services.MEDIA_OBJECT_LOCK_QUERY, existing] * 2
+    assert db.transactions == 2
+
+
+def test_held_media_jobs_get_heartbeats_until_they_finish(monkeypatch, db, tmp_path):
+    beats, ran = [], []
+
+    def fake_update(conn, query, params):
+        beats.append(sorted(params[0]))
+        return len(params[0])
+
+    monkeypatch.setattr(services, "execute_update", fake_update)
+    monkeypatch.setattr(services, "_heartbeat_thread", object())
+    monkeypatch.setattr(services.media_job_executor, "submit", lambda fn, *args: ran.append(args))
+    monkeypatch.setattr(services, "_set_media_job_state", lambda *args, **kwargs: None)
+    monkeypatch.setattr(services, "process_media_file_upload", lambda *args: None)
+
+    services.submit_media_job(41, str(tmp_path / "a.jpg"), 7, "image")
+    services.submit_media_job(42, str(tmp_path / "b.jpg"), 7, "image")
+    assert services.beat_media_jobs() == 2
+
+    services.run_media_job(*ran[0])
+    assert services.beat_media_jobs() == 1
+    assert beats == [[41, 42], [42]]
+    services.run_media_job(*ran[1])
+    assert services.beat_media_jobs() == 0 and len(beats) == 2
+
+
+def test_list_complaints_returns_cursor_for_next_page(async_db):
+    complaints = [_complaint(i) for i in range(20, 9, -1)]
+    connection = async_db(FakeAsyncConnection(complaints, [_media(101, 20)]))
+    page = asyncio.run(services.list_complaints_async({"complain_status": "pending", "depot": "BCT"}, limit=10))
+
+    # One extra row is fetched to learn whether another page exists, and is not returned
+    assert connection.queries[0][1] == ("pending", "BCT", 11)
+    assert len(connection.queries) == 2
+    assert [c["complain_id"] for c in page["data"]] == list(range(20, 10, -1))
+    assert [m["id"] for m in page["data"][0]["rail_sathi_complain_media_files"]] == [101]
+    assert page["has_more"] is True
+    assert services.decode_complaint_cursor(page["next_cursor"]) == (datetime(2025, 7, 13, 10, 0, 0), 11)
+
+    connection.queries.clear()
+    connection.complaints = complaints[-1:]
+    last = asyncio.run(services.list_complaints_async({}, cursor=page["next_cursor"], limit=10))
+    assert connection.queries[0][1] == (datetime(2025, 7, 13, 10, 0, 0), 11, 11)
+    assert [c["complain_id"] for c in last["data"]] == [10]
+    assert last["has_more"] is False and last["next_cursor"] is None
+
+
+def test_decode_complaint_cursor_rejects_garbage():
+    with pytest.raises(ValueError):
+        services.decode_complaint_cursor("not-a-cursor")
+
+
+def test_bulk_ingest_resolves_trains_once_and_reports_each_row(monkeypatch, db):
+    import io
+    body = b"\n".join([
+        b'{"name": "A", "mobile_number": "9000000001", "train_number": "12951", "complain_date": "2025-07-13"}',
+        b'not json',
+        b'{"name": "B", "train_id": "x"}',
+        b'{"name": "C", "train_id": 4, "berth_no": "12"}',
+    ])
+    train_lookups, inserted, digests = [], [], []
+    trains = {"by_id": {4: {"id": 4, "train_no": 12002, "train_name": "Shatabdi", "depot": "NDLS"}},
+              "by_no": {"12951": {"id": 9, "train_no": 12951, "train_name": "Rajdhani", "depot": "BCT"}}}
+
+    def fake_execute_query(conn, query, params):
+        assert query is services.BULK_COMPLAINT_INSERT_QUERY and len(params) == 14
+        inserted.append(params)
+        # Rows come back in an order unrelated to the input
+        return [{"row_position": i + 1, "complain_id": 500 + i} for i in reversed(range(len(params[0])))]
+
+    monkeypatch.setattr(services, "get_trains", lambda ids, nos: train_lookups.append((ids, nos)) or trains)
+    monkeypatch.setattr(services, "execute_query", fake_execute_query)
+    monkeypatch.setattr(services, "send_complaint_digest_emails", digests.append)
+
+    result = services.bulk_ingest_upload(io.BytesIO(body), "backlog.jsonl", "application/x-ndjson")
+
+    assert train_lookups == [([4], ["12951"])]
+    assert len(inserted) == 1 and inserted[0][2] == ["A", "C"] and inserted[0][12] == [None, 12]
+    assert (result["total"], result["created"], result["failed"]) == (4, 2, 2)
+    assert [(r["row"], r["status"], r["complain_id"]) for r in result["results"]] == [
+        (1, "created", 500), (2, "error", None), (3, "error", None), (4, "created", 501)]
+    assert result["results"][2]["error"] == "train_id must be an integer"
+    assert [c["train_depot"] for c in digests[0]] == ["BCT", "NDLS"]
+
+
+def test_bulk_ingest_reports_unknown_trains_per_row(monkeypatch, db):
+    inserted = []
+    trains = {"by_id": {4: {"id": 4, "train_no": 12002, "train_name": "Shatabdi", "depot": "NDLS"}}, "by_no": {}}
+
+    def fake_execute_query(conn, query, params):
+        inserted.append(params)
+        return [{"row_position": 1, "complain_id": 700}]
+
+    monkeypatch.setattr(services, "get_trains", lambda ids, nos: trains)
+    monkeypatch.setattr(services, "execute_query", fake_execute_query)
+
+    result = services.bulk_ingest_complaints(
+        [{"name": "A", "train_id": 99}, {"name": "B", "train_number": "00000"}, {"name": "C", "train_id": 4}],
+        notify=False
+    )
+
+    assert (result["created"], result["failed"]) == (1, 2)
+    assert [(r["status"], r["complain_id"], r["error"]) for r in result["results"]] == [
+        ("error", None, "unknown train"), ("error", None, "unknown train"), ("created", 700, None)]
+    assert len(inserted) == 1 and inserted[0][2] == ["C"] and inserted[0][8] == [4]
+
+
+def test_parse_bulk_complaints_reads_csv_header():
+    import io
+    rows = list(services.parse_bulk_complaints(io.BytesIO(b"name,coach\r\nA,B1\r\n"), "csv"))
+    assert rows == [{"name": "A", "coach": "B1"}]
+
+
+def test_bulk_update_runs_one_statement_for_the_selection(async_db):
+    from utils.complaint_cache import MemoryComplaintCache, set_complaint_cache
+    connection = async_db(FakeAsyncConnection([_complaint(3), _complaint(1)], []))
+    cache = MemoryComplaintCache(ttl=60, maxsize=10)
+    for complain_id in (1, 2, 3):
+        cache.set(complain_id, {"complain_id": complain_id})
+    set_complaint_cache(cache)
+    try:
+        result = asyncio.run(services.bulk_update_complaints_async(
+            None, {"train_number": "12951", "complain_status": "pending"}, {"complain_status": "closed"}
+        ))
+    finally:
+        set_complaint_cache(None)
+
+    assert len(connection.queries) == 1
+    assert connection.queries[0][1] == ("closed", "12951", "pending")
+    assert result == {"updated": 2, "complain_ids": [1, 3]}
+    # Only the updated complaints are dropped from the cache
+    assert cache.get(1) is None and cache.get(3) is None
+    assert cache.get(2) == {"complain_id": 2}
+
+    with pytest.raises(ValueError):
+        asyncio.run(services.bulk_update_complaints_async(None, {}, {"complain_status": "closed"}))
+    with pytest.raises(ValueError):
+        asyncio.run(services.bulk_delete_complaints_async([], {}))
+
+
+def test_writes_return_final_representation_in_one_round_trip(monkeypatch, async_db):
+    calls = []
+    responses = iter([
+        {**_complaint(5), "train_no": 12951, "rail_sathi_complain_media_files": []},
+        {**_complaint(5), "complain_status": "closed", "rail_sathi_complain_media_files": []},
+        {"found": 1, "deleted": 0, "orphaned": []},
+        {"found": 1, "deleted": 1, "orphaned": []},
+        {"found": 0, "deleted": 0, "orphaned": []},
+    ])
+
+    async def fake_query_one(conn, query, params):
+        calls.append((query, params))
+        return next(responses)
+
+    def delete(*args):
+        return asyncio.run(services.delete_complaint_async(*args))
+
+    async_db()
+    monkeypatch.setattr(services, "execute_query_one_async", fake_query_one)
+    monkeypatch.setattr(services, "_complaint_created_emails", lambda complaint, data: [])
+
+    created = asyncio.run(services.create_complaint_async({"name": "harika", "mobile_number": "9898989898"}))
+    updated = asyncio.run(services.update_complaint_async(5, {"complain_status": "closed"}))
+    # The insert and the update each return the joined train and media fields without a re-read
+    assert len(calls) == 2
+    assert created["train_no"] == 12951 and created["rail_sathi_complain_media_files"] == []
+    assert updated["complain_status"] == "closed" and updated["rail_sathi_complain_media_files"] == []
+    assert calls[1][1][-1] == 5
+
+    assert delete(5, "someone", "1") == (0, "Name or mobile number does not match")
+    assert delete(5, "harika", "9898989898") == (1, "Complaint deleted")
+    assert delete(6, "harika", "9898989898") == (0, "Complaint not found")
+    assert calls[3][1] == ("harika", "9898989898", 5)
+    assert len(calls) == 5
+
+
+def test_create_complaint_async_queues_emails_in_the_complaint_transaction(monkeypatch, async_db):
+    from utils.email_outbox import ENQUEUE_ARRAYS_QUERY
+    connection = async_db(FakeAsyncConnection(
+        [{"complain_id": 9, "train_no": 12951, "rail_sathi_complain_media_files": []}], []
+    ))
+
+    def fake_emails(complaint, data):
+        return [{"complain_id": complaint["complain_id"], "subject": "Complaint", "body": "body",
+                 "from_email": "railsathi@example.com", "to_email": email}
+                for email in ("war.room@example.com", "admin@example.com")]
+
+    monkeypatch.setattr(services, "_complaint_created_emails", fake_emails)
+
+    complaint = asyncio.run(services.create_complaint_async({"name": "harika", "mobile_number": "9898989898"}))
+    assert complaint["complain_id"] == 9
+    assert connection.transactions == 1
+    (insert, _), (enqueue, params) = connection.queries
+    assert insert is services.COMPLAINT_INSERT_QUERY and enqueue is ENQUEUE_ARRAYS_QUERY
+    assert params[0] == [9, 9]
+    assert params[4] == ["war.room@example.com", "admin@example.com"]
+
+
+def test_create_complaint_async_spools_uploads_before_creating_the_complaint(monkeypatch, async_db, tmp_path):
+    import io
+    from fastapi import HTTPException
+    from starlette.datastructures import UploadFile, Headers
+    executed, submitted = [], []
+    fail_on = []
+    connection = async_db()
+
+    async def fake_query(conn, query, params):
+        return []
+
+    async def fake_query_one(conn, query, params):
+        executed.append((connection.transactions, query))
+        if query in fail_on:
+            raise RuntimeError("connection lost")
+        if query is services.COMPLAINT_INSERT_QUERY:
+            return {"complain_id": 9, "rail_sathi_complain_media_files": []}
+        if query is services.CLAIM_MEDIA_OBJECT_QUERY:
+            return {"created": True, "status": "processing"}
+        return {"id": 41, "processing_status": params[8]}
+
+    monkeypatch.setattr(services, "MEDIA_SPOOL_DIR", str(tmp_path))
+    monkeypatch.setattr(services, "MEDIA_MAX_UPLOAD_BYTES", 16)
+    monkeypatch.setattr(services, "execute_query_async", fake_query)
+    monkeypatch.setattr(services, "execute_query_one_async", fake_query_one)
+    monkeypatch.setattr(services, "submit_media_job", lambda *args: submitted.append(args))
+    monkeypatch.setattr(services, "_complaint_created_emails", lambda complaint, data: [])
+
+    def create(body):
+        photo = UploadFile(io.BytesIO(body), filename="photo.jpg", headers=Headers({"content-type": "image/jpeg"}))
+        return asyncio.run(services.create_complaint_async({"name": "harika"}, [photo], "harika"))
+
+    with pytest.raises(HTTPException) as too_large:
+        create(b"x" * 17)
+    assert too_large.value.status_code == 413
+    assert connection.transactions == 0 and list(tmp_path.iterdir()) == []
+
+    fail_on.append(services.MEDIA_INSERT_QUERY)
+    with pytest.raises(RuntimeError):
+        create(b"photo")
+    assert list(tmp_path.iterdir()) == [] and submitted == []
+
+    fail_on.clear()
+    executed.clear()
+    complaint = create(b"photo")
+    assert complaint["rail_sathi_complain_media_files"] == [{"id": 41, "processing_status": "pending"}]
+    assert [query for _, query in executed] == [
+        services.COMPLAINT_INSERT_QUERY, services.CLAIM_MEDIA_OBJECT_QUERY, services.MEDIA_INSERT_QUERY]
+    assert {transaction for transaction, _ in executed} == {connection.transactions}
+    assert [(media_id, complain_id) for media_id, _, complain_id, *_ in submitted] == [(41, 9)]
+    assert [p.name for p in tmp_path.iterdir()] == [os.path.basename(submitted[0][1])]
+
+
+def test_complaint_reads_are_cached_until_the_complaint_changes(monkeypatch, async_db):
+    from utils.complaint_cache import MemoryComplaintCache, set_complaint_cache
+    cache = MemoryComplaintCache(ttl=60, maxsize=10)
+    set_complaint_cache(cache)
+    calls = []
+    complaint = {**_complaint(7), "complain_status": "pending", "rail_sathi_complain_media_files": []}
+
+    async def fake_query_one(conn, query, params):
+        calls.append(query)
+        if "UPDATE" in query:
+            complaint["complain_status"] = "closed"
+        return dict(complaint)
+
+    def read():
+        return asyncio.run(services.get_complaint_by_id_async(7))
+
+    async_db()
+    monkeypatch.setattr(services, "execute_query_one_async", fake_query_one)
+    try:
+        first = read()
+        first["complain_status"] = "mutated by caller"
+        assert read()["complain_status"] == "pending"
+        assert len(calls) == 1
+
+        asyncio.run(services.update_complaint_async(7, {"complain_status": "closed"}))
+        assert read()["complain_status"] == "closed"
+        assert len(calls) == 3
+
+        # A read that started before an invalidation must not cache its result
+        generation = cache.generation()
+        cache.invalidate([7])
+        cache.set(7, {"complain_id": 7}, generation)
+        assert cache.get(7) is None
+
+        stats = cache.stats()
+        assert stats["hits"] == 1 and stats["misses"] == 3 and stats["invalidations"] == 2
+    finally:
+        set_complaint_cache(None)
+
+
+def test_complaints_version_ignores_order_and_tracks_changes():
+    from utils.etag import make_etag, etag_matches
+    complaints = [{"complain_id": 1, "version": "a"}, {"complain_id": 2, "version": "b"}]
+    version = services.complaints_version(complaints)
+    assert services.complaints_version(list(reversed(complaints))) == version
+    assert services.complaints_version([complaints[0], {"complain_id": 2, "version": "c"}]) != version
+
+    etag = make_etag(version)
+    assert etag_matches(f'"other", W/{etag}', etag)
+    assert not etag_matches('"other"', etag)
+
+
+def test_change_feed_returns_tombstones_and_resumes_after_last_change(async_db):
+    changed = datetime(2025, 7, 13, 11, 0, 0)
+    rows = [
+        {"change_id": 4, "changed_at": changed, "deleted": False, **_complaint(4)},
+        {"change_id": 9, "changed_at": changed, "deleted": True, "complain_id": None},
+        {"change_id": 12, "changed_at": changed, "deleted": False, **_complaint(12)},
+    ]
+    connection = async_db(FakeAsyncConnection(rows, []))
+
+    def changes(scope, **kwargs):
+        return asyncio.run(services.get_complaint_changes_async(scope, **kwargs))
+
+    feed = changes({"mobile_number": "9898989898"}, limit=2)
+
+    assert [c["complain_id"] for c in feed["data"]] == [4]
+    assert feed["deleted"] == [{"complain_id": 9, "deleted_at": changed}]
+    assert feed["has_more"] is True and feed["horizon_lag_seconds"] == 2.5
+    assert services.decode_complaint_cursor(feed["next_cursor"]) == (changed, 9)
+    assert "backend_type = 'client backend'" in connection.queries[0][0]
+    # The page is read up to the horizon the first statement returned
+    assert connection.queries[1][1][:2] == ("9898989898", connection.horizon["horizon"])
+
+    connection.complaints = []
+    idle = changes({"mobile_number": "9898989898"}, since=feed["next_cursor"])
+    assert idle["next_cursor"] == feed["next_cursor"] and idle["data"] == []
+
+    with pytest.raises(ValueError):
+        changes({})
+    connection.horizon = {**connection.horizon, "expired": True}
+    with pytest.raises(services.ChangeFeedExpiredError):
+        changes({"mobile_number": "9898989898"}, since=feed["next_cursor"])
+
+
+def test_query_stats_normalize_and_rank_queries(monkeypatch):
+    from utils import query_stats
+    query_stats.reset_query_stats()
+    monkeypatch.setattr(query_stats, "SLOW_QUERY_THRESHOLD_MS", 100)
+    monkeypatch.setattr(query_stats, "SLOW_QUERY_EXPLAIN_SAMPLE_RATE", 0)
+
+    query_stats.record_query("SELECT * FROM t\n  WHERE a = %s AND b = 'x'", ("9898989898",), 0.25)
+    query_stats.record_query("SELECT * FROM t WHERE a = %s AND b = 'y'", ("9898989899",), 0.01)
+    query_stats.record_query("UPDATE t SET a = %s", ([1, 2, 3],), 0.05)
+
+    top = query_stats.get_top_queries(limit=1)
+    assert top[0]["query"] == "SELECT * FROM t WHERE a = %s AND b = ?"
+    assert top[0]["calls"] == 2 and top[0]["slow_calls"] == 1 and top[0]["max_ms"] == 250.0
+    assert query_stats.params_shape(([1, 2, 3], "x")) == "(list[3], str)"
+    assert query_stats.is_read_only("WITH x AS (SELECT 1) SELECT * FROM x")
+    assert not query_stats.is_read_only("WITH w AS (DELETE FROM t RETURNING *) SELECT * FROM w")
+    query_stats.reset_query_stats()
+
+
+def test_depot_tokens_split_on_separators_only():
+    from utils.recipient_index import _depot_tokens
+
+    assert _depot_tokens("BCT, ndls;MAS") == ["BCT", "NDLS", "MAS"]
+    assert _depot_tokens("New Delhi / Mumbai Central") == ["NEW DELHI", "MUMBAI CENTRAL"]
+    assert _depot_tokens(None) == []
+
+
+def test_war_room_users_match_whole_depot_tokens(monkeypatch):
+    from utils import recipient_index
+
+    role_users = [
+        {"id": 1, "email": "space@example.com", "depo": "BCT NDLS", "role_name": recipient_index.WAR_ROOM_ROLE},
+        {"id": 2, "email": "comma@example.com", "depo": "BCT,NDLS", "role_name": recipient_index.WAR_ROOM_ROLE},
+        {"id": 3, "email": "prefix@example.com", "depo": "BCTX", "role_name": recipient_index.WAR_ROOM_ROLE},
+    ]
+
+    @contextmanager
+    def fake_db_connection():
+        yield None
+
+    monkeypatch.setattr(recipient_index, "db_connection", fake_db_connection)
+    monkeypatch.setattr(recipient_index, "execute_query",
+                        lambda conn, query, params=None: [dict(user) for user in role_users] if params else [])
+    index = recipient_index.RecipientIndex(ttl=60)
+
+    def war_room_emails(train_depot):
+        return [user["email"] for user in index.resolve("12345", train_depot, None)["war_room"]]
+
+    # The old substring rule (train_depo in user_depo) mailed all three users for "BCT"
+    assert war_room_emails("BCT") == ["comma@example.com"]
+    assert war_room_emails("NDLS") == ["comma@example.com"]
+    assert war_room_emails("bct ndls") == ["space@example.com"]
+
+
+def test_query_stats_evict_least_recently_run_query(monkeypatch):
+    from utils import query_stats
+    query_stats.reset_query_stats()
+    monkeypatch.setattr(query_stats, "QUERY_STATS_MAX_ENTRIES", 2)
+
+    query_stats.record_query("SELECT 'a'", None, 5.0)
+    query_stats.record_query("SELECT a FROM b", None, 0.001)
+    query_stats.record_query("SELECT 'a'", None, 0.001)
+    query_stats.record_query("SELECT c FROM d", None, 0.001)
+
+    assert sorted(entry["query"] for entry in query_stats.get_top_queries()) == ["SELECT ?", "SELECT c FROM d"]
+    query_stats.reset_query_stats()
+
+
+def test_capture_plan_explains_psycopg3_query_with_array_params(monkeypatch):
+    from psycopg2.extensions import adapt
+    from utils import query_stats
+    import database
+
+    executed, plans = [], []
+
+    class ExplainCursor:
+        def execute(self, query, params=None):
+            # Render the way psycopg2 does client side, so psycopg3-style lists become ARRAY[...] literals
+            if params is not None:
+                query = query % tuple(adapt(value).getquoted().decode() for value in params)
+            executed.append(query)
+
+        def fetchall(self):
+            return [("Seq Scan on rail_sathi_railsathicomplainmedia",)]
+
+    class ExplainConnection:
+        rolled_back = False
+
+        def cursor(self):
+            return ExplainCursor()
+
+        def rollback(self):
+            self.rolled_back = True
+
+    connection = ExplainConnection()
+
+    @contextmanager
+    def fake_db_connection():
+        yield connection
+
+    class PlanLogger:
+        def info(self, line):
+            plans.append(line)
+
+    monkeypatch.setattr(database, "db_connection", fake_db_connection)
+    monkeypatch.setattr(query_stats, "_get_plan_logger", lambda: PlanLogger())
+    query = ("SELECT id FROM rail_sathi_railsathicomplainmedia "
+             "WHERE complain_id = ANY(%s) OR train_no = ANY(%s::integer[])")
+    params = ([3, 5], ["12345"])
+
+    query_stats._capture_plan(query, params, query_stats.normalize_query(query),
+                              query_stats.params_shape(params), 250.0)
+
+    assert executed[0].startswith("SET LOCAL statement_timeout")
+    assert executed[1] == ("EXPLAIN (ANALYZE, BUFFERS, FORMAT TEXT) SELECT id FROM rail_sathi_railsathicomplainmedia "
+                           "WHERE complain_id = ANY(ARRAY[3,5]) OR train_no = ANY(ARRAY['12345']::integer[])")
+    assert connection.rolled_back
+    plan = json.loads(plans[0])
+    assert plan["analyzed"] and plan["params_shape"] == "(list[2], list[1])"
+    assert plan["plan"] == ["Seq Scan on rail_sathi_railsathicomplainmedia"]
+    assert "12345" not in plans[0]
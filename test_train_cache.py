@@ -0,0 +1,73 @@
+import os
+from contextlib import contextmanager
+
+for key, value in {
+    "POSTGRES_HOST": "localhost", "POSTGRES_USER": "test",
+    "POSTGRES_PASSWORD": "test", "POSTGRES_DB": "test",
+}.items():
+    os.environ.setdefault(key, value)
+
+from utils import train_cache
+from utils.train_cache import TrainDetailsCache
+
+RAJDHANI = {"id": 9, "train_no": 12951, "train_name": "Rajdhani", "depot": "BCT"}
+SHATABDI = {"id": 4, "train_no": 12002, "train_name": "Shatabdi", "depot": "NDLS"}
+
+
+def _use_table(monkeypatch, rows):
+    """Point the module at a fresh cache and a fake table; returns the list of (query, params) run"""
+    queries = []
+
+    @contextmanager
+    def fake_db_connection():
+        yield None
+
+    def fake_execute_query(conn, query, params):
+        queries.append((query, params))
+        return [dict(row) for row in rows]
+
+    monkeypatch.setattr(train_cache, "train_cache", TrainDetailsCache(maxsize=10, ttl=60))
+    monkeypatch.setattr(train_cache, "db_connection", fake_db_connection)
+    monkeypatch.setattr(train_cache, "execute_query", fake_execute_query)
+    return queries
+
+
+def test_entries_expire_after_ttl():
+    now = [1000.0]
+    cache = TrainDetailsCache(maxsize=10, ttl=60, timer=lambda: now[0])
+    cache.put(RAJDHANI)
+
+    now[0] += 59
+    assert cache.get_by_id(9) == RAJDHANI and cache.get_by_no(" 12951 ") == RAJDHANI
+    now[0] += 2
+    assert cache.get_by_id(9) is None and cache.get_by_no("12951") is None
+    assert cache.stats()["hits"] == 2 and cache.stats()["misses"] == 2
+
+
+def test_get_trains_loads_misses_once_and_skips_non_numeric_numbers(monkeypatch):
+    queries = _use_table(monkeypatch, [RAJDHANI, SHATABDI])
+
+    trains = train_cache.get_trains(["4"], ["12951", "12951 ", "AB12"])
+    assert trains == {"by_id": {4: SHATABDI}, "by_no": {"12951": RAJDHANI}}
+    # "AB12" cannot match the integer train_no column, so it is never sent
+    assert queries == [(train_cache.TRAINS_BY_IDS_OR_NOS_QUERY, ([4], [12951]))]
+
+    assert train_cache.get_trains([4, 9], ["12002"]) == {
+        "by_id": {4: SHATABDI, 9: RAJDHANI}, "by_no": {"12002": SHATABDI}}
+    assert len(queries) == 1
+
+
+def test_invalidate_and_reload(monkeypatch):
+    queries = _use_table(monkeypatch, [RAJDHANI, SHATABDI])
+
+    assert train_cache.warm_up_train_cache() == 2
+    assert train_cache.get_train_cache_stats()["size"] == 2
+
+    train_cache.invalidate_train_cache()
+    assert train_cache.get_train_cache_stats()["size"] == 0
+    assert train_cache.train_cache.get_by_no("12951") is None
+
+    assert train_cache.reload_train_cache() == 2
+    assert train_cache.train_cache.get_by_id(4) == SHATABDI
+    assert [query for query, _ in queries] == [train_cache.ALL_TRAINS_QUERY] * 2
+    assert train_cache.get_train_cache_stats()["last_warm_up"] is not None
@@ -0,0 +1,312 @@
+import os
+import asyncio
+import logging
+import threading
+from typing import Dict, Iterable, Optional, Any
+import orjson
+from cachetools import TTLCache
+from utils.json_response import _default
+
+logger = logging.getLogger(__name__)
+
+COMPLAINT_CACHE_BACKEND = os.getenv('COMPLAINT_CACHE_BACKEND', 'memory').lower()
+COMPLAINT_CACHE_TTL = int(os.getenv('COMPLAINT_CACHE_TTL', 60))
+COMPLAINT_CACHE_MAX_SIZE = int(os.getenv('COMPLAINT_CACHE_MAX_SIZE', 10000))
+COMPLAINT_CACHE_REDIS_URL = os.getenv('COMPLAINT_CACHE_REDIS_URL', 'redis://localhost:6379/0')
+COMPLAINT_CACHE_KEY_PREFIX = os.getenv('COMPLAINT_CACHE_KEY_PREFIX', 'rail_sathi:complaint:')
+
+
+class ComplaintCache:
+    """
+    Cache of full complaint representations keyed by complain_id.
+
+    Values are stored as orjson-encoded bytes, so every get returns a fresh
+    copy that callers may modify. Backends fail open: an error counts as a
+    miss and the caller reads from the database.
+
+    A read-through caller takes generation() before querying and passes it
+    to set(); the entry is then dropped if any invalidation ran in between,
+    so a slow read does not re-cache a complaint that was just changed. This
+    only covers invalidations the backend can see: the redis backend keeps
+    the generation on the server, shared by every process, but the memory
+    backend's generation and entries belong to one process. With several
+    workers on the memory backend, a change made in one worker does not
+    reach the others, which serve the old copy (and 304s for its ETag)
+    until it expires after ttl seconds.
+
+    Async code uses the *_async methods, which run the calls of a blocking
+    (network) backend in a worker thread instead of on the event loop.
+    """
+
+    name = 'base'
+    blocking = False
+
+    def __init__(self, ttl: int = COMPLAINT_CACHE_TTL):
+        self.ttl = ttl
+        self._stats_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.sets = 0
+        self.invalidations = 0
+        self.errors = 0
+        self._generation = 0
+
+    def generation(self) -> int:
+        """Invalidation counter to pass to set(); -1 (never current) if it cannot be read"""
+        try:
+            return self._get_generation()
+        except Exception as e:
+            logger.warning(f"Complaint cache generation read failed: {e}")
+            self._count('errors')
+            return -1
+
+    def get(self, complain_id) -> Optional[Dict]:
+        try:
+            raw = self._get(int(complain_id))
+        except Exception as e:
+            logger.warning(f"Complaint cache get failed: {e}")
+            raw = None
+            self._count('errors')
+        self._count('hits' if raw is not None else 'misses')
+        return orjson.loads(raw) if raw is not None else None
+
+    def set(self, complain_id, complaint: Dict, generation: Optional[int] = None):
+        if not complaint:
+            return
+        value = orjson.dumps(complaint, default=_default)
+        if generation is not None and generation != self.generation():
+            return
+        try:
+            self._set(int(complain_id), value)
+            if generation is not None and generation != self.generation():
+                # Invalidated while storing; the invalidation may have run first
+                self._delete({int(complain_id)})
+                return
+            self._count('sets')
+        except Exception as e:
+            logger.warning(f"Complaint cache set failed: {e}")
+            self._count('errors')
+
+    def invalidate(self, complain_ids: Iterable):
+        keys = {int(complain_id) for complain_id in complain_ids if complain_id is not None}
+        if not keys:
+            return
+        try:
+            self._bump_generation()
+            self._delete(keys)
+            self._count('invalidations', len(keys))
+        except Exception as e:
+            logger.warning(f"Complaint cache invalidation failed: {e}")
+            self._count('errors')
+
+    def clear(self):
+        self._bump_generation()
+        self._clear()
+
+    async def generation_async(self) -> int:
+        return await self._run(self.generation)
+
+    async def get_async(self, complain_id) -> Optional[Dict]:
+        return await self._run(self.get, complain_id)
+
+    async def set_async(self, complain_id, complaint: Dict, generation: Optional[int] = None):
+        await self._run(self.set, complain_id, complaint, generation)
+
+    async def invalidate_async(self, complain_ids: Iterable):
+        await self._run(self.invalidate, list(complain_ids))
+
+    async def clear_async(self):
+        await self._run(self.clear)
+
+    async def _run(self, method, *args):
+        if self.blocking:
+            return await asyncio.to_thread(method, *args)
+        return method(*args)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            lookups = self.hits + self.misses
+            return {
+                'backend': self.name,
+                'ttl_seconds': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'sets': self.sets,
+                'invalidations': self.invalidations,
+                'errors': self.errors,
+                **self._backend_stats()
+            }
+
+    def _count(self, counter: str, amount: int = 1):
+        with self._stats_lock:
+            setattr(self, counter, getattr(self, counter) + amount)
+
+    def _backend_stats(self) -> Dict[str, Any]:
+        return {}
+
+    def _get_generation(self) -> int:
+        return self._generation
+
+    def _bump_generation(self):
+        with self._stats_lock:
+            self._generation += 1
+
+    def _get(self, key: int) -> Optional[bytes]:
+        raise NotImplementedError
+
+    def _set(self, key: int, value: bytes):
+        raise NotImplementedError
+
+    def _delete(self, keys):
+        raise NotImplementedError
+
+    def _clear(self):
+        raise NotImplementedError
+
+
+class MemoryComplaintCache(ComplaintCache):
+    """Per-process cache with TTL expiry and LRU eviction at maxsize"""
+
+    name = 'memory'
+
+    def __init__(self, ttl: int = COMPLAINT_CACHE_TTL, maxsize: int = COMPLAINT_CACHE_MAX_SIZE):
+        super().__init__(ttl)
+        self.maxsize = maxsize
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._lock = threading.Lock()
+
+    def _get(self, key):
+        with self._lock:
+            return self._cache.get(key)
+
+    def _set(self, key, value):
+        with self._lock:
+            self._cache[key] = value
+
+    def _delete(self, keys):
+        with self._lock:
+            for key in keys:
+                self._cache.pop(key, None)
+
+    def _clear(self):
+        with self._lock:
+            self._cache.clear()
+
+    def _backend_stats(self):
+        with self._lock:
+            return {'size': len(self._cache), 'max_size': self.maxsize}
+
+
+class RedisComplaintCache(ComplaintCache):
+    """
+    Cache shared by all processes in a Redis-compatible server.
+
+    Entries expire after ttl seconds; the size bound is the server's
+    maxmemory with an allkeys-lru eviction policy. The invalidation
+    generation is a counter key next to the entries (outside their prefix,
+    so clear() keeps it). client replaces the connection made from url,
+    e.g. with a fakeredis stand-in.
+    """
+
+    name = 'redis'
+    blocking = True
+
+    def __init__(self, url: str = COMPLAINT_CACHE_REDIS_URL, ttl: int = COMPLAINT_CACHE_TTL,
+                 prefix: str = COMPLAINT_CACHE_KEY_PREFIX, client=None):
+        super().__init__(ttl)
+        self.prefix = prefix
+        self.generation_key = f"{prefix.rstrip(':')}_generation"
+        if client is None:
+            import redis
+            client = redis.Redis.from_url(url, socket_timeout=0.5, socket_connect_timeout=0.5)
+        self._client = client
+
+    def _key(self, key: int) -> str:
+        return f"{self.prefix}{key}"
+
+    def _get(self, key):
+        return self._client.get(self._key(key))
+
+    def _set(self, key, value):
+        self._client.set(self._key(key), value, ex=self.ttl)
+
+    def _delete(self, keys):
+        self._client.delete(*[self._key(key) for key in keys])
+
+    def _get_generation(self):
+        return int(self._client.get(self.generation_key) or 0)
+
+    def _bump_generation(self):
+        self._client.incr(self.generation_key)
+
+    def _clear(self):
+        keys = list(self._client.scan_iter(match=f"{self.prefix}*", count=1000))
+        if keys:
+            self._client.delete(*keys)
+
+
+class NullComplaintCache(ComplaintCache):
+    """Caching disabled; every lookup is a miss"""
+
+    name = 'none'
+
+    def _get(self, key):
+        return None
+
+    def _set(self, key, value):
+        pass
+
+    def _delete(self, keys):
+        pass
+
+    def _clear(self):
+        pass
+
+
+_cache: Optional[ComplaintCache] = None
+_cache_lock = threading.Lock()
+
+
+def _create_cache() -> ComplaintCache:
+    if COMPLAINT_CACHE_BACKEND == 'redis':
+        return RedisComplaintCache()
+    if COMPLAINT_CACHE_BACKEND == 'fakeredis':
+        # In-process Redis stand-in for development and tests; not shared between workers
+        import fakeredis
+        return RedisComplaintCache(client=fakeredis.FakeRedis())
+    if COMPLAINT_CACHE_BACKEND == 'none':
+        return NullComplaintCache()
+    return MemoryComplaintCache()
+
+
+def get_complaint_cache() -> ComplaintCache:
+    """Return the process-wide complaint cache selected by COMPLAINT_CACHE_BACKEND"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = _create_cache()
+                logger.info(f"Complaint cache backend: {_cache.name}")
+    return _cache
+
+
+def set_complaint_cache(cache: Optional[ComplaintCache]):
+    """Replace the process-wide cache (None resets to the configured one)"""
+    global _cache
+    with _cache_lock:
+        _cache = cache
+
+
+def invalidate_complaints(complain_ids: Iterable):
+    """Drop the cached representation of each complaint"""
+    get_complaint_cache().invalidate(complain_ids)
+
+
+async def invalidate_complaints_async(complain_ids: Iterable):
+    """invalidate_complaints for async code; does not block the event loop"""
+    await get_complaint_cache().invalidate_async(complain_ids)
+
+
+def get_complaint_cache_stats() -> Dict[str, Any]:
+    return get_complaint_cache().stats()
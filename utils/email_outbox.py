@@ -0,0 +1,368 @@
+import os
+import ssl
+import time
+import smtplib
+import logging
+import threading
+from datetime import datetime
+from email.message import EmailMessage
+from email.utils import formataddr
+from typing import Dict, List, Optional, Any
+from psycopg2.extras import execute_values
+from database import db_connection, execute_query, execute_update_async
+from mail_config import conf
+from utils.metrics import smtp_send_duration
+
+logger = logging.getLogger(__name__)
+
+EMAIL_WORKERS = int(os.getenv('EMAIL_WORKERS', 2))
+EMAIL_BATCH_SIZE = int(os.getenv('EMAIL_BATCH_SIZE', 20))
+EMAIL_POLL_INTERVAL = float(os.getenv('EMAIL_POLL_INTERVAL', 5))
+EMAIL_MAX_ATTEMPTS = int(os.getenv('EMAIL_MAX_ATTEMPTS', 6))
+EMAIL_RETRY_BASE_DELAY = int(os.getenv('EMAIL_RETRY_BASE_DELAY', 30))
+EMAIL_RETRY_MAX_DELAY = int(os.getenv('EMAIL_RETRY_MAX_DELAY', 3600))
+EMAIL_LOCK_TIMEOUT = int(os.getenv('EMAIL_LOCK_TIMEOUT', 600))
+SMTP_IDLE_TIMEOUT = float(os.getenv('SMTP_IDLE_TIMEOUT', 60))
+
+ENQUEUE_QUERY = """
+    INSERT INTO rail_sathi_email_outbox (complain_id, subject, body, from_email, to_email)
+    VALUES %s
+"""
+
+# Same insert for async connections, one array parameter per column
+ENQUEUE_ARRAYS_QUERY = """
+    INSERT INTO rail_sathi_email_outbox (complain_id, subject, body, from_email, to_email)
+    SELECT * FROM unnest(%s::integer[], %s::text[], %s::text[], %s::text[], %s::text[])
+"""
+
+# Claims due messages plus any left in 'sending' by a worker that died
+CLAIM_QUERY = """
+    UPDATE rail_sathi_email_outbox
+    SET status = 'sending', locked_at = now(), attempts = attempts + 1
+    WHERE id IN (
+        SELECT id FROM rail_sathi_email_outbox
+        WHERE (status = 'pending' AND next_attempt_at <= now())
+           OR (status = 'sending' AND locked_at < now() - %s * interval '1 second')
+        ORDER BY next_attempt_at
+        LIMIT %s
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING id, complain_id, subject, body, from_email, to_email, attempts, created_at
+"""
+
+MARK_SENT_QUERY = """
+    UPDATE rail_sathi_email_outbox
+    SET status = 'sent', sent_at = now(), locked_at = NULL, last_error = NULL
+    WHERE id = ANY(%s)
+"""
+
+MARK_FAILED_QUERY = """
+    UPDATE rail_sathi_email_outbox AS o
+    SET status = CASE WHEN v.give_up THEN 'failed' ELSE 'pending' END,
+        next_attempt_at = now() + v.delay * interval '1 second',
+        locked_at = NULL,
+        last_error = v.error
+    FROM (VALUES %s) AS v(id, delay, error, give_up)
+    WHERE o.id = v.id
+"""
+
+QUEUE_DEPTH_QUERY = """
+    SELECT status, count(*) AS count, min(created_at) AS oldest
+    FROM rail_sathi_email_outbox
+    WHERE status IN ('pending', 'sending', 'failed')
+    GROUP BY status
+"""
+
+
+def retry_delay(attempts: int) -> int:
+    """Exponential backoff in seconds for a message that failed attempts times"""
+    return min(EMAIL_RETRY_BASE_DELAY * (2 ** max(attempts - 1, 0)), EMAIL_RETRY_MAX_DELAY)
+
+
+class SmtpSession:
+    """
+    A reusable SMTP connection.
+
+    The connection is opened lazily, kept open between messages and
+    re-established once if the server dropped it.
+    """
+
+    def __init__(self, config=conf, idle_timeout: float = SMTP_IDLE_TIMEOUT):
+        self.config = config
+        self.idle_timeout = idle_timeout
+        self.connections_opened = 0
+        self._smtp = None
+        self._last_used = 0.0
+
+    def send(self, subject: str, body: str, from_: str, to: str):
+        message = EmailMessage()
+        message['Subject'] = subject
+        message['From'] = formataddr((self.config.MAIL_FROM_NAME, from_)) if self.config.MAIL_FROM_NAME else from_
+        message['To'] = to
+        message.set_content(body)
+
+        if self._smtp is not None and time.monotonic() - self._last_used > self.idle_timeout:
+            self.close()
+        started = time.perf_counter()
+        result = 'error'
+        try:
+            try:
+                self._connection().send_message(message)
+            except smtplib.SMTPServerDisconnected:
+                self.close()
+                self._connection().send_message(message)
+            result = 'ok'
+        finally:
+            smtp_send_duration.labels(result).observe(time.perf_counter() - started)
+        self._last_used = time.monotonic()
+
+    def close(self):
+        if self._smtp is None:
+            return
+        try:
+            self._smtp.quit()
+        except Exception:
+            try:
+                self._smtp.close()
+            except Exception:
+                pass
+        self._smtp = None
+
+    def _connection(self):
+        if self._smtp is not None:
+            return self._smtp
+        context = ssl.create_default_context()
+        if not self.config.VALIDATE_CERTS:
+            context.check_hostname = False
+            context.verify_mode = ssl.CERT_NONE
+        timeout = getattr(self.config, 'TIMEOUT', 60)
+        if self.config.MAIL_SSL_TLS:
+            smtp = smtplib.SMTP_SSL(self.config.MAIL_SERVER, self.config.MAIL_PORT, timeout=timeout, context=context)
+        else:
+            smtp = smtplib.SMTP(self.config.MAIL_SERVER, self.config.MAIL_PORT, timeout=timeout)
+            if self.config.MAIL_STARTTLS:
+                smtp.starttls(context=context)
+        if self.config.USE_CREDENTIALS:
+            smtp.login(self.config.MAIL_USERNAME, self.config.MAIL_PASSWORD.get_secret_value())
+        self._smtp = smtp
+        self.connections_opened += 1
+        return smtp
+
+
+class OutboxMetrics:
+    """In-process counters for messages delivered by this process"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.sent = 0
+        self.failed_attempts = 0
+        self.batches = 0
+        self.smtp_connections = 0
+        self.send_time_total = 0.0
+        self.delivery_latency_total = 0.0
+        self.delivery_latency_max = 0.0
+
+    def record_batch(self, sent: int, failed: int, send_time: float, latencies: List[float], connections: int):
+        with self._lock:
+            self.batches += 1
+            self.sent += sent
+            self.failed_attempts += failed
+            self.send_time_total += send_time
+            self.smtp_connections += connections
+            for latency in latencies:
+                self.delivery_latency_total += latency
+                self.delivery_latency_max = max(self.delivery_latency_max, latency)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            attempts = self.sent + self.failed_attempts
+            return {
+                'sent': self.sent,
+                'failed_attempts': self.failed_attempts,
+                'batches': self.batches,
+                'smtp_connections_opened': self.smtp_connections,
+                'send_time_avg_ms': round(self.send_time_total / attempts * 1000, 3) if attempts else 0.0,
+                'delivery_latency_avg_s': round(self.delivery_latency_total / self.sent, 3) if self.sent else 0.0,
+                'delivery_latency_max_s': round(self.delivery_latency_max, 3)
+            }
+
+
+metrics = OutboxMetrics()
+_wakeup = threading.Event()
+
+
+def _outbox_rows(messages: List[Dict]) -> List[tuple]:
+    return [
+        (m.get('complain_id'), m['subject'], m['body'], m['from_email'], m['to_email'])
+        for m in messages
+    ]
+
+
+def wake_outbox():
+    """Wake idle outbox workers; call after committing messages queued with conn"""
+    _wakeup.set()
+
+
+def enqueue_emails(messages: List[Dict], conn=None) -> int:
+    """
+    Queue emails in the outbox and return how many were queued.
+
+    Each message is a dict with subject, body, from_email, to_email and an
+    optional complain_id. Pass conn to enqueue inside the caller's
+    transaction and call wake_outbox() once it commits; otherwise the insert
+    is committed on its own connection.
+    """
+    if not messages:
+        return 0
+    rows = _outbox_rows(messages)
+    if conn is not None:
+        execute_values(conn.cursor(), ENQUEUE_QUERY, rows)
+    else:
+        with db_connection() as own_conn:
+            execute_values(own_conn.cursor(), ENQUEUE_QUERY, rows)
+            own_conn.commit()
+        wake_outbox()
+    return len(rows)
+
+
+async def enqueue_emails_async(messages: List[Dict], conn) -> int:
+    """Queue emails inside the caller's transaction on an async connection"""
+    if not messages:
+        return 0
+    rows = _outbox_rows(messages)
+    await execute_update_async(conn, ENQUEUE_ARRAYS_QUERY, tuple(map(list, zip(*rows))))
+    return len(rows)
+
+
+def claim_batch(limit: int) -> List[Dict]:
+    with db_connection() as conn:
+        rows = execute_query(conn, CLAIM_QUERY, (EMAIL_LOCK_TIMEOUT, limit))
+        conn.commit()
+    return rows
+
+
+def mark_sent(ids: List[int]):
+    if not ids:
+        return
+    with db_connection() as conn:
+        conn.cursor().execute(MARK_SENT_QUERY, (ids,))
+        conn.commit()
+
+
+def mark_failed(failures: List[tuple]):
+    """failures: (id, attempts, error) tuples"""
+    if not failures:
+        return
+    values = [
+        (message_id, retry_delay(attempts), error[:1000], attempts >= EMAIL_MAX_ATTEMPTS)
+        for message_id, attempts, error in failures
+    ]
+    with db_connection() as conn:
+        execute_values(conn.cursor(), MARK_FAILED_QUERY, values,
+                       template="(%s::bigint, %s::integer, %s::text, %s::boolean)")
+        conn.commit()
+
+
+def get_outbox_stats() -> Dict[str, Any]:
+    """Return queue depth from the outbox table plus this process's delivery metrics"""
+    queue = {'pending': 0, 'sending': 0, 'failed': 0}
+    oldest_pending = None
+    try:
+        with db_connection() as conn:
+            for row in execute_query(conn, QUEUE_DEPTH_QUERY):
+                queue[row['status']] = row['count']
+                if row['status'] == 'pending':
+                    oldest_pending = row['oldest']
+    except Exception as e:
+        logger.error(f"Failed to read outbox queue depth: {e}")
+    return {
+        'queue': queue,
+        'oldest_pending': oldest_pending,
+        'workers': len(_workers),
+        **metrics.snapshot()
+    }
+
+
+class EmailOutboxWorker(threading.Thread):
+    """Drains the outbox in batches over a single long-lived SMTP session"""
+
+    def __init__(self, name: str, batch_size: int = EMAIL_BATCH_SIZE, poll_interval: float = EMAIL_POLL_INTERVAL,
+                 session: Optional[SmtpSession] = None):
+        super().__init__(name=name, daemon=True)
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.session = session or SmtpSession()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        logger.info(f"{self.name} started")
+        while not self._stop_event.is_set():
+            try:
+                processed = self.process_batch()
+            except Exception as e:
+                logger.error(f"{self.name} batch failed: {e}")
+                processed = 0
+            if processed < self.batch_size:
+                if processed == 0:
+                    self.session.close()
+                _wakeup.wait(self.poll_interval)
+                _wakeup.clear()
+        self.session.close()
+        logger.info(f"{self.name} stopped")
+
+    def stop(self):
+        self._stop_event.set()
+        _wakeup.set()
+
+    def process_batch(self) -> int:
+        batch = claim_batch(self.batch_size)
+        if not batch:
+            return 0
+        connections_before = self.session.connections_opened
+        sent_ids, failures, latencies = [], [], []
+        started = time.monotonic()
+        for message in batch:
+            try:
+                self.session.send(message['subject'], message['body'], message['from_email'], message['to_email'])
+                sent_ids.append(message['id'])
+                latencies.append(time.time() - _timestamp(message['created_at']))
+            except Exception as e:
+                logger.error(f"Failed to send outbox message {message['id']} to {message['to_email']}: {e}")
+                failures.append((message['id'], message['attempts'], repr(e)))
+                if not isinstance(e, smtplib.SMTPRecipientsRefused):
+                    self.session.close()
+        send_time = time.monotonic() - started
+        mark_sent(sent_ids)
+        mark_failed(failures)
+        metrics.record_batch(len(sent_ids), len(failures), send_time, latencies,
+                             self.session.connections_opened - connections_before)
+        logger.info(f"{self.name} sent {len(sent_ids)}/{len(batch)} queued emails")
+        return len(batch)
+
+
+def _timestamp(value) -> float:
+    if isinstance(value, datetime):
+        return value.timestamp()
+    return datetime.fromisoformat(str(value)).timestamp()
+
+
+_workers: List[EmailOutboxWorker] = []
+
+
+def start_outbox_workers(count: int = EMAIL_WORKERS):
+    """Start the outbox sender threads for this process"""
+    if _workers:
+        return
+    for i in range(count):
+        worker = EmailOutboxWorker(name=f"email-outbox-{i}")
+        worker.start()
+        _workers.append(worker)
+
+
+def stop_outbox_workers(timeout: float = 10):
+    """Stop the outbox sender threads and close their SMTP sessions"""
+    for worker in _workers:
+        worker.stop()
+    for worker in _workers:
+        worker.join(timeout)
+    _workers.clear()
@@ -1,16 +1,20 @@
 import logging
-import asyncio
-from fastapi_mail import FastMail, MessageSchema
+import threading
 from mail_config import conf
 from jinja2 import Template
-from typing import Dict, List
+from typing import Dict, List, Optional
 import os
-from database import get_db_connection, execute_query  # Fixed import
-from datetime import datetime
+from database import db_connection, execute_query
+from utils.recipient_index import resolve_complaint_recipients
+from utils.email_outbox import SmtpSession, enqueue_emails
+from datetime import date, datetime
 import pytz
 
 EMAIL_SENDER = conf.MAIL_FROM
 
+_direct_session = SmtpSession()
+_direct_session_lock = threading.Lock()
+
 def send_plain_mail(subject: str, message: str, from_: str, to: List[str]):
     """Send plain text email"""
     try:
@@ -21,22 +25,10 @@ def send_plain_mail(subject: str, message: str, from_: str, to: List[str]):
             logging.info("All emails were skipped - no valid recipients.")
             return True
 
-        # Create email message
-        email = MessageSchema(
-            subject=subject,
-            recipients=valid_emails,  # This should be a list, not a string
-            body=message,
-            subtype="plain"
-        )
-
-        # Send email using FastMail
-        fm = FastMail(conf)
-        
-        # Use asyncio to run the async send_message method
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        loop.run_until_complete(fm.send_message(email))
-        loop.close()
+        # Reuse one SMTP session across calls instead of a new loop and connection per email
+        with _direct_session_lock:
+            for email in valid_emails:
+                _direct_session.send(subject, message, from_, email)
         
         logging.info(f"Email sent successfully to: {', '.join(valid_emails)}")
         return True
@@ -46,8 +38,20 @@ def send_plain_mail(subject: str, message: str, from_: str, to: List[str]):
         return False
 
 
-def send_passenger_complain_email(complain_details: Dict):
-    """Send complaint email to war room users"""
+def _complaint_date(created_at) -> Optional[date]:
+    """Date of a complaint's created_at, given as a datetime or an ISO string"""
+    if isinstance(created_at, datetime):
+        return created_at.date()
+    if isinstance(created_at, str) and len(created_at) >= 10:
+        try:
+            return datetime.strptime(created_at[:10], "%Y-%m-%d").date()
+        except ValueError:
+            return None
+    return None
+
+
+def build_passenger_complain_emails(complain_details: Dict) -> List[Dict]:
+    """Outbox messages for a new complaint, one per war room user, admin and train access user"""
     war_room_user_in_depot = []
     s2_admin_users = []
     railway_admin_users = []
@@ -55,12 +59,6 @@ def send_passenger_complain_email(complain_details: Dict):
     
     all_users_to_mail = []
     
-    s2_admin_users = []
-    railway_admin_users = []
-    assigned_users_list = []
-    
-    all_users_to_mail = []
-    
     train_depo = complain_details.get('train_depot', '')
     train_no = str(complain_details.get('train_no', '')).strip()
     complaint_date = complain_details.get('created_at', '') 
@@ -71,123 +69,30 @@ def send_passenger_complain_email(complain_details: Dict):
 
     
     try:
-        # Query to get war room users
-        query = """
-            SELECT u.* 
-            FROM user_onboarding_user u 
-            JOIN user_onboarding_roles ut ON u.user_type_id = ut.id 
-            WHERE ut.name = 'war room user'
-        """
-        
-        conn = get_db_connection()
-        war_room_users = execute_query(conn, query)
-        conn.close()
-
-        if war_room_users:
-            for user in war_room_users:
-                # Check if user's depot matches train depot
-                user_depo = user.get('depo', '')
-                if user_depo and train_depo and train_depo in user_depo:
-                    war_room_user_in_depot.append(user)
-        else:
-            logging.info(f"No war room users found for depot {train_depo} in complaint {complain_details['complain_id']}")
-            
-        s2_admin_query = """
-            SELECT u.* 
-            FROM user_onboarding_user u 
-            JOIN user_onboarding_roles ut ON u.user_type_id = ut.id 
-            WHERE ut.name = 's2 admin'
-        """
-        conn = get_db_connection()
-        s2_admin_users = execute_query(conn, s2_admin_query)
-        
-        railway_admin_query = """
-            SELECT u.* 
-            FROM user_onboarding_user u 
-            JOIN user_onboarding_roles ut ON u.user_type_id = ut.id 
-            WHERE ut.name = 'railway admin'
-        """
-        railway_admin_users = execute_query(conn, railway_admin_query)
-        
-        # Updated query to get train access users with better filtering
-        assigned_users_query = """
-            SELECT u.email, u.id, u.first_name, u.last_name, ta.train_details
-            FROM user_onboarding_user u
-            JOIN trains_trainaccess ta ON ta.user_id = u.id
-            WHERE ta.train_details IS NOT NULL 
-            AND ta.train_details != '{}'
-            AND ta.train_details != 'null'
-        """
-        conn = get_db_connection()
-        assigned_users_raw = execute_query(conn, assigned_users_query)
-        conn.close()
-        
         # Get train number and complaint date for filtering
-        train_no = str(complain_details.get('train_number', '')).strip()
+        train_no = str(complain_details.get('train_number') or complain_details.get('train_no') or '').strip()
         
-        # Handle created_at whether it's a string or datetime object
-        created_at_raw = complain_details.get('created_at', '')
-        try:
-            if isinstance(created_at_raw, datetime):
-                complaint_date = created_at_raw.date()
-            elif isinstance(created_at_raw, str):
-                if len(created_at_raw) >= 10:
-                    complaint_date = datetime.strptime(created_at_raw, "%Y-%m-%d").date()
-                else:
-                    complaint_date = None
-            else:
-                complaint_date = None
-        except (ValueError, TypeError):
-            complaint_date = None
-            
-
-        if complaint_date and train_no:
-            for user in assigned_users_raw:
-                try:
-                    train_details_str = user.get('train_details', '{}')
-                    
-                    # Handle case where train_details might be a string or already parsed
-                    if isinstance(train_details_str, str):
-                        train_details = json.loads(train_details_str)
-                    else:
-                        train_details = train_details_str
-                    
-                    # Check if the train number exists in train_details
-                    if train_no in train_details:
-                        for access in train_details[train_no]:
-                            try:
-                                origin_date = datetime.strptime(access.get('origin_date', ''), "%Y-%m-%d").date()
-                                end_date_str = access.get('end_date', '')
-                                
-                                # Check if complaint date falls within the valid range
-                                if end_date_str == 'ongoing':
-                                    is_valid = complaint_date >= origin_date
-                                else:
-                                    end_date = datetime.strptime(end_date_str, "%Y-%m-%d").date()
-                                    is_valid = origin_date <= complaint_date <= end_date
-                                
-                                if is_valid:
-                                    assigned_users_list.append(user)
-                                    break  # Only need one match per user
-                                    
-                            except (ValueError, TypeError) as date_error:
-                                logging.warning(f"Date parsing error for user {user.get('id')}: {date_error}")
-                                continue
-                                
-                except (json.JSONDecodeError, TypeError) as json_error:
-                    logging.warning(f"JSON parsing error for user {user.get('id')}: {json_error}")
-                    continue
-
-        # all_users_to_mail = [{"email": "writetohm19@gmail.com"}]
+        complaint_date = _complaint_date(complain_details.get('created_at'))
+
+        # War room users by depot, admin role lists and train access users all
+        # come from the precomputed recipient index instead of table scans
+        recipients = resolve_complaint_recipients(train_no, train_depo, complaint_date)
+        war_room_user_in_depot = recipients['war_room']
+        s2_admin_users = recipients['s2_admin']
+        railway_admin_users = recipients['railway_admin']
+        assigned_users_list = recipients['assigned']
+
+        if not war_room_user_in_depot:
+            logging.info(f"No war room users found for depot {train_depo} in complaint {complain_details['complain_id']}")
+
         all_users_to_mail = war_room_user_in_depot + s2_admin_users + railway_admin_users + assigned_users_list
      
     except Exception as e:
         logging.error(f"Error fetching users: {e}")
-        logging.error(f"Error fetching users: {e}")
 
     try:
         # Prepare email content
-        subject = f"Complaint received for train number: {complain_details['train_no']}"
+        subject = f"Complaint received for train number: {complain_details.get('train_no', '')}"
         pnr_value = complain_details.get('pnr', 'PNR not provided by passenger')
 
         
@@ -202,7 +107,7 @@ def send_passenger_complain_email(complain_details: Dict):
             "complain_id": complain_details.get('complain_id', ''),
             "created_at": complaint_created_at,
             "description": complain_details.get('description', ''),
-            "train_depo": complain_details.get('train_depo', ''),
+            "train_depo": complain_details.get('train_depo', train_depo),
             "complaint_date": complaint_date,
             "start_date_of_journey": journey_start_date,
             'site_name': 'RailSathi',
@@ -261,54 +166,101 @@ def send_passenger_complain_email(complain_details: Dict):
         if assigned_user_emails:
             logging.info(f"Train access users to be notified: {', '.join(assigned_user_emails)}")
 
-        # Send emails to war room users, s2 admins, railway admins, and train access users
-        # Create list of unique email addresses for logging
-        assigned_user_emails = [user.get('email') for user in assigned_users_list if user.get('email')]
-        assigned_user_emails = list(dict.fromkeys(assigned_user_emails))  # Remove duplicates
-        
-        if assigned_user_emails:
-            logging.info(f"Train access users to be notified: {', '.join(assigned_user_emails)}")
-
-        # Send emails to war room users, s2 admins, railway admins, and train access users
-        emails_sent = 0
-        for user in all_users_to_mail:
-            email = user.get('email', '')
-        for user in all_users_to_mail:
-            email = user.get('email', '')
-            if email and not email.startswith("noemail") and '@' in email:
-                try:
-                    success = send_plain_mail(subject, message, EMAIL_SENDER, [email])
-                    if success:
-                        emails_sent += 1
-                        logging.info(f"Email sent to {email} for complaint {complain_details['complain_id']}")
-                    else:
-                        logging.error(f"Failed to send email to {email}")
-                except Exception as e:
-                    logging.error(f"Error sending email to {email}: {e}")
-
-        if not all_users_to_mail:
-            logging.info(f"No users found for depot {train_depo} and train {train_no} in complaint {complain_details['complain_id']}")
-            return {"status": "success", "message": "No users found for this depot and train"}
+        # One message per unique war room user, s2 admin, railway admin and train access user
+        recipient_emails = [user.get('email', '') for user in all_users_to_mail]
+        recipient_emails = [
+            email for email in dict.fromkeys(recipient_emails)
+            if email and not email.startswith("noemail") and '@' in email
+        ]
         if not all_users_to_mail:
             logging.info(f"No users found for depot {train_depo} and train {train_no} in complaint {complain_details['complain_id']}")
+        return [{
+            'complain_id': complain_details.get('complain_id'),
+            'subject': subject,
+            'body': message,
+            'from_email': EMAIL_SENDER,
+            'to_email': email
+        } for email in recipient_emails]
+
+    except Exception as e:
+        logging.error(f"Error in build_passenger_complain_emails: {e}")
+        return []
+
+
+def send_passenger_complain_email(complain_details: Dict):
+    """Queue complaint email for war room users, admins and train access users"""
+    try:
+        emails_queued = enqueue_emails(build_passenger_complain_emails(complain_details))
+        if not emails_queued:
             return {"status": "success", "message": "No users found for this depot and train"}
-        
-        return {"status": "success", "message": f"Emails sent to {emails_sent} users"}
-        return {"status": "success", "message": f"Emails sent to {emails_sent} users"}
-        
+        logging.info(f"Queued {emails_queued} emails for complaint {complain_details['complain_id']}")
+        return {"status": "success", "message": f"Emails queued for {emails_queued} users"}
+
     except Exception as e:
         logging.error(f"Error in send_passenger_complain_email: {e}")
         return {"status": "error", "message": str(e)}
-    
-    
+
+
+def _complaint_recipient_emails(complain_details: Dict) -> List[str]:
+    complaint_date = _complaint_date(complain_details.get('created_at'))
+    train_no = str(complain_details.get('train_number') or complain_details.get('train_no') or '').strip()
+    recipients = resolve_complaint_recipients(train_no, complain_details.get('train_depot', ''), complaint_date)
+    users = recipients['war_room'] + recipients['s2_admin'] + recipients['railway_admin'] + recipients['assigned']
+    return [
+        email for email in dict.fromkeys(user.get('email', '') for user in users)
+        if email and not email.startswith("noemail") and '@' in email
+    ]
+
+
+def send_complaint_digest_emails(complaints: List[Dict]):
+    """
+    Queue one summary email per recipient covering all of the given
+    complaints, instead of one email per complaint per recipient. Used for
+    bulk-ingested complaints; each dict has the send_passenger_complain_email keys.
+    """
+    by_recipient = {}
+    for complaint in complaints:
+        try:
+            for email in _complaint_recipient_emails(complaint):
+                by_recipient.setdefault(email, []).append(complaint)
+        except Exception as e:
+            logging.error(f"Error resolving recipients for complaint {complaint.get('complain_id')}: {e}")
+
+    messages = []
+    for email, recipient_complaints in by_recipient.items():
+        count = len(recipient_complaints)
+        noun = "complaint" if count == 1 else "complaints"
+        train_nos = sorted({str(c.get('train_no') or '') for c in recipient_complaints} - {''})
+        subject = f"{count} {noun} received for train number: {', '.join(train_nos[:10])}"
+        lines = [f"{count} passenger {noun} received.", ""]
+        for c in recipient_complaints:
+            lines.append(
+                f"#{c.get('complain_id')} | Train {c.get('train_no', '')} {c.get('train_name') or ''} | "
+                f"Coach {c.get('coach') or '-'} Berth {c.get('berth') or '-'} | "
+                f"{c.get('passenger_name') or ''} {c.get('user_phone_number') or ''}"
+            )
+            lines.append(f"    {(c.get('description') or '')[:300]}")
+        lines += ["", "Please take necessary action at the earliest.", "",
+                  "This is an automated notification. Please do not reply to this email.", "",
+                  "Regards,", "Team RailSathi"]
+        messages.append({
+            'complain_id': recipient_complaints[0].get('complain_id') if count == 1 else None,
+            'subject': subject,
+            'body': "\n".join(lines),
+            'from_email': EMAIL_SENDER,
+            'to_email': email
+        })
+
+    emails_queued = enqueue_emails(messages)
+    logging.info(f"Queued {emails_queued} digest emails for {len(complaints)} complaints")
+    return {"status": "success", "message": f"Emails queued for {emails_queued} users"}
+
+
 def execute_sql_query(sql_query: str):
     """Execute a SELECT query safely"""
     if not sql_query.strip().lower().startswith("select"):
         raise ValueError("Only SELECT queries are allowed")
 
-    conn = get_db_connection()
-    try:
+    with db_connection() as conn:
         results = execute_query(conn, sql_query)
         return results
-    finally:
-        conn.close()
@@ -0,0 +1,36 @@
+from typing import Optional
+from fastapi import Response
+
+# Clients may keep a copy but must revalidate it with If-None-Match
+ETAG_CACHE_CONTROL = "no-cache"
+
+
+def make_etag(version: str) -> str:
+    """Strong ETag for a representation version"""
+    return f'"{version}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    Whether an If-None-Match header matches etag. If-None-Match uses the
+    weak comparison, so a W/ prefix added by a proxy still matches.
+    """
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(','):
+        candidate = candidate.strip()
+        if candidate == '*':
+            return True
+        if candidate.startswith('W/'):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+
+def etag_headers(etag: str) -> dict:
+    return {"ETag": etag, "Cache-Control": ETAG_CACHE_CONTROL}
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers=etag_headers(etag))
@@ -0,0 +1,96 @@
+import os
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Any
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+IMAGE_MAX_DIMENSION = int(os.getenv('IMAGE_MAX_DIMENSION', 2560))
+IMAGE_PREVIEW_DIMENSION = int(os.getenv('IMAGE_PREVIEW_DIMENSION', 1024))
+IMAGE_THUMBNAIL_DIMENSION = int(os.getenv('IMAGE_THUMBNAIL_DIMENSION', 320))
+IMAGE_JPEG_QUALITY = int(os.getenv('IMAGE_JPEG_QUALITY', 85))
+IMAGE_PROCESS_WORKERS = int(os.getenv('IMAGE_PROCESS_WORKERS', os.cpu_count() or 2))
+IMAGE_PROCESS_TIMEOUT = float(os.getenv('IMAGE_PROCESS_TIMEOUT', 120))
+
+# Largest first: each rendition is resized from the one before it
+RENDITIONS = (
+    ('original', IMAGE_MAX_DIMENSION),
+    ('preview', IMAGE_PREVIEW_DIMENSION),
+    ('thumbnail', IMAGE_THUMBNAIL_DIMENSION),
+)
+
+
+def _to_rgb(img: Image.Image) -> Image.Image:
+    if img.mode == 'RGB':
+        return img
+    if img.mode in ('RGBA', 'LA') or (img.mode == 'P' and 'transparency' in img.info):
+        img = img.convert('RGBA')
+        background = Image.new('RGB', img.size, (255, 255, 255))
+        background.paste(img, mask=img.getchannel('A'))
+        return background
+    return img.convert('RGB')
+
+
+def render_image_derivatives(source_path: str, output_dir: str) -> Dict[str, Dict[str, Any]]:
+    """
+    Decode an image once and write capped-size JPEG renditions to output_dir.
+
+    JPEGs are decoded in draft mode at the smallest DCT scale that still
+    covers IMAGE_MAX_DIMENSION, EXIF orientation is applied, and transparent
+    images are flattened onto white. Returns {name: {path, width, height, bytes}}.
+    Runs inside the image process pool.
+    """
+    renditions = {}
+    with Image.open(source_path) as img:
+        if img.format == 'JPEG':
+            img.draft('RGB', (IMAGE_MAX_DIMENSION, IMAGE_MAX_DIMENSION))
+        img = ImageOps.exif_transpose(img)
+        img = _to_rgb(img)
+        current = img
+        for name, max_dimension in RENDITIONS:
+            if max(current.size) > max_dimension:
+                current = current.copy()
+                current.thumbnail((max_dimension, max_dimension), Image.LANCZOS)
+            path = os.path.join(output_dir, f"{name}.jpg")
+            current.save(path, format='JPEG', quality=IMAGE_JPEG_QUALITY, optimize=True, progressive=True)
+            renditions[name] = {
+                'path': path,
+                'width': current.size[0],
+                'height': current.size[1],
+                'bytes': os.path.getsize(path)
+            }
+    return renditions
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_image_process_pool() -> ProcessPoolExecutor:
+    """Return the process pool that runs image decoding and encoding"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ProcessPoolExecutor(
+                    max_workers=IMAGE_PROCESS_WORKERS,
+                    mp_context=multiprocessing.get_context('spawn')
+                )
+    return _pool
+
+
+def process_image(source_path: str, output_dir: str) -> Dict[str, Dict[str, Any]]:
+    """Render image derivatives on the process pool and wait for the result"""
+    future = get_image_process_pool().submit(render_image_derivatives, source_path, output_dir)
+    return future.result(timeout=IMAGE_PROCESS_TIMEOUT)
+
+
+def shutdown_image_process_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
@@ -0,0 +1,26 @@
+import decimal
+from typing import Any
+import orjson
+from fastapi.responses import ORJSONResponse
+
+
+def _default(obj):
+    if isinstance(obj, decimal.Decimal):
+        return float(obj)
+    if isinstance(obj, (bytes, memoryview)):
+        return bytes(obj).decode('utf-8', errors='replace')
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+class FastJSONResponse(ORJSONResponse):
+    """
+    JSON response encoded by orjson.
+
+    Database rows can be passed as they come from the driver: datetime,
+    date and UUID values are encoded natively in C, so no per-field
+    conversion to strings is needed first. Returning this response from an
+    endpoint also skips FastAPI's response_model validation.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
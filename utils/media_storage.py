@@ -0,0 +1,221 @@
+import os
+import shutil
+import logging
+import threading
+from typing import Dict, Optional, Any
+
+logger = logging.getLogger(__name__)
+
+MEDIA_STORAGE_BACKEND = os.getenv('MEDIA_STORAGE_BACKEND', 'gcs').lower()
+GCS_BUCKET_NAME = os.getenv('GCS_BUCKET_NAME', 'sanchalak-media-bucket1')
+PROJECT_ID = os.getenv('PROJECT_ID', 'sanchalak-423912')
+# GCS resumable uploads require a multiple of 256 KB
+GCS_UPLOAD_CHUNK_SIZE = int(os.getenv('GCS_UPLOAD_CHUNK_SIZE', 8 * 1024 * 1024))
+GCS_HTTP_POOL_SIZE = int(os.getenv('GCS_HTTP_POOL_SIZE', 16))
+LOCAL_MEDIA_ROOT = os.getenv('LOCAL_MEDIA_ROOT', 'uploads')
+LOCAL_MEDIA_URL_PREFIX = os.getenv('LOCAL_MEDIA_URL_PREFIX', '/media')
+
+
+class MediaStorage:
+    """
+    Where processed media files are kept.
+
+    Keys are slash-separated object names such as
+    rail_sathi_complain_images/<name>.jpg. upload_file returns the public
+    URL stored on the media row.
+    """
+
+    name = 'base'
+
+    def __init__(self):
+        self._stats_lock = threading.Lock()
+        self.uploads = 0
+        self.deletes = 0
+        self.bytes_uploaded = 0
+
+    def upload_file(self, path: str, key: str, content_type: Optional[str] = None) -> str:
+        url = self._upload_file(path, key, content_type)
+        with self._stats_lock:
+            self.uploads += 1
+            self.bytes_uploaded += os.path.getsize(path)
+        return url
+
+    def delete(self, key: str):
+        self._delete(key)
+        with self._stats_lock:
+            self.deletes += 1
+
+    def _upload_file(self, path: str, key: str, content_type: Optional[str]) -> str:
+        raise NotImplementedError
+
+    def _delete(self, key: str):
+        raise NotImplementedError
+
+    def exists(self, key: str) -> bool:
+        raise NotImplementedError
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            return {
+                'backend': self.name,
+                'uploads': self.uploads,
+                'deletes': self.deletes,
+                'bytes_uploaded': self.bytes_uploaded
+            }
+
+    def close(self):
+        pass
+
+
+class GcsStorage(MediaStorage):
+    """
+    Google Cloud Storage bucket.
+
+    The storage.Client (credentials and HTTP session) is created once and
+    shared by every upload, with an HTTP connection pool sized for the media
+    job threads.
+    """
+
+    name = 'gcs'
+
+    def __init__(self, bucket_name: str = GCS_BUCKET_NAME, project: str = PROJECT_ID,
+                 chunk_size: int = GCS_UPLOAD_CHUNK_SIZE, http_pool_size: int = GCS_HTTP_POOL_SIZE):
+        super().__init__()
+        self.bucket_name = bucket_name
+        self.project = project
+        self.chunk_size = chunk_size
+        self.http_pool_size = http_pool_size
+        self._client = None
+        self._bucket = None
+        self._lock = threading.Lock()
+
+    def _get_bucket(self):
+        if self._bucket is None:
+            with self._lock:
+                if self._bucket is None:
+                    from google.cloud import storage
+                    from requests.adapters import HTTPAdapter
+                    try:
+                        client = storage.Client(project=self.project)
+                    except Exception as e:
+                        raise RuntimeError(f"Failed to create GCS client: {e}")
+                    adapter = HTTPAdapter(pool_connections=self.http_pool_size, pool_maxsize=self.http_pool_size)
+                    client._http.mount("https://", adapter)
+                    self._client = client
+                    self._bucket = client.bucket(self.bucket_name)
+        return self._bucket
+
+    def _upload_file(self, path, key, content_type):
+        blob = self._get_bucket().blob(key, chunk_size=self.chunk_size)
+        blob.upload_from_filename(path, content_type=content_type)
+        return blob.public_url
+
+    def _delete(self, key):
+        from google.api_core.exceptions import NotFound
+        try:
+            self._get_bucket().blob(key).delete()
+        except NotFound:
+            pass
+
+    def exists(self, key):
+        return self._get_bucket().blob(key).exists()
+
+    def close(self):
+        with self._lock:
+            if self._client is not None:
+                self._client.close()
+            self._client = None
+            self._bucket = None
+
+
+class LocalStorage(MediaStorage):
+    """Files under a local directory, served by the app at url_prefix"""
+
+    name = 'local'
+
+    def __init__(self, root: str = LOCAL_MEDIA_ROOT, url_prefix: str = LOCAL_MEDIA_URL_PREFIX):
+        super().__init__()
+        self.root = os.path.abspath(root)
+        self.url_prefix = url_prefix.rstrip('/')
+
+    def _path(self, key: str) -> str:
+        path = os.path.abspath(os.path.join(self.root, key))
+        if not path.startswith(self.root + os.sep):
+            raise ValueError(f"Invalid storage key: {key}")
+        return path
+
+    def _upload_file(self, path, key, content_type):
+        target = self._path(key)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        shutil.copyfile(path, target)
+        return f"{self.url_prefix}/{key}"
+
+    def _delete(self, key):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def exists(self, key):
+        return os.path.exists(self._path(key))
+
+
+class MemoryStorage(MediaStorage):
+    """Keeps objects in a dict; for tests and offline benchmarks"""
+
+    name = 'memory'
+
+    def __init__(self):
+        super().__init__()
+        self.objects: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def _upload_file(self, path, key, content_type):
+        with open(path, 'rb') as f:
+            data = f.read()
+        with self._lock:
+            self.objects[key] = {'data': data, 'content_type': content_type}
+        return f"memory://{key}"
+
+    def _delete(self, key):
+        with self._lock:
+            self.objects.pop(key, None)
+
+    def exists(self, key):
+        return key in self.objects
+
+
+STORAGE_BACKENDS = {
+    'gcs': GcsStorage,
+    'local': LocalStorage,
+    'memory': MemoryStorage,
+}
+
+_storage: Optional[MediaStorage] = None
+_storage_lock = threading.Lock()
+
+
+def get_storage() -> MediaStorage:
+    """Return the process-wide storage backend selected by MEDIA_STORAGE_BACKEND"""
+    global _storage
+    if _storage is None:
+        with _storage_lock:
+            if _storage is None:
+                if MEDIA_STORAGE_BACKEND not in STORAGE_BACKENDS:
+                    raise RuntimeError(f"Unknown MEDIA_STORAGE_BACKEND: {MEDIA_STORAGE_BACKEND}")
+                _storage = STORAGE_BACKENDS[MEDIA_STORAGE_BACKEND]()
+                logger.info(f"Media storage backend: {_storage.name}")
+    return _storage
+
+
+def set_storage(storage: Optional[MediaStorage]):
+    """Replace the process-wide backend (None resets to the configured one)"""
+    global _storage
+    with _storage_lock:
+        if _storage is not None and _storage is not storage:
+            _storage.close()
+        _storage = storage
+
+
+def close_storage():
+    set_storage(None)
@@ -0,0 +1,159 @@
+import time
+import inspect
+import threading
+import functools
+import logging
+from typing import Callable
+from prometheus_client import Counter, Gauge, Histogram, REGISTRY, generate_latest, CONTENT_TYPE_LATEST
+from prometheus_client.core import GaugeMetricFamily, CounterMetricFamily
+from fastapi import Request, Response
+from fastapi.routing import APIRoute
+
+logger = logging.getLogger(__name__)
+
+# Buckets in seconds, from sub-millisecond cache hits to slow uploads
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+http_request_duration = Histogram(
+    'rail_sathi_http_request_duration_seconds', 'Time spent handling requests, by route template',
+    ['method', 'route'], buckets=LATENCY_BUCKETS
+)
+http_requests = Counter(
+    'rail_sathi_http_requests_total', 'Requests handled, by route template and status',
+    ['method', 'route', 'status']
+)
+http_requests_in_progress = Gauge(
+    'rail_sathi_http_requests_in_progress', 'Requests being handled, by route template',
+    ['method', 'route']
+)
+db_query_duration = Histogram(
+    'rail_sathi_db_query_duration_seconds', 'Database statement time, by query helper',
+    ['operation'], buckets=LATENCY_BUCKETS
+)
+media_upload_duration = Histogram(
+    'rail_sathi_media_upload_duration_seconds', 'Time to store one processed media file',
+    ['backend'], buckets=LATENCY_BUCKETS
+)
+media_upload_bytes = Counter(
+    'rail_sathi_media_upload_bytes_total', 'Bytes of processed media stored', ['backend']
+)
+change_feed_horizon_lag = Gauge(
+    'rail_sathi_change_feed_horizon_lag_seconds', 'How far behind now the last change feed poll stopped'
+)
+smtp_send_duration = Histogram(
+    'rail_sathi_smtp_send_duration_seconds', 'Time to send one email over SMTP, by outcome',
+    ['result'], buckets=LATENCY_BUCKETS
+)
+
+
+def timed(histogram: Histogram, *labels) -> Callable:
+    """
+    Decorator recording the duration of each call, sync or async, in
+    histogram. The labelled child is resolved once, not per call.
+    """
+    child = histogram.labels(*labels)
+
+    def decorator(fn):
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return await fn(*args, **kwargs)
+                finally:
+                    child.observe(time.perf_counter() - started)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                child.observe(time.perf_counter() - started)
+        return wrapper
+    return decorator
+
+
+class MetricsRoute(APIRoute):
+    """
+    Route class that records latency, status and in-flight requests under
+    the route template (e.g. /complaint/get/{complain_id}), so label
+    cardinality stays bounded by the number of routes.
+    """
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+        methods = ','.join(sorted(self.methods or []))
+        duration = http_request_duration.labels(methods, self.path)
+        in_progress = http_requests_in_progress.labels(methods, self.path)
+        path = self.path
+
+        async def metered_handler(request: Request) -> Response:
+            started = time.perf_counter()
+            in_progress.inc()
+            status = 500
+            try:
+                response = await handler(request)
+                status = response.status_code
+                return response
+            except Exception as e:
+                status = getattr(e, 'status_code', 500)
+                raise
+            finally:
+                in_progress.dec()
+                duration.observe(time.perf_counter() - started)
+                http_requests.labels(methods, path, str(status)).inc()
+
+        return metered_handler
+
+
+class PoolCollector:
+    """Reports connection pool usage when scraped, at no cost per request"""
+
+    def describe(self):
+        # Keeps registration from calling collect() while database is importing
+        return []
+
+    def collect(self):
+        from database import get_pool_stats, get_async_pool_stats
+        connections = GaugeMetricFamily(
+            'rail_sathi_db_pool_connections', 'Pooled connections by state', labels=['pool', 'state']
+        )
+        waiting = GaugeMetricFamily('rail_sathi_db_pool_waiting', 'Callers waiting for a connection', labels=['pool'])
+        max_size = GaugeMetricFamily('rail_sathi_db_pool_max_size', 'Connection limit', labels=['pool'])
+        checkouts = CounterMetricFamily('rail_sathi_db_pool_checkouts', 'Connections checked out', labels=['pool'])
+        timeouts = CounterMetricFamily('rail_sathi_db_pool_timeouts', 'Checkouts that timed out', labels=['pool'])
+        for pool, stats_fn in (('sync', get_pool_stats), ('async', get_async_pool_stats)):
+            try:
+                stats = stats_fn()
+            except Exception as e:
+                logger.warning(f"Could not read {pool} pool stats: {e}")
+                continue
+            if not stats:
+                continue
+            connections.add_metric([pool, 'in_use'], stats['in_use'])
+            connections.add_metric([pool, 'idle'], stats['idle'])
+            waiting.add_metric([pool], stats['waiting'])
+            max_size.add_metric([pool], stats['max_size'])
+            checkouts.add_metric([pool], stats['checkouts'])
+            timeouts.add_metric([pool], stats['timeouts'])
+        return [connections, waiting, max_size, checkouts, timeouts]
+
+
+_pool_collector = None
+_pool_collector_lock = threading.Lock()
+
+
+def register_pool_collector():
+    """Register the pool collector with the default registry once; called at startup, safe to repeat"""
+    global _pool_collector
+    with _pool_collector_lock:
+        if _pool_collector is None:
+            collector = PoolCollector()
+            REGISTRY.register(collector)
+            _pool_collector = collector
+
+
+def metrics_response() -> Response:
+    return Response(generate_latest(REGISTRY), media_type=CONTENT_TYPE_LATEST)
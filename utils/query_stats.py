@@ -0,0 +1,201 @@
+import os
+import re
+import json
+import time
+import random
+import inspect
+import logging
+import functools
+import threading
+from collections import OrderedDict
+from logging.handlers import RotatingFileHandler
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+SLOW_QUERY_THRESHOLD_MS = float(os.getenv('SLOW_QUERY_THRESHOLD_MS', 200))
+SLOW_QUERY_EXPLAIN_SAMPLE_RATE = float(os.getenv('SLOW_QUERY_EXPLAIN_SAMPLE_RATE', 0.1))
+SLOW_QUERY_EXPLAIN_INTERVAL = float(os.getenv('SLOW_QUERY_EXPLAIN_INTERVAL', 300))
+SLOW_QUERY_EXPLAIN_TIMEOUT_MS = int(os.getenv('SLOW_QUERY_EXPLAIN_TIMEOUT_MS', 30000))
+SLOW_QUERY_PLAN_FILE = os.getenv('SLOW_QUERY_PLAN_FILE', 'logs/slow_query_plans.log')
+SLOW_QUERY_PLAN_FILE_MAX_BYTES = int(os.getenv('SLOW_QUERY_PLAN_FILE_MAX_BYTES', 10 * 1024 * 1024))
+SLOW_QUERY_PLAN_FILE_BACKUPS = int(os.getenv('SLOW_QUERY_PLAN_FILE_BACKUPS', 5))
+QUERY_STATS_MAX_ENTRIES = int(os.getenv('QUERY_STATS_MAX_ENTRIES', 500))
+
+_WHITESPACE = re.compile(r'\s+')
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r'\b\d+(?:\.\d+)?\b')
+_WRITE_KEYWORDS = re.compile(r'\b(INSERT|UPDATE|DELETE|MERGE|TRUNCATE|COPY|CREATE|ALTER|DROP)\b', re.IGNORECASE)
+
+# Least recently executed first, so eviction is O(1) under the lock
+_stats: 'OrderedDict[str, Dict[str, Any]]' = OrderedDict()
+_stats_lock = threading.Lock()
+_last_explained: Dict[str, float] = {}
+_explain_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='slow-query-explain')
+_plan_logger: Optional[logging.Logger] = None
+
+
+# Statements are built from a fixed set of templates, so the same texts recur on every call
+@functools.lru_cache(maxsize=1024)
+def normalize_query(query: str) -> str:
+    """Query text with literals replaced and whitespace collapsed, used as the stats key"""
+    query = _STRING_LITERAL.sub('?', query)
+    query = _NUMBER_LITERAL.sub('?', query)
+    return _WHITESPACE.sub(' ', query).strip()
+
+
+def params_shape(params) -> str:
+    """Types (and list lengths) of the parameters, never their values"""
+    if params is None:
+        return '()'
+
+    def shape(value):
+        if isinstance(value, (list, tuple)):
+            return f"{type(value).__name__}[{len(value)}]"
+        return type(value).__name__
+    if isinstance(params, dict):
+        return '{' + ', '.join(f"{key}: {shape(value)}" for key, value in params.items()) + '}'
+    return '(' + ', '.join(shape(value) for value in params) + ')'
+
+
+def is_read_only(query: str) -> bool:
+    """Whether EXPLAIN ANALYZE can run the statement without side effects"""
+    stripped = query.lstrip().upper()
+    return stripped.startswith(('SELECT', 'WITH')) and not _WRITE_KEYWORDS.search(query)
+
+
+def record_query(query: str, params, seconds: float):
+    """Add one execution to the per-query stats; log and sample slow ones"""
+    elapsed_ms = seconds * 1000
+    normalized = normalize_query(query)
+    slow = elapsed_ms >= SLOW_QUERY_THRESHOLD_MS
+    with _stats_lock:
+        entry = _stats.get(normalized)
+        if entry is None:
+            if len(_stats) >= QUERY_STATS_MAX_ENTRIES:
+                # Forget the query that has gone longest without running
+                evicted, _ = _stats.popitem(last=False)
+                _last_explained.pop(evicted, None)
+            entry = _stats[normalized] = {'calls': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'slow_calls': 0}
+        else:
+            _stats.move_to_end(normalized)
+        entry['calls'] += 1
+        entry['total_ms'] += elapsed_ms
+        entry['max_ms'] = max(entry['max_ms'], elapsed_ms)
+        if slow:
+            entry['slow_calls'] += 1
+    if not slow:
+        return
+    shape = params_shape(params)
+    logger.warning(f"Slow query ({elapsed_ms:.1f} ms) params={shape}: {normalized}")
+    if _should_explain(normalized):
+        _explain_executor.submit(_capture_plan, query, params, normalized, shape, elapsed_ms)
+
+
+def _should_explain(normalized: str) -> bool:
+    if SLOW_QUERY_EXPLAIN_SAMPLE_RATE <= 0 or random.random() >= SLOW_QUERY_EXPLAIN_SAMPLE_RATE:
+        return False
+    now = time.monotonic()
+    with _stats_lock:
+        if now - _last_explained.get(normalized, float('-inf')) < SLOW_QUERY_EXPLAIN_INTERVAL:
+            return False
+        _last_explained[normalized] = now
+    return True
+
+
+def _get_plan_logger() -> logging.Logger:
+    global _plan_logger
+    if _plan_logger is None:
+        directory = os.path.dirname(SLOW_QUERY_PLAN_FILE)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        plan_logger = logging.getLogger('rail_sathi.slow_query_plans')
+        plan_logger.propagate = False
+        plan_logger.setLevel(logging.INFO)
+        plan_logger.addHandler(RotatingFileHandler(
+            SLOW_QUERY_PLAN_FILE, maxBytes=SLOW_QUERY_PLAN_FILE_MAX_BYTES, backupCount=SLOW_QUERY_PLAN_FILE_BACKUPS
+        ))
+        _plan_logger = plan_logger
+    return _plan_logger
+
+
+def _capture_plan(query: str, params, normalized: str, shape: str, elapsed_ms: float):
+    """
+    Write the plan of a slow statement to the plan file. Runs on its own
+    pooled connection off the request path; writes are only EXPLAINed,
+    never ANALYZEd, and the transaction is always rolled back.
+    """
+    from database import db_connection
+    analyze = is_read_only(query)
+    options = "ANALYZE, BUFFERS, FORMAT TEXT" if analyze else "FORMAT TEXT"
+    try:
+        with db_connection() as conn:
+            try:
+                cursor = conn.cursor()
+                cursor.execute(f"SET LOCAL statement_timeout = {SLOW_QUERY_EXPLAIN_TIMEOUT_MS}")
+                cursor.execute(f"EXPLAIN ({options}) {query}", params)
+                plan = [row[0] for row in cursor.fetchall()]
+            finally:
+                conn.rollback()
+    except Exception as e:
+        logger.warning(f"Could not EXPLAIN slow query: {e}")
+        return
+    _get_plan_logger().info(json.dumps({
+        'captured_at': datetime.now().isoformat(),
+        'duration_ms': round(elapsed_ms, 3),
+        'analyzed': analyze,
+        'query': normalized,
+        'params_shape': shape,
+        'plan': plan
+    }))
+
+
+def tracked(fn):
+    """Decorator for query helpers called as fn(connection, query, params)"""
+    if inspect.iscoroutinefunction(fn):
+        @functools.wraps(fn)
+        async def async_wrapper(connection, query, params=None):
+            started = time.perf_counter()
+            result = await fn(connection, query, params)
+            record_query(query, params, time.perf_counter() - started)
+            return result
+        return async_wrapper
+
+    @functools.wraps(fn)
+    def wrapper(connection, query, params=None):
+        started = time.perf_counter()
+        result = fn(connection, query, params)
+        record_query(query, params, time.perf_counter() - started)
+        return result
+    return wrapper
+
+
+def get_top_queries(limit: int = 20, order_by: str = 'total_ms') -> List[Dict[str, Any]]:
+    """The limit most expensive queries by total_ms, max_ms, calls or slow_calls"""
+    with _stats_lock:
+        entries = [{'query': query, **entry} for query, entry in _stats.items()]
+    entries.sort(key=lambda entry: entry[order_by], reverse=True)
+    for entry in entries[:limit]:
+        entry['total_ms'] = round(entry['total_ms'], 3)
+        entry['max_ms'] = round(entry['max_ms'], 3)
+        entry['mean_ms'] = round(entry['total_ms'] / entry['calls'], 3)
+    return entries[:limit]
+
+
+def get_query_stats_summary() -> Dict[str, Any]:
+    with _stats_lock:
+        tracked_queries = len(_stats)
+    return {
+        'threshold_ms': SLOW_QUERY_THRESHOLD_MS,
+        'explain_sample_rate': SLOW_QUERY_EXPLAIN_SAMPLE_RATE,
+        'plan_file': SLOW_QUERY_PLAN_FILE,
+        'tracked_queries': tracked_queries
+    }
+
+
+def reset_query_stats():
+    with _stats_lock:
+        _stats.clear()
+        _last_explained.clear()
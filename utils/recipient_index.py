@@ -0,0 +1,208 @@
+import os
+import re
+import json
+import time
+import logging
+import threading
+from datetime import datetime, date
+from typing import Dict, List, Optional, Any
+from database import db_connection, execute_query
+
+logger = logging.getLogger(__name__)
+
+RECIPIENT_INDEX_TTL = int(os.getenv('RECIPIENT_INDEX_TTL', 300))
+
+WAR_ROOM_ROLE = 'war room user'
+S2_ADMIN_ROLE = 's2 admin'
+RAILWAY_ADMIN_ROLE = 'railway admin'
+
+ROLE_USERS_QUERY = """
+    SELECT u.*, ut.name AS role_name
+    FROM user_onboarding_user u
+    JOIN user_onboarding_roles ut ON u.user_type_id = ut.id
+    WHERE ut.name IN (%s, %s, %s)
+"""
+
+TRAIN_ACCESS_USERS_QUERY = """
+    SELECT u.email, u.id, u.first_name, u.last_name, ta.train_details
+    FROM user_onboarding_user u
+    JOIN trains_trainaccess ta ON ta.user_id = u.id
+    WHERE ta.train_details IS NOT NULL
+    AND ta.train_details != '{}'
+    AND ta.train_details != 'null'
+"""
+
+# Depots in a user's depo field are separated by these; names may contain spaces
+_DEPOT_SEPARATORS = re.compile(r'[,;/|]')
+
+
+def _depot_tokens(depo) -> List[str]:
+    tokens = (token.strip().upper() for token in _DEPOT_SEPARATORS.split(str(depo or '')))
+    return [token for token in tokens if token]
+
+
+def _parse_date(value) -> Optional[date]:
+    return datetime.strptime(value, "%Y-%m-%d").date()
+
+
+class RecipientIndex:
+    """
+    Precomputed lookup tables for complaint notification recipients.
+
+    - train_no -> [(origin_date, end_date or None when ongoing, user)]
+    - war room depot -> [user]
+    - s2 admin and railway admin user lists
+
+    The index is rebuilt from the database once it is older than ttl seconds.
+    A stale index keeps serving lookups while a background thread rebuilds it.
+    """
+
+    def __init__(self, ttl: int):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._train_access = {}
+        self._war_room_by_depot = {}
+        self._s2_admins = []
+        self._railway_admins = []
+        self._built_at = None
+        self._build_ms = 0.0
+        self.builds = 0
+        self.lookups = 0
+
+    def refresh(self):
+        """Rebuild the index from the database"""
+        with self._refresh_lock:
+            started = time.monotonic()
+            with db_connection() as conn:
+                role_users = execute_query(conn, ROLE_USERS_QUERY, (WAR_ROOM_ROLE, S2_ADMIN_ROLE, RAILWAY_ADMIN_ROLE))
+                train_access_users = execute_query(conn, TRAIN_ACCESS_USERS_QUERY)
+
+            war_room_by_depot, s2_admins, railway_admins = {}, [], []
+            for user in role_users:
+                role = user.pop('role_name', None)
+                if role == WAR_ROOM_ROLE:
+                    for token in _depot_tokens(user.get('depo')):
+                        war_room_by_depot.setdefault(token, []).append(user)
+                elif role == S2_ADMIN_ROLE:
+                    s2_admins.append(user)
+                elif role == RAILWAY_ADMIN_ROLE:
+                    railway_admins.append(user)
+
+            train_access = {}
+            for user in train_access_users:
+                self._index_train_access(train_access, user)
+
+            with self._lock:
+                self._war_room_by_depot = war_room_by_depot
+                self._s2_admins = s2_admins
+                self._railway_admins = railway_admins
+                self._train_access = train_access
+                self._built_at = time.monotonic()
+                self._build_ms = (time.monotonic() - started) * 1000
+                self.builds += 1
+            logger.info(
+                f"Recipient index rebuilt: {len(train_access)} trains, "
+                f"{len(war_room_by_depot)} depots in {self._build_ms:.1f}ms"
+            )
+
+    def invalidate(self):
+        """Force a rebuild on the next lookup"""
+        with self._lock:
+            self._built_at = None
+
+    def resolve(self, train_no, train_depot, complaint_date: Optional[date]) -> Dict[str, List[Dict]]:
+        """Return the users to notify about a complaint, grouped by why they were selected"""
+        self._ensure_fresh()
+        train_no = str(train_no or '').strip()
+        with self._lock:
+            self.lookups += 1
+            war_room = []
+            for token in _depot_tokens(train_depot):
+                war_room.extend(self._war_room_by_depot.get(token, []))
+            assigned = []
+            if complaint_date and train_no:
+                seen = set()
+                for origin_date, end_date, user in self._train_access.get(train_no, []):
+                    if user['id'] in seen:
+                        continue
+                    if origin_date <= complaint_date and (end_date is None or complaint_date <= end_date):
+                        seen.add(user['id'])
+                        assigned.append(user)
+            return {
+                'war_room': list({id(user): user for user in war_room}.values()),
+                's2_admin': list(self._s2_admins),
+                'railway_admin': list(self._railway_admins),
+                'assigned': assigned
+            }
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'ttl_seconds': self.ttl,
+                'age_seconds': round(time.monotonic() - self._built_at, 1) if self._built_at else None,
+                'trains': len(self._train_access),
+                'depots': len(self._war_room_by_depot),
+                's2_admins': len(self._s2_admins),
+                'railway_admins': len(self._railway_admins),
+                'builds': self.builds,
+                'last_build_ms': round(self._build_ms, 3),
+                'lookups': self.lookups
+            }
+
+    def _ensure_fresh(self):
+        with self._lock:
+            built_at = self._built_at
+            populated = self.builds > 0
+        if built_at is not None and time.monotonic() - built_at < self.ttl:
+            return
+        if not populated:
+            self.refresh()
+        elif not self._refresh_lock.locked():
+            threading.Thread(target=self._refresh_in_background, daemon=True).start()
+
+    def _refresh_in_background(self):
+        try:
+            self.refresh()
+        except Exception as e:
+            logger.error(f"Recipient index refresh failed: {e}")
+
+    @staticmethod
+    def _index_train_access(train_access, user):
+        train_details = user.pop('train_details', None)
+        try:
+            if isinstance(train_details, str):
+                train_details = json.loads(train_details)
+        except (json.JSONDecodeError, TypeError) as json_error:
+            logger.warning(f"JSON parsing error for user {user.get('id')}: {json_error}")
+            return
+        if not isinstance(train_details, dict):
+            return
+        for train_no, accesses in train_details.items():
+            for access in accesses or []:
+                try:
+                    origin_date = _parse_date(access.get('origin_date', ''))
+                    end_date_str = access.get('end_date', '')
+                    end_date = None if end_date_str == 'ongoing' else _parse_date(end_date_str)
+                except (ValueError, TypeError, AttributeError) as date_error:
+                    logger.warning(f"Date parsing error for user {user.get('id')}: {date_error}")
+                    continue
+                train_access.setdefault(str(train_no).strip(), []).append((origin_date, end_date, user))
+
+
+recipient_index = RecipientIndex(RECIPIENT_INDEX_TTL)
+
+
+def resolve_complaint_recipients(train_no, train_depot, complaint_date) -> Dict[str, List[Dict]]:
+    """Return notification recipients for a complaint from the recipient index"""
+    return recipient_index.resolve(train_no, train_depot, complaint_date)
+
+
+def invalidate_recipient_index():
+    """Force the recipient index to be rebuilt on the next lookup"""
+    recipient_index.invalidate()
+
+
+def get_recipient_index_stats() -> Dict[str, Any]:
+    """Return size and freshness of the recipient index"""
+    return recipient_index.stats()
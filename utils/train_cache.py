@@ -0,0 +1,176 @@
+import os
+import time
+import logging
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional, Any
+from cachetools import TTLCache
+from database import db_connection, execute_query, async_db_connection, execute_query_one_async
+
+logger = logging.getLogger(__name__)
+
+TRAIN_CACHE_TTL = int(os.getenv('TRAIN_CACHE_TTL', 3600))
+TRAIN_CACHE_MAX_SIZE = int(os.getenv('TRAIN_CACHE_MAX_SIZE', 10000))
+TRAIN_CACHE_WARM_UP = os.getenv('TRAIN_CACHE_WARM_UP', 'false').lower() in ('1', 'true', 'yes')
+
+TRAIN_BY_ID_QUERY = "SELECT * FROM trains_traindetails WHERE id = %s"
+TRAIN_BY_NO_QUERY = "SELECT * FROM trains_traindetails WHERE train_no = %s"
+ALL_TRAINS_QUERY = "SELECT * FROM trains_traindetails ORDER BY id LIMIT %s"
+TRAINS_BY_IDS_OR_NOS_QUERY = """
+    SELECT * FROM trains_traindetails
+    WHERE id = ANY(%s) OR train_no = ANY(%s::integer[])
+"""
+
+
+def _train_no_key(train_no) -> str:
+    return str(train_no).strip()
+
+
+class TrainDetailsCache:
+    """
+    In-process cache of trains_traindetails rows keyed by both id and train_no.
+
+    Entries expire after ttl seconds and the least recently used entries are
+    evicted once maxsize is reached.
+    """
+
+    def __init__(self, maxsize: int, ttl: int, timer=time.monotonic):
+        self._by_id = TTLCache(maxsize=maxsize, ttl=ttl, timer=timer)
+        self._by_no = TTLCache(maxsize=maxsize, ttl=ttl, timer=timer)
+        self._lock = threading.Lock()
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.last_warm_up = None
+
+    def get_by_id(self, train_id) -> Optional[Dict]:
+        return self._get(self._by_id, int(train_id))
+
+    def get_by_no(self, train_no) -> Optional[Dict]:
+        return self._get(self._by_no, _train_no_key(train_no))
+
+    def put(self, train: Dict):
+        if not train:
+            return
+        with self._lock:
+            self._by_id[train['id']] = train
+            self._by_no[_train_no_key(train['train_no'])] = train
+
+    def put_many(self, trains: List[Dict]):
+        with self._lock:
+            for train in trains:
+                self._by_id[train['id']] = train
+                self._by_no[_train_no_key(train['train_no'])] = train
+            self.last_warm_up = datetime.now()
+
+    def clear(self):
+        with self._lock:
+            self._by_id.clear()
+            self._by_no.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._by_id),
+                'max_size': self.maxsize,
+                'ttl_seconds': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'last_warm_up': self.last_warm_up.isoformat() if self.last_warm_up else None
+            }
+
+    def _get(self, cache, key) -> Optional[Dict]:
+        with self._lock:
+            train = cache.get(key)
+            if train is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return dict(train)
+
+
+train_cache = TrainDetailsCache(TRAIN_CACHE_MAX_SIZE, TRAIN_CACHE_TTL)
+
+
+async def get_train_by_id_async(train_id) -> Optional[Dict]:
+    """Return train details by id, reading through the cache"""
+    train = train_cache.get_by_id(train_id)
+    if train is None:
+        async with async_db_connection() as conn:
+            train = await execute_query_one_async(conn, TRAIN_BY_ID_QUERY, (train_id,))
+        train_cache.put(train)
+    return train
+
+
+async def get_train_by_no_async(train_no) -> Optional[Dict]:
+    """Return train details by train number, reading through the cache"""
+    train = train_cache.get_by_no(train_no)
+    if train is None:
+        async with async_db_connection() as conn:
+            train = await execute_query_one_async(conn, TRAIN_BY_NO_QUERY, (train_no,))
+        train_cache.put(train)
+    return train
+
+
+def get_trains(train_ids=(), train_nos=()) -> Dict[str, Dict[Any, Dict]]:
+    """
+    Resolve many trains at once. Cache misses are loaded with a single query.
+    Returns {'by_id': {id: train}, 'by_no': {train_no: train}}; unknown
+    trains are left out.
+    """
+    by_id, by_no = {}, {}
+    missing_ids, missing_nos = set(), set()
+    for train_id in {int(i) for i in train_ids}:
+        train = train_cache.get_by_id(train_id)
+        if train is None:
+            missing_ids.add(train_id)
+        else:
+            by_id[train_id] = train
+    for train_no in {_train_no_key(n) for n in train_nos}:
+        train = train_cache.get_by_no(train_no)
+        if train is None:
+            missing_nos.add(train_no)
+        else:
+            by_no[train_no] = train
+    if missing_ids or missing_nos:
+        with db_connection() as conn:
+            # train_no is an integer column; compare in its type so the index is used
+            # (a non-numeric number cannot match and is left out)
+            numeric_nos = [int(train_no) for train_no in missing_nos if train_no.isdigit()]
+            trains = execute_query(conn, TRAINS_BY_IDS_OR_NOS_QUERY, (list(missing_ids), numeric_nos))
+        for train in trains:
+            train_cache.put(train)
+            if train['id'] in missing_ids:
+                by_id[train['id']] = train
+            if _train_no_key(train['train_no']) in missing_nos:
+                by_no[_train_no_key(train['train_no'])] = train
+    return {'by_id': by_id, 'by_no': by_no}
+
+
+def warm_up_train_cache() -> int:
+    """Bulk load trains_traindetails into the cache and return the number of rows loaded"""
+    with db_connection() as conn:
+        trains = execute_query(conn, ALL_TRAINS_QUERY, (TRAIN_CACHE_MAX_SIZE,))
+    train_cache.put_many(trains)
+    logger.info(f"Train details cache warmed with {len(trains)} trains")
+    return len(trains)
+
+
+def invalidate_train_cache():
+    """Drop every cached train"""
+    train_cache.clear()
+    logger.info("Train details cache invalidated")
+
+
+def reload_train_cache() -> int:
+    """Drop every cached train and load the table again"""
+    train_cache.clear()
+    return warm_up_train_cache()
+
+
+def get_train_cache_stats() -> Dict[str, Any]:
+    """Return hit/miss counters and size of the train details cache"""
+    return train_cache.stats()
@@ -0,0 +1,175 @@
+import os
+import time
+import logging
+import threading
+import subprocess
+from typing import Dict, Optional, Any
+
+logger = logging.getLogger(__name__)
+
+VIDEO_PRESETS = {
+    # name: (x264 CRF, x264 preset, audio bitrate)
+    'fast': (30, 'veryfast', '64k'),
+    'balanced': (28, 'medium', '96k'),
+    'quality': (23, 'slow', '128k'),
+}
+
+VIDEO_PRESET = os.getenv('VIDEO_PRESET', 'balanced')
+VIDEO_MAX_DIMENSION = int(os.getenv('VIDEO_MAX_DIMENSION', 1280))
+VIDEO_MAX_CONCURRENT_TRANSCODES = int(os.getenv('VIDEO_MAX_CONCURRENT_TRANSCODES', 2))
+VIDEO_TRANSCODE_TIMEOUT = float(os.getenv('VIDEO_TRANSCODE_TIMEOUT', 300))
+VIDEO_SKIP_BELOW_BYTES = int(os.getenv('VIDEO_SKIP_BELOW_BYTES', 2 * 1024 * 1024))
+VIDEO_POSTER_DIMENSION = int(os.getenv('VIDEO_POSTER_DIMENSION', 320))
+VIDEO_POSTER_TIMEOUT = float(os.getenv('VIDEO_POSTER_TIMEOUT', 30))
+
+
+def _ffmpeg_binary() -> str:
+    binary = os.getenv('FFMPEG_BINARY')
+    if binary:
+        return binary
+    try:
+        import imageio_ffmpeg
+        return imageio_ffmpeg.get_ffmpeg_exe()
+    except Exception:
+        return 'ffmpeg'
+
+
+FFMPEG_BINARY = _ffmpeg_binary()
+
+_transcode_slots = threading.BoundedSemaphore(VIDEO_MAX_CONCURRENT_TRANSCODES)
+_stats_lock = threading.Lock()
+_stats = {
+    'jobs': 0,
+    'transcoded': 0,
+    'skipped': 0,
+    'failed': 0,
+    'timeouts': 0,
+    'encode_seconds_total': 0.0,
+    'input_bytes_total': 0,
+    'output_bytes_total': 0,
+}
+
+
+def _scale_filter(max_dimension: int) -> str:
+    """Cap the longest side at max_dimension, keep aspect ratio and even dimensions"""
+    # libx264 with yuv420p rejects odd sizes, so the capped side is rounded down to even too
+    return (
+        f"scale='if(gte(iw,ih),trunc(min(iw,{max_dimension})/2)*2,-2)':"
+        f"'if(gte(iw,ih),-2,trunc(min(ih,{max_dimension})/2)*2)'"
+    )
+
+
+def _run_ffmpeg(args, timeout: float):
+    command = [FFMPEG_BINARY, '-hide_banner', '-loglevel', 'error', '-nostdin', '-y'] + args
+    return subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, timeout=timeout, check=True)
+
+
+def extract_poster(source_path: str, output_path: str) -> Optional[str]:
+    """Write a JPEG poster frame for the video and return its path, or None"""
+    for offset in ('1', '0'):
+        try:
+            _run_ffmpeg([
+                '-ss', offset, '-i', source_path, '-frames:v', '1',
+                '-vf', _scale_filter(VIDEO_POSTER_DIMENSION), '-q:v', '4', output_path
+            ], VIDEO_POSTER_TIMEOUT)
+            if os.path.exists(output_path) and os.path.getsize(output_path) > 0:
+                return output_path
+        except (subprocess.CalledProcessError, subprocess.TimeoutExpired) as e:
+            logger.warning(f"Poster extraction at {offset}s failed for {source_path}: {e}")
+    return None
+
+
+def transcode_video(source_path: str, work_dir: str, preset: str = None) -> Dict[str, Any]:
+    """
+    Re-encode a video to H.264/AAC MP4 inside work_dir.
+
+    Small inputs are kept as they are, and the original is also kept when
+    the encode fails, times out or comes out larger than the input. At most
+    VIDEO_MAX_CONCURRENT_TRANSCODES ffmpeg runs (encodes and poster frames)
+    happen at once per process; the limit is not shared between processes.
+
+    Returns a dict with the path to upload, whether it was transcoded, an
+    optional poster_path, encode_seconds and the output/input size_ratio.
+    """
+    crf, x264_preset, audio_bitrate = VIDEO_PRESETS.get(preset or VIDEO_PRESET, VIDEO_PRESETS['balanced'])
+    input_bytes = os.path.getsize(source_path)
+    result = {
+        'path': source_path,
+        'transcoded': False,
+        'poster_path': None,
+        'encode_seconds': 0.0,
+        'input_bytes': input_bytes,
+        'output_bytes': input_bytes,
+        'size_ratio': 1.0,
+        'skipped_reason': None,
+    }
+    with _transcode_slots:
+        result['poster_path'] = extract_poster(source_path, os.path.join(work_dir, 'poster.jpg'))
+
+    if input_bytes < VIDEO_SKIP_BELOW_BYTES:
+        result['skipped_reason'] = 'small'
+    else:
+        output_path = os.path.join(work_dir, 'transcoded.mp4')
+        started = time.monotonic()
+        try:
+            with _transcode_slots:
+                started = time.monotonic()
+                _run_ffmpeg([
+                    '-i', source_path,
+                    '-map', '0:v:0', '-map', '0:a:0?',
+                    '-vf', _scale_filter(VIDEO_MAX_DIMENSION),
+                    '-c:v', 'libx264', '-preset', x264_preset, '-crf', str(crf), '-pix_fmt', 'yuv420p',
+                    '-c:a', 'aac', '-b:a', audio_bitrate,
+                    '-movflags', '+faststart',
+                    output_path
+                ], VIDEO_TRANSCODE_TIMEOUT)
+            result['encode_seconds'] = round(time.monotonic() - started, 3)
+            output_bytes = os.path.getsize(output_path)
+            if output_bytes < input_bytes:
+                result.update(path=output_path, transcoded=True, output_bytes=output_bytes)
+            else:
+                result['skipped_reason'] = 'larger'
+        except subprocess.TimeoutExpired:
+            result['encode_seconds'] = round(time.monotonic() - started, 3)
+            result['skipped_reason'] = 'timeout'
+            logger.error(f"Transcoding {source_path} exceeded {VIDEO_TRANSCODE_TIMEOUT}s")
+        except subprocess.CalledProcessError as e:
+            result['encode_seconds'] = round(time.monotonic() - started, 3)
+            result['skipped_reason'] = 'failed'
+            logger.error(f"Transcoding {source_path} failed: {e.stderr.decode(errors='replace')[-500:]}")
+        result['size_ratio'] = round(result['output_bytes'] / input_bytes, 4) if input_bytes else 1.0
+
+    _record(result)
+    logger.info(
+        f"Video job {os.path.basename(source_path)}: transcoded={result['transcoded']} "
+        f"reason={result['skipped_reason']} encode={result['encode_seconds']}s "
+        f"size_ratio={result['size_ratio']} ({input_bytes} -> {result['output_bytes']} bytes)"
+    )
+    return result
+
+
+def _record(result: Dict[str, Any]):
+    with _stats_lock:
+        _stats['jobs'] += 1
+        if result['transcoded']:
+            _stats['transcoded'] += 1
+            _stats['encode_seconds_total'] += result['encode_seconds']
+        elif result['skipped_reason'] == 'timeout':
+            _stats['timeouts'] += 1
+        elif result['skipped_reason'] == 'failed':
+            _stats['failed'] += 1
+        else:
+            _stats['skipped'] += 1
+        _stats['input_bytes_total'] += result['input_bytes']
+        _stats['output_bytes_total'] += result['output_bytes']
+
+
+def get_transcoder_stats() -> Dict[str, Any]:
+    """Return per-process transcoding counters, average encode time and size ratio"""
+    with _stats_lock:
+        stats = dict(_stats)
+    stats['encode_seconds_avg'] = round(stats['encode_seconds_total'] / stats['transcoded'], 3) if stats['transcoded'] else 0.0
+    stats['size_ratio_total'] = round(stats['output_bytes_total'] / stats['input_bytes_total'], 4) if stats['input_bytes_total'] else 1.0
+    stats['preset'] = VIDEO_PRESET
+    stats['max_concurrent'] = VIDEO_MAX_CONCURRENT_TRANSCODES
+    return stats